@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Cache persistant des réponses formulaire Weezevent (/participant/{id}/answers), table
+'participant_answers_cache' indexée par id_participant.
+
+Les réponses ne changent quasiment jamais après l'inscription : une entrée est réutilisée
+sans appel API tant qu'elle est fraîche, c'est-à-dire :
+  - si le participant expose une date de modification (validateur) identique à celle en cache ;
+  - sinon, si elle a moins de ANSWERS_CACHE_TTL_HOURS heures (défaut : 168, 0 = toujours revalider).
+Une entrée périmée est revalidée par requête conditionnelle (If-None-Match) quand l'API avait
+renvoyé un ETag : une réponse 304 prolonge l'entrée sans retélécharger les réponses.
+
+Le payload brut ('answers' de l'API) est stocké, pas le dict normalisé : un changement de
+libellés côté application ne nécessite pas de vider le cache.
+"""
+import json
+import logging
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+import mysql.connector
+from db_connection import get_connection
+from db_schema import ensure_schema
+
+TTL_HOURS = float(os.getenv("ANSWERS_CACHE_TTL_HOURS", 168))
+# Champs de la réponse /participant/list pouvant porter la date de dernière modification
+PARTICIPANT_VALIDATOR_FIELDS = ("update_date", "last_update", "modified_date")
+
+CachedAnswers = namedtuple("CachedAnswers", ["payload", "validator", "etag", "fetched_at"])
+
+
+def participant_validator(p_data):
+    """Date de modification du participant si l'API l'expose (chaîne), sinon None."""
+    for field in PARTICIPANT_VALIDATOR_FIELDS:
+        value = p_data.get(field)
+        if value:
+            return str(value)[:64]
+    return None
+
+
+def is_fresh(entry, validator, now=None):
+    """Indique si l'entrée en cache peut être utilisée sans appel API."""
+    if entry is None:
+        return False
+    if validator is not None and entry.validator is not None:
+        return validator == entry.validator # Validateur fiable : prime sur le TTL
+    if TTL_HOURS <= 0 or entry.fetched_at is None:
+        return False
+    now = now or datetime.now()
+    return now - entry.fetched_at < timedelta(hours=TTL_HOURS)
+
+
+def load_event_answers(event_id):
+    """Charge en une requête les entrées en cache d'un événement : {id_participant: CachedAnswers}."""
+    if not ensure_schema():
+        return {}
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id_participant, answers, validator, etag, fetched_at "
+            "FROM participant_answers_cache WHERE event_id = %s", (event_id,))
+        rows = cursor.fetchall()
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Erreur lecture cache réponses (event {event_id}): {db_err}")
+        return {}
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+    entries = {}
+    for id_participant, answers_json, validator, etag, fetched_at in rows:
+        try:
+            payload = {"answers": json.loads(answers_json or "[]")}
+        except (TypeError, ValueError):
+            continue # Entrée illisible : sera re-téléchargée
+        if isinstance(fetched_at, str): # SQLite (benchmarks) renvoie des chaînes
+            fetched_at = datetime.fromisoformat(fetched_at)
+        entries[str(id_participant)] = CachedAnswers(payload, validator, etag, fetched_at)
+    return entries
+
+
+def store_event_answers(event_id, entries):
+    """
+    Enregistre/rafraîchit les entrées téléchargées ou revalidées pendant la synchro d'un événement.
+    `entries` : liste de (id_participant, payload, validator, etag). Une seule transaction.
+    """
+    if not entries or not ensure_schema():
+        return
+    now = datetime.now().replace(microsecond=0)
+    params = [
+        (int(id_participant), event_id, json.dumps((payload or {}).get("answers", []), ensure_ascii=False),
+         validator, etag, now)
+        for id_participant, payload, validator, etag in entries
+    ]
+    sql = """
+        INSERT INTO participant_answers_cache (id_participant, event_id, answers, validator, etag, fetched_at)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            event_id = VALUES(event_id),
+            answers = VALUES(answers),
+            validator = VALUES(validator),
+            etag = VALUES(etag),
+            fetched_at = VALUES(fetched_at)
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.executemany(sql, params)
+        conn.commit()
+        logging.debug(f"Cache réponses: {len(params)} entrées enregistrées pour l'événement {event_id}.")
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Erreur écriture cache réponses (event {event_id}): {db_err}")
+        if conn: conn.rollback()
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Enregistrement et rejeu des réponses de l'API Weezevent (profilage et débogage hors-ligne).
+
+Enregistrement : WEEZEVENT_RECORD=synchro.ndjson.gz
+    Chaque réponse reçue par weezevent_utils.weezevent_request (moteur synchrone) ou
+    weezevent_async._request (moteur async) est ajoutée au fichier : une ligne JSON par appel
+    (méthode, endpoint, chemin, paramètres sans secrets, statut, en-têtes utiles, durée, corps brut),
+    fichier compressé gzip. "{pid}" dans le chemin est remplacé par le PID (un fichier par worker).
+    Les requêtes conditionnelles sont désactivées pendant l'enregistrement (If-None-Match retiré) :
+    le fichier contient des réponses complètes, rejouables sur une base vide.
+    Les paramètres api_key, access_token, username et password ne sont jamais écrits, le token
+    renvoyé par /auth/access_token est remplacé. Les corps contiennent en revanche les données
+    personnelles des participants : traiter le fichier comme une sauvegarde de la base.
+
+Rejeu : WEEZEVENT_REPLAY=synchro.ndjson.gz
+    Aucun appel réseau : chaque requête reçoit la réponse enregistrée pour la même méthode, le même
+    chemin et les mêmes paramètres (dans l'ordre d'enregistrement, la dernière est resservie ensuite),
+    sans attente. Une requête absente de l'enregistrement reçoit un 404. get_events et
+    get_registrations tournent ainsi à pleine vitesse sur des données de production : seuls le
+    parsing, les transformations et les écritures BDD sont mesurés.
+
+    python -m benchmarks.run_sync_bench --replay synchro.ndjson.gz --profile synchro.prof
+    python api_recorder.py summary synchro.ndjson.gz     # appels, statuts et durées par endpoint
+"""
+import gzip
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime
+from urllib.parse import parse_qsl, urlsplit
+import metrics
+
+SECRET_PARAMS = {"api_key", "access_token", "username", "password"}
+RECORDED_HEADERS = ("Content-Type", "ETag", "Retry-After")
+REPLAY_TOKEN = "replay-access-token"
+
+_lock = threading.Lock()
+_record_file = None
+_record_path = None
+_replay_entries = None  # (méthode, chemin, paramètres) -> [entrées]
+_replay_positions = {}
+_replay_stats = defaultdict(int)
+
+
+def _request_key(method, url, params=None):
+    parts = urlsplit(url)
+    pairs = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in SECRET_PARAMS]
+    if isinstance(params, dict):
+        pairs += [(k, str(v)) for k, v in params.items() if k not in SECRET_PARAMS]
+    return method.upper(), parts.path, tuple(sorted(pairs))
+
+
+# ===== Enregistrement =====
+def start_recording(path):
+    """Ouvre (en ajout) le fichier d'enregistrement ; les réponses suivantes y sont écrites."""
+    global _record_file, _record_path
+    with _lock:
+        if _record_file is not None:
+            _record_file.close()
+        _record_path = path.replace("{pid}", str(os.getpid()))
+        _record_file = gzip.open(_record_path, "at", encoding="utf-8")
+    logging.info(f"Enregistrement des réponses API Weezevent dans {_record_path}")
+
+
+def stop_recording():
+    global _record_file
+    with _lock:
+        if _record_file is not None:
+            _record_file.close()
+            _record_file = None
+
+
+def recording():
+    return _record_file is not None
+
+
+def prepare(kwargs):
+    """Arguments de la requête réelle : sans If-None-Match pendant un enregistrement (réponses complètes)."""
+    if _record_file is None or not kwargs.get("headers"):
+        return kwargs
+    headers = {k: v for k, v in kwargs["headers"].items() if k.lower() != "if-none-match"}
+    return dict(kwargs, headers=headers or None)
+
+
+def record(method, url, endpoint, kwargs, status, headers, body, elapsed):
+    """Ajoute une réponse (requests ou httpx) à l'enregistrement en cours."""
+    if _record_file is None:
+        return
+    method, path, params = _request_key(method, url, kwargs.get("params"))
+    if endpoint == "auth/access_token":
+        body = json.dumps({"accessToken": REPLAY_TOKEN}) # Jamais de token réel dans le fichier
+    entry = {
+        "t": datetime.now().isoformat(timespec="milliseconds"),
+        "method": method, "endpoint": endpoint, "path": path, "params": [list(p) for p in params],
+        "status": status, "headers": {h: headers[h] for h in RECORDED_HEADERS if h in headers},
+        "elapsed_ms": round(elapsed * 1000, 1), "body": body,
+    }
+    line = json.dumps(entry, ensure_ascii=False) + "\n"
+    with _lock:
+        if _record_file is not None:
+            _record_file.write(line)
+            _record_file.flush()
+
+
+# ===== Rejeu =====
+def load_recording(path):
+    """Lit un enregistrement (NDJSON gzip ou brut). Retourne la liste des entrées."""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def start_replay(path):
+    """Active le rejeu : les appels API suivants sont servis depuis l'enregistrement `path`."""
+    global _replay_entries
+    entries = defaultdict(list)
+    for entry in load_recording(path):
+        entries[(entry["method"], entry["path"], tuple(tuple(p) for p in entry["params"]))].append(entry)
+    with _lock:
+        _replay_entries = dict(entries)
+        _replay_positions.clear()
+        _replay_stats.clear()
+    logging.info(f"Rejeu des réponses API Weezevent depuis {path} ({sum(map(len, entries.values()))} réponses)")
+
+
+def stop_replay():
+    global _replay_entries
+    with _lock:
+        _replay_entries = None
+
+
+def replaying():
+    return _replay_entries is not None
+
+
+def replay_stats():
+    """Appels servis par endpoint depuis start_replay ("missing" : requêtes absentes de l'enregistrement)."""
+    with _lock:
+        return dict(_replay_stats)
+
+
+def _replay_entry(method, url, endpoint, kwargs):
+    """(statut, en-têtes, corps) enregistrés pour cette requête."""
+    key = _request_key(method, url, kwargs.get("params"))
+    with _lock:
+        candidates = _replay_entries.get(key) if _replay_entries is not None else None
+        if not candidates:
+            _replay_stats["missing"] += 1
+            entry = None
+        else:
+            position = _replay_positions.get(key, 0)
+            _replay_positions[key] = position + 1
+            entry = candidates[min(position, len(candidates) - 1)]
+            _replay_stats[endpoint] += 1
+    if entry is None:
+        logging.warning(f"Rejeu : aucune réponse enregistrée pour {key[0]} {key[1]} {dict(key[2])}")
+        metrics.inc("weezevent_replay_missing_total", endpoint=endpoint)
+        return 404, {"Content-Type": "application/json"}, json.dumps({"error": "absent de l'enregistrement"})
+    headers = dict(entry["headers"])
+    if_none_match = (kwargs.get("headers") or {}).get("If-None-Match")
+    if if_none_match and entry["status"] == 200 and if_none_match == headers.get("ETag"):
+        return 304, headers, "" # Même comportement que l'API pour le cache answers
+    return entry["status"], headers, entry["body"]
+
+
+def replay_response(method, url, endpoint, **kwargs):
+    """Réponse requests.Response rejouée (moteur synchrone)."""
+    import requests
+    status, headers, body = _replay_entry(method, url, endpoint, kwargs)
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    response._content = body.encode("utf-8")
+    response.encoding = "utf-8"
+    response.url = url
+    return response
+
+
+def replay_httpx_response(method, url, endpoint, **kwargs):
+    """Réponse httpx.Response rejouée (moteur async)."""
+    import httpx
+    status, headers, body = _replay_entry(method, url, endpoint, kwargs)
+    return httpx.Response(status, headers=headers, content=body.encode("utf-8"), request=httpx.Request(method, url))
+
+
+def init_from_env():
+    """Active l'enregistrement (WEEZEVENT_RECORD) ou le rejeu (WEEZEVENT_REPLAY) demandé par l'environnement."""
+    replay_path = os.getenv("WEEZEVENT_REPLAY")
+    record_path = os.getenv("WEEZEVENT_RECORD")
+    if replay_path and not replaying():
+        start_replay(replay_path)
+    elif record_path and not recording():
+        start_recording(record_path)
+
+
+# ===== Résumé d'un enregistrement =====
+def summarize(entries):
+    """Appels, statuts, durée cumulée et volume par endpoint."""
+    summary = {}
+    for entry in entries:
+        item = summary.setdefault(entry["endpoint"], {"calls": 0, "statuses": defaultdict(int), "elapsed_ms": 0.0, "bytes": 0})
+        item["calls"] += 1
+        item["statuses"][entry["status"]] += 1
+        item["elapsed_ms"] += entry["elapsed_ms"]
+        item["bytes"] += len(entry["body"].encode("utf-8"))
+    return summary
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Enregistrements des réponses de l'API Weezevent")
+    sub = parser.add_subparsers(dest="command", required=True)
+    summary_parser = sub.add_parser("summary", help="Appels, statuts et durées par endpoint")
+    summary_parser.add_argument("path")
+    args = parser.parse_args()
+
+    entries = load_recording(args.path)
+    if entries:
+        print(f"{len(entries)} réponse(s) du {entries[0]['t']} au {entries[-1]['t']}")
+    print(f"{'Endpoint':<22}{'Appels':>8}{'Durée (s)':>11}{'Moy. (ms)':>11}{'Volume (Ko)':>13}  Statuts")
+    for endpoint, item in sorted(summarize(entries).items()):
+        statuses = ", ".join(f"{status}: {count}" for status, count in sorted(item["statuses"].items()))
+        print(f"{endpoint:<22}{item['calls']:>8}{item['elapsed_ms'] / 1000:>11.2f}"
+              f"{item['elapsed_ms'] / item['calls']:>11.1f}{item['bytes'] / 1024:>13.1f}  {statuses}")
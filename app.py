@@ -1,51 +1,79 @@
 # -*- coding: utf-8 -*-
-import csv
-import io
+import hashlib
+import json
+import logging
 import os
 import re
 import time
 import threading
 import traceback
 from functools import wraps
-from datetime import datetime, date
-import decimal
+from datetime import datetime, timezone
 import mysql.connector
+from parsing_utils import format_date, format_amount, to_datetime # Dates/montants (mémoïsés, partagés avec la synchro)
+import metrics # Instrumentation (timers/compteurs) exposée sur /metrics
+import participants_search # Recherche/filtres/tri paginés pour /api/participants
+import event_stats # Agrégats par événement (table event_stats) pour le tableau de bord
+import data_versions # Versions des données par événement (ETag / Last-Modified)
+import export_snapshots # Exports CSV/XLSX précalculés par la synchro
+import http_compression # Compression gzip/brotli des réponses HTML/JSON
+import assets # Fichiers statiques versionnés (asset_url) et précompressés
+import webhook_queue # Notifications webhook Weezevent (file durable + traitement par lots)
+import sync_checkpoints # Progression des synchros en BDD (reprise, budget, annulation)
+import db_schema # Tables techniques et migration des index (ensure_indexes)
+from log_config import setup_logging # Journalisation commune app/synchro (file non bloquante)
 from db_connection import get_connection # Utilise votre fichier de connexion
 from dotenv import load_dotenv
 from flask import (Flask, flash, redirect, render_template, request, Response,
-                   send_file, session, url_for, abort) # abort ajouté
+                   send_file, session, url_for, abort, jsonify, stream_template,
+                   get_flashed_messages) # abort ajouté
 from werkzeug.security import check_password_hash
 
 load_dotenv()
+setup_logging() # Avant les imports Weezevent et la création de app.logger
 
 # --- État global pour la mise à jour en arrière-plan ---
 update_in_progress = False
 update_lock = threading.Lock()
 
 # ===== Import des fonctions externes (Weezevent et Surveillance BDD) =====
+# SYNC_ENGINE : "sync" (requests, défaut) ou "async" (asyncio + httpx, voir weezevent_async.py)
+SYNC_ENGINE = os.getenv("SYNC_ENGINE", "sync").lower()
 try:
-    from weezevent_events import get_events
-    from weezevent_api import get_registrations
+    if SYNC_ENGINE == "async":
+        from weezevent_async import get_events, get_registrations
+    else:
+        from weezevent_events import get_events
+        from weezevent_api import get_registrations
 except ImportError as e:
     print(f"ERREUR: Import Weezevent échoué - {e}")
     def get_events(): print("Fonction get_events non trouvée!")
-    def get_registrations(): print("Fonction get_registrations non trouvée!")
+    def get_registrations(report=None, budget_seconds=None): print("Fonction get_registrations non trouvée!")
+
+from sync_report import SyncReport, save_sync_report, get_recent_sync_runs # Rapports d'exécution (table sync_runs)
 
 try:
-    from monitoring import check_database_size # Fonction pour vérifier la taille de la BDD
+    # Vérification de la taille de la BDD (lancée en arrière-plan, dernier résultat en cache)
+    from monitoring import start_database_check, get_last_check_result, is_check_running
 except ImportError as e:
-    print(f"AVERTISSEMENT: Import check_database_size échoué - {e}")
-    def check_database_size():
-        print("ERREUR: Fonction check_database_size non importée.")
+    print(f"AVERTISSEMENT: Import monitoring échoué - {e}")
+    def start_database_check():
+        print("ERREUR: Fonction start_database_check non importée.")
+        return False
+    def get_last_check_result(): return None
+    def is_check_running(): return False
 
 # --- Initialisation de l'application Flask ---
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY")
+assets.init_app(app) # Route /assets/ + asset_url() dans les gabarits
+http_compression.init_app(app)
 
 # --- Configuration générale ---
 MAX_LOGIN_ATTEMPTS = 5
 LOCKOUT_DURATION = 300
 CRON_SECRET_KEY = os.getenv('CRON_SECRET_KEY', 'change-this-in-production') # Pour l'endpoint de surveillance
+METRICS_TOKEN = os.getenv('METRICS_TOKEN') # Jeton Bearer pour /metrics (scraper Prometheus)
 
 # --- Chargement des utilisateurs depuis les variables d'environnement ---
 USERS = {}
@@ -59,24 +87,75 @@ for key, value in os.environ.items():
 if not USERS:
     print("\n" + "="*60); print("!! ATTENTION : Aucun utilisateur trouvé dans .env !!"); print("="*60 + "\n")
 
+# ===== Requêtes conditionnelles (ETag / Last-Modified) =====
+# Identifiant du code déployé : un nouveau déploiement (gabarits, format CSV, CSS...) invalide les ETag
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+ETAG_SALT = assets.fingerprint() + "-" + (os.getenv("RENDER_GIT_COMMIT") or str(int(max(
+    [os.path.getmtime(os.path.join(_APP_DIR, "app.py"))] +
+    [os.path.getmtime(os.path.join(_APP_DIR, "templates", name)) for name in os.listdir(os.path.join(_APP_DIR, "templates"))]))))
+
+def data_validators(scopes, *parts):
+    """
+    (etag, last_modified) d'une réponse dépendant des périmètres `scopes` (data_versions) et des
+    paramètres `parts` (utilisateur, filtres...). (None, None) si les versions sont indisponibles.
+    """
+    versions = data_versions.get_versions(scopes)
+    if any(scope not in versions for scope in scopes):
+        return None, None
+    key = repr((ETAG_SALT, parts, [versions[scope][0] for scope in scopes]))
+    last_modified = max((versions[scope][1] for scope in scopes if versions[scope][1]), default=None)
+    if last_modified is not None:
+        last_modified = last_modified.astimezone(timezone.utc) # updated_at : heure locale du serveur
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:24], last_modified
+
+def set_validators(response, etag, last_modified):
+    """Ajoute ETag/Last-Modified ; le navigateur revalide à chaque affichage (no-cache)."""
+    if etag is None:
+        return response
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+def not_modified(etag, last_modified):
+    """Réponse 304 si la requête (If-None-Match, sinon If-Modified-Since) correspond, sinon None."""
+    if etag is None:
+        return None
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag) # Faible : ETag W/ après compression
+    else:
+        fresh = (request.if_modified_since is not None and last_modified is not None
+                 and last_modified.replace(microsecond=0) <= request.if_modified_since)
+    if not fresh:
+        return None
+    metrics.inc("http_not_modified_total", endpoint=request.endpoint or "")
+    return set_validators(Response(status=304), etag, last_modified)
+
 # ===== Fonction pour exécuter les mises à jour Weezevent en arrière-plan =====
-def run_updates_in_background(flask_app):
+def run_updates_in_background(flask_app, budget_seconds=None):
     global update_in_progress, update_lock
     timestamp_start = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp_start}] [Thread Background] Démarrage MAJ Weezevent...")
+    report = SyncReport()
     try:
         with flask_app.app_context():
             print(f"[{timestamp_start}] [Thread Background] Exécution get_events()...")
+            phase_start = time.perf_counter()
             get_events()
+            report.set_phase_time("get_events", time.perf_counter() - phase_start)
             print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] [Thread Background] Exécution get_registrations()...")
-            get_registrations()
+            get_registrations(report=report, budget_seconds=budget_seconds)
+        report.finish()
         timestamp_end = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{timestamp_end}] [Thread Background] MAJ Weezevent terminées.")
+        print(f"[{timestamp_end}] [Thread Background] MAJ Weezevent terminées. {report.summary_line()}")
     except Exception as e:
         timestamp_err = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         print(f"[{timestamp_err}] [Thread Background] ERREUR MAJ Weezevent: {e}")
         print(traceback.format_exc())
+        report.finish(status="erreur", message=str(e))
     finally:
+        save_sync_report(report)
         with update_lock:
             update_in_progress = False
         timestamp_final = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -99,20 +178,35 @@ def launch_background_update():
     global update_in_progress, update_lock
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     print(f"[{timestamp}] Requête /lancer-mise-a-jour")
+    # Durée maximale facultative (minutes) : sinon SYNC_TIME_BUDGET_SECONDS
+    budget_minutes = request.form.get('budget_minutes', '').strip()
+    budget_seconds = int(budget_minutes) * 60 if budget_minutes.isdigit() and int(budget_minutes) > 0 else None
     with update_lock:
-        if update_in_progress:
+        if update_in_progress or sync_checkpoints.current_progress(): # Ce worker ou un autre
             print(f"[{timestamp}] MAJ déjà en cours.")
             flash("Une mise à jour des données est déjà en cours.", "warning")
             return redirect(url_for('show_maintenance'))
         else:
             print(f"[{timestamp}] Lancement thread MAJ Weezevent...")
             update_in_progress = True
-            update_thread = threading.Thread(target=run_updates_in_background, args=(app,))
+            update_thread = threading.Thread(target=run_updates_in_background, args=(app, budget_seconds))
             update_thread.daemon = True
             update_thread.start()
             print(f"[{timestamp}] Thread démarré.")
             return redirect(url_for('show_maintenance'))
 
+# ===== Route d'annulation de la mise à jour Weezevent (arrêt au prochain point de reprise) =====
+@app.route('/annuler-mise-a-jour', methods=['POST'])
+@login_required
+def cancel_background_update():
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] Requête /annuler-mise-a-jour")
+    if sync_checkpoints.request_cancel():
+        flash("Annulation demandée : la synchro s'arrête au prochain point de reprise et reprendra là au prochain lancement.", "info")
+    else:
+        flash("Aucune synchro en cours à annuler.", "warning")
+    return redirect(url_for('show_maintenance'))
+
 # ===== Route affichant la page d'attente pendant la mise à jour Weezevent =====
 @app.route('/en-cours-de-mise-a-jour')
 @login_required
@@ -120,13 +214,66 @@ def show_maintenance():
     global update_in_progress, update_lock
     with update_lock:
         in_progress = update_in_progress
-    if in_progress:
+    progress = sync_checkpoints.current_progress() # Synchro en cours dans ce worker ou un autre
+    if in_progress or progress:
         headers = {'Refresh': '6'}
-        return render_template('maintenance.html'), 200, headers
+        return render_template('maintenance.html', progress=progress), 200, headers
     else:
         flash("La mise à jour des données est terminée.", "info")
         return redirect(url_for('select_event'))
 
+# ===== Route affichant l'historique des synchronisations (rapports sync_runs) =====
+@app.route('/historique-synchro')
+@login_required
+def sync_runs_history():
+    runs = get_recent_sync_runs(limit=30)
+    # Tendance : débit comparé à la moyenne des 5 exécutions précédentes (réussies)
+    max_duration = max((float(run['duration_seconds'] or 0) for run in runs), default=0)
+    for index, run in enumerate(runs):
+        previous = [float(r['throughput_per_s']) for r in runs[index + 1:index + 6]
+                    if r['status'] == 'ok' and r['throughput_per_s']]
+        run['throughput_trend'] = None
+        if previous and run['throughput_per_s'] and run['status'] == 'ok':
+            baseline = sum(previous) / len(previous)
+            run['throughput_trend'] = round((float(run['throughput_per_s']) - baseline) / baseline * 100, 1)
+        run['duration_bar_percent'] = int(float(run['duration_seconds'] or 0) / max_duration * 100) if max_duration else 0
+    username = session.get('username', '')
+    return render_template('sync_runs.html', runs=runs, username=username.capitalize())
+
+# ===== Tableau de bord : agrégats par événement (table event_stats, sans lecture des participants) =====
+@app.route('/tableau-de-bord')
+@login_required
+@metrics.timed("dashboard")
+def dashboard():
+    conn = None
+    cursor = None
+    events = []
+    try:
+        conn = get_connection()
+        if not conn:
+            raise ConnectionError("Connexion DB impossible depuis le pool.")
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT event_id, nom, date FROM evenements WHERE actif = 1 ORDER BY date DESC, nom ASC")
+        events = cursor.fetchall()
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        app.logger.error(f"Erreur DB dans dashboard : {db_err}", exc_info=True)
+        flash("Erreur de connexion ou de requête à la base de données.", "danger")
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+    summaries = event_stats.load_event_stats([event['event_id'] for event in events])
+    rows = []
+    for event in events:
+        summary = summaries.get(event['event_id'])
+        if summary is None:
+            continue
+        rows.append(dict(summary, nom=event['nom'] or "Non renseigné",
+                         date_display=format_date(event['date'], "Non renseigné")))
+    username = session.get('username', '')
+    return render_template('dashboard.html', rows=rows, totals=event_stats.totals(rows),
+                           format_amount=format_amount, username=username.capitalize())
+
 # ===== Route pour la connexion utilisateur =====
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -203,6 +350,84 @@ def logout():
     flash("Vous avez été déconnecté.", "info")
     return redirect(url_for('login'))
 
+# ===== Mise en forme d'un participant pour l'affichage (page et API) =====
+def format_participant(p_db, placeholder_missing_info="Non renseigné"):
+    """Copie d'une ligne 'inscriptions' avec les valeurs d'affichage (placeholder si absentes)."""
+    p_processed = p_db.copy()
+    p_processed["nom"] = p_db.get("nom") or placeholder_missing_info
+    p_processed["prenom"] = p_db.get("prenom") or placeholder_missing_info
+    p_processed["email"] = p_db.get("email") or placeholder_missing_info
+    p_processed["telephone"] = p_db.get("telephone") or placeholder_missing_info
+    p_processed["adresse"] = p_db.get("adresse") or placeholder_missing_info
+    p_processed["code_postal"] = p_db.get("code_postal") or placeholder_missing_info
+    p_processed["ville"] = p_db.get("ville") or placeholder_missing_info
+    p_processed["source_info"] = p_db.get("source_info") or placeholder_missing_info
+    p_processed["financement_eligible"] = p_db.get("financement_eligible") or placeholder_missing_info
+    p_processed["rqth"] = p_db.get("rqth") or placeholder_missing_info
+    p_processed["amenagements_necessaires"] = p_db.get("amenagements_necessaires") or placeholder_missing_info
+    needs_details = p_processed["amenagements_necessaires"] == "Oui"
+    p_processed["amenagements_details"] = p_db.get("amenagements_details") or (placeholder_missing_info if needs_details else "")
+    p_processed["nom_billet"] = p_db.get("nom_billet") or placeholder_missing_info
+
+    p_processed["date_naissance_display"] = format_date(p_db.get("date_naissance"), placeholder_missing_info)
+
+    parsed_creation = to_datetime(p_db.get("date_creation_inscription"))
+    p_processed["date_creation_display"] = parsed_creation.strftime('%d/%m/%Y %H:%M') if parsed_creation else placeholder_missing_info
+
+    p_processed["montant_paye_display"] = format_amount(p_db.get("montant_paye"), placeholder_missing_info)
+
+    code_promo_db = p_db.get("code_promo")
+    p_processed["code_promo_display"] = "Oui" if code_promo_db else "Non"
+    return p_processed
+
+# ===== Affichage en flux de la page participants =====
+STREAM_FLUSH_BYTES = 4096 # Taille minimale d'un morceau envoyé (le gabarit produit de très petits fragments)
+
+def buffered_stream(chunks, min_bytes=STREAM_FLUSH_BYTES):
+    """Regroupe les fragments d'un gabarit en flux en morceaux d'au moins `min_bytes` caractères."""
+    buffer, size = [], 0
+    try:
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= min_bytes:
+                yield "".join(buffer)
+                buffer, size = [], 0
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close() # Flux interrompu : fermeture dans le contexte de requête (stream_with_context)
+
+def stream_participant_rows(event_id, placeholder_missing_info="Non renseigné", limit=participants_search.DEFAULT_PER_PAGE):
+    """
+    Participants formatés, lus par paquets pendant l'envoi de la page (connexion propre au flux,
+    rendue au pool à la fin). Une erreur BDD en cours d'envoi tronque le tableau : les en-têtes sont
+    déjà partis, elle est seulement journalisée.
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        if not conn:
+            raise ConnectionError("Connexion DB impossible depuis le pool.")
+        cursor = conn.cursor(dictionary=True)
+        with metrics.timed("select_event_rows"):
+            for p_db in participants_search.iter_participants(cursor, event_id, limit=limit):
+                yield format_participant(p_db, placeholder_missing_info)
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        metrics.record_error("select_event_rows")
+        app.logger.error(f"Erreur lecture participants event {event_id} pendant l'envoi de la page : {db_err}")
+    finally:
+        # Flux interrompu (client parti) : lignes non lues à consommer avant de rendre la connexion
+        if conn is not None and getattr(conn, "unread_result", False):
+            try:
+                conn.consume_results()
+            except mysql.connector.Error:
+                pass
+        if cursor: cursor.close()
+        if conn: conn.close()
+
 # ===== Route principale (accueil) =====
 @app.route("/")
 @login_required
@@ -213,9 +438,23 @@ def index():
 @app.route("/select_event", methods=["GET", "POST"])
 @login_required
 def select_event():
+    # Affichage simple sans message en attente : 304 si ni la liste des événements ni les participants
+    # de l'événement sélectionné n'ont changé (aucune requête sur 'inscriptions')
+    etag = last_modified = None
+    if request.method == "GET" and not session.get("_flashes"):
+        selected = session.get("selected_event_id")
+        scopes = [data_versions.EVENTS_SCOPE]
+        if selected and str(selected).isdigit():
+            scopes.append(data_versions.event_scope(selected))
+        etag, last_modified = data_validators(scopes, "select_event", session.get("username"), selected)
+        cached_response = not_modified(etag, last_modified)
+        if cached_response is not None:
+            return cached_response
+
     conn = None
     cursor = None
-    participants_processed = []
+    participants_rows = []
+    participants_total = 0
     selected_event_id_int = None
     processed_events = []
     placeholder_missing_info = "Non renseigné"
@@ -255,12 +494,7 @@ def select_event():
         for event_db in events_from_db:
             event_processed = event_db.copy()
             event_date = event_db.get('date')
-            formatted_event_date = placeholder_missing_info
-            try:
-                if isinstance(event_date, (date, datetime)): formatted_event_date = event_date.strftime('%d/%m/%Y')
-                elif isinstance(event_date, str) and event_date: formatted_event_date = datetime.strptime(event_date, '%Y-%m-%d').strftime('%d/%m/%Y')
-            except (ValueError, TypeError): pass
-            event_processed['date_display'] = formatted_event_date
+            event_processed['date_display'] = format_date(event_date, placeholder_missing_info)
             event_processed['nom'] = event_db.get('nom') or placeholder_missing_info
             processed_events.append(event_processed)
 
@@ -274,74 +508,27 @@ def select_event():
             else:
                 # app.logger.debug(f"Récupération participants event: {selected_event_id_int}") # Log retiré
                 try:
-                    cursor.execute("SELECT * FROM inscriptions WHERE event_id=%s ORDER BY nom ASC, prenom ASC", (selected_event_id_int,))
-                    participants_db = cursor.fetchall()
-                    # app.logger.info(f"{len(participants_db)} participants récupérés pour event {selected_event_id_int}.") # Log retiré
-
-                    for p_db in participants_db:
-                        p_processed = p_db.copy()
-                        p_processed["nom"] = p_db.get("nom") or placeholder_missing_info
-                        p_processed["prenom"] = p_db.get("prenom") or placeholder_missing_info
-                        p_processed["email"] = p_db.get("email") or placeholder_missing_info
-                        p_processed["telephone"] = p_db.get("telephone") or placeholder_missing_info
-                        p_processed["adresse"] = p_db.get("adresse") or placeholder_missing_info
-                        p_processed["code_postal"] = p_db.get("code_postal") or placeholder_missing_info
-                        p_processed["ville"] = p_db.get("ville") or placeholder_missing_info
-                        p_processed["source_info"] = p_db.get("source_info") or placeholder_missing_info
-                        p_processed["financement_eligible"] = p_db.get("financement_eligible") or placeholder_missing_info
-                        p_processed["rqth"] = p_db.get("rqth") or placeholder_missing_info
-                        p_processed["amenagements_necessaires"] = p_db.get("amenagements_necessaires") or placeholder_missing_info
-                        needs_details = p_processed["amenagements_necessaires"] == "Oui"
-                        p_processed["amenagements_details"] = p_db.get("amenagements_details") or (placeholder_missing_info if needs_details else "")
-                        p_processed["nom_billet"] = p_db.get("nom_billet") or placeholder_missing_info
-
-                        date_naissance_db = p_db.get("date_naissance")
-                        formatted_naissance = placeholder_missing_info
-                        try:
-                            if isinstance(date_naissance_db, date): formatted_naissance = date_naissance_db.strftime('%d/%m/%Y')
-                            elif isinstance(date_naissance_db, str) and date_naissance_db: formatted_naissance = datetime.strptime(date_naissance_db, '%Y-%m-%d').strftime('%d/%m/%Y')
-                        except (ValueError, TypeError): pass
-                        p_processed["date_naissance_display"] = formatted_naissance
-
-                        date_creation_db = p_db.get("date_creation_inscription")
-                        formatted_creation = placeholder_missing_info
-                        try:
-                           if isinstance(date_creation_db, datetime): formatted_creation = date_creation_db.strftime('%d/%m/%Y %H:%M')
-                           elif isinstance(date_creation_db, str) and date_creation_db:
-                               parsed_creation = None
-                               for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
-                                   try: parsed_creation = datetime.strptime(date_creation_db, fmt); break
-                                   except ValueError: continue
-                               if parsed_creation: formatted_creation = parsed_creation.strftime('%d/%m/%Y %H:%M')
-                        except (ValueError, TypeError): pass
-                        p_processed["date_creation_display"] = formatted_creation
-
-                        montant_db = p_db.get("montant_paye")
-                        formatted_montant = placeholder_missing_info
-                        try:
-                            if isinstance(montant_db, decimal.Decimal): formatted_montant = str(montant_db)
-                            elif montant_db is not None: formatted_montant = str(decimal.Decimal(montant_db))
-                        except (TypeError, decimal.InvalidOperation): pass
-                        p_processed["montant_paye_display"] = formatted_montant
-
-                        code_promo_db = p_db.get("code_promo")
-                        p_processed["code_promo_display"] = "Oui" if code_promo_db else "Non"
-                        participants_processed.append(p_processed)
+                    # Nombre seulement : les lignes de la première page sont lues pendant l'envoi de la page
+                    # (stream_participant_rows) ; recherche, filtres et pages suivantes via /api/participants
+                    with metrics.timed("select_event_query"):
+                        participants_total = participants_search.count_participants(cursor, selected_event_id_int)
+                    if participants_total:
+                        participants_rows = stream_participant_rows(selected_event_id_int, placeholder_missing_info)
 
                 except Exception as e_part:
                      app.logger.error(f"Erreur traitement participants event {selected_event_id_int}: {e_part}", exc_info=True)
                      flash("Erreur lors du chargement des participants.", "danger")
-                     participants_processed = []
+                     participants_rows = []
 
     except mysql.connector.Error as db_err:
         app.logger.error(f"Erreur DB dans select_event : {db_err}", exc_info=True)
         flash("Erreur de connexion ou de requête à la base de données.", "danger")
-        processed_events, participants_processed = [], []
+        processed_events, participants_rows = [], []
         selected_event_id_int = None
     except Exception as e:
         app.logger.error(f"Erreur générale dans select_event : {e}", exc_info=True)
         flash("Une erreur inattendue est survenue lors du chargement de la page.", "danger")
-        processed_events, participants_processed = [], []
+        processed_events, participants_rows = [], []
         selected_event_id_int = None
 
     finally:
@@ -350,25 +537,39 @@ def select_event():
         # app.logger.debug("Connexion BDD fermée/remise au pool pour select_event.") # Log retiré
 
     username = session.get('username', '')
-    return render_template("select_event.html",
+    has_messages = bool(session.get("_flashes")) # Page avec message d'erreur/info : pas de validateurs
+    # Messages retirés de la session maintenant : le cookie de session part avant le corps de la page
+    get_flashed_messages(with_categories=True)
+    # Page envoyée en flux : en-tête et liste des événements avant la lecture des participants
+    response = Response(buffered_stream(stream_template("select_event.html",
                            events=processed_events,
-                           participants=participants_processed,
+                           participants=participants_rows,
+                           participants_total=participants_total,
                            selected_event_id=selected_event_id_int,
-                           username=username.capitalize())
+                           xlsx_available=export_snapshots.format_available("xlsx"),
+                           username=username.capitalize())), mimetype="text/html")
+    if not has_messages:
+        set_validators(response, etag, last_modified)
+    return response
 
-# ===== Route pour exporter les participants en CSV =====
+# ===== Route pour exporter les participants (CSV, XLSX si openpyxl) =====
 @app.route("/export_participants")
 @login_required
+@metrics.timed("export_participants")
 def export_participants():
     selected_event_id_str = session.get("selected_event_id")
     if not selected_event_id_str:
         flash("Aucun événement sélectionné pour l'export.", "warning")
         return redirect(url_for('select_event'))
 
+    export_format = request.args.get("format", "csv")
+    if not export_snapshots.format_available(export_format):
+        flash(f"Format d'export non disponible : '{export_format}'.", "warning")
+        return redirect(url_for('select_event'))
+
     conn = None
     cursor = None
     event_name = "evenement_inconnu"
-    placeholder_missing_info = "Non renseigné"
 
     try:
         try: selected_event_id_int = int(selected_event_id_str)
@@ -376,9 +577,18 @@ def export_participants():
              flash("ID événement invalide pour l'export.", "danger")
              return redirect(url_for('select_event'))
 
+        # Re-téléchargement sans synchro intermédiaire : 304 avant toute requête participants
+        etag, last_modified = data_validators(
+            [data_versions.EVENTS_SCOPE, data_versions.event_scope(selected_event_id_int)],
+            "export", selected_event_id_int, export_format)
+        cached_response = not_modified(etag, last_modified)
+        if cached_response is not None:
+            return cached_response
+
         conn = get_connection()
         if not conn:
              app.logger.error("Export impossible: Connexion DB échouée.")
+             metrics.record_error("export_participants")
              flash("Erreur de connexion à la base de données pour l'export.", "danger")
              return redirect(url_for('select_event'))
         cursor = conn.cursor(dictionary=True)
@@ -394,108 +604,38 @@ def export_participants():
         safe_name = re.sub(r'[^\w\-]+', '', event_name.replace(' ', '_'))
         safe_name = re.sub(r'[_]+', '_', safe_name).strip('_')[:60]
         safe_name = safe_name or "evenement"
-        download_filename = f"participants_{safe_name}.csv"
-
-        cursor.execute("SELECT * FROM inscriptions WHERE event_id=%s ORDER BY nom ASC, prenom ASC", (selected_event_id_int,))
-        participants = cursor.fetchall()
+        download_filename = f"participants_{safe_name}.{export_format}"
 
-        if not participants:
+        # Fichier précalculé par la synchro (export_snapshots.py), généré ici seulement s'il manque
+        snapshot_path = export_snapshots.get_snapshot(selected_event_id_int, export_format)
+        if not snapshot_path:
             flash("Aucun participant à exporter pour cet événement.", "info")
             return redirect(url_for('select_event'))
 
-        output = io.StringIO()
-        writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
-
-        writer.writerow([
-            "Nom", "Prénom", "Email", "Téléphone", "Date Naissance",
-            "Adresse", "Ville", "Code Postal",
-            "Date Inscription", "Heure Inscription",
-            "Connu la formation", "Éligible Financement", "RQTH",
-            "Besoin Aménagements", "Détails Aménagements",
-            "Montant Payé",
-            "Type Billet", "Code Promo Utilisé ?"
-        ])
-
-        for p in participants:
-            nom = p.get("nom") or placeholder_missing_info
-            prenom = p.get("prenom") or placeholder_missing_info
-            email = p.get("email") or placeholder_missing_info
-            telephone = p.get("telephone") or placeholder_missing_info
-            adresse = p.get("adresse") or placeholder_missing_info
-            ville = p.get("ville") or placeholder_missing_info
-            code_postal = p.get("code_postal") or placeholder_missing_info
-            source_info = p.get("source_info") or placeholder_missing_info
-            financement = p.get("financement_eligible") or placeholder_missing_info
-            rqth = p.get("rqth") or placeholder_missing_info
-            amenagements = p.get("amenagements_necessaires") or placeholder_missing_info
-            needs_details = amenagements == "Oui"
-            amenagements_details = p.get("amenagements_details") or (placeholder_missing_info if needs_details else "")
-            nom_billet = p.get("nom_billet") or placeholder_missing_info
-
-            date_naissance_str = placeholder_missing_info
-            date_naissance_obj = p.get("date_naissance")
-            try:
-                if isinstance(date_naissance_obj, date): date_naissance_str = date_naissance_obj.strftime('%d/%m/%Y')
-                elif isinstance(date_naissance_obj, str) and date_naissance_obj: date_naissance_str = datetime.strptime(date_naissance_obj, '%Y-%m-%d').strftime('%d/%m/%Y')
-            except ValueError: pass
-
-            date_creation_str = placeholder_missing_info
-            heure_creation_str = ""
-            date_creation_obj = p.get("date_creation_inscription")
-            try:
-                parsed_creation = None
-                if isinstance(date_creation_obj, datetime): parsed_creation = date_creation_obj
-                elif isinstance(date_creation_obj, str) and date_creation_obj:
-                    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"):
-                        try: parsed_creation = datetime.strptime(date_creation_obj, fmt); break
-                        except ValueError: continue
-                if parsed_creation:
-                    date_creation_str = parsed_creation.strftime('%d/%m/%Y')
-                    heure_creation_str = parsed_creation.strftime('%H:%M:%S')
-            except (ValueError, TypeError): pass
-
-            montant_paye_str = placeholder_missing_info
-            montant_paye = p.get("montant_paye")
-            try:
-                if isinstance(montant_paye, decimal.Decimal): montant_paye_str = "{:.2f}".format(montant_paye).replace('.', ',')
-                elif montant_paye is not None: montant_paye_str = "{:.2f}".format(decimal.Decimal(montant_paye)).replace('.', ',')
-            except (TypeError, decimal.InvalidOperation): pass
-
-            code_promo_db = p.get("code_promo")
-            code_promo_export = "Oui" if code_promo_db else "Non"
-
-            writer.writerow([
-                nom, prenom, email, telephone, date_naissance_str,
-                adresse, ville, code_postal,
-                date_creation_str, heure_creation_str,
-                source_info, financement, rqth,
-                amenagements, amenagements_details,
-                montant_paye_str, nom_billet,
-                code_promo_export
-            ])
-
-        csv_data_bytes = output.getvalue().encode('utf-8-sig')
-        buffer = io.BytesIO(csv_data_bytes)
-        buffer.seek(0)
-
-        return send_file(
-            buffer,
-            mimetype='text/csv; charset=utf-8-sig',
+        return set_validators(send_file(
+            snapshot_path,
+            mimetype=export_snapshots.MIMETYPES[export_format],
             as_attachment=True,
-            download_name=download_filename
-        )
+            download_name=download_filename,
+            conditional=True,
+            etag=etag or True,
+            last_modified=last_modified
+        ), etag, last_modified)
 
     except mysql.connector.Error as db_err:
          app.logger.error(f"Erreur DB Export: {db_err}", exc_info=True)
+         metrics.record_error("export_participants")
          flash("Erreur de base de données lors de la préparation de l'export.", "danger")
          return redirect(url_for('select_event'))
     except KeyError as e_key:
          col_manquante = str(e_key).strip("'");
          app.logger.error(f"ERREUR Export: Clé manquante '{col_manquante}'.", exc_info=True)
+         metrics.record_error("export_participants")
          flash(f"Erreur export : Donnée manquante ('{col_manquante}'). Vérifiez la structure BDD.", "danger")
          return redirect(url_for('select_event'))
     except Exception as e:
          app.logger.error(f"Erreur inattendue Export: {e}", exc_info=True)
+         metrics.record_error("export_participants")
          flash(f"Erreur inattendue lors de la génération de l'export : {e}", "danger")
          return redirect(url_for('select_event'))
     finally:
@@ -504,24 +644,139 @@ def export_participants():
         # app.logger.debug("Connexion BDD fermée/remise au pool pour export.") # Log retiré
 
 
+# ===== API JSON : recherche/filtre/tri paginés des participants =====
+# Champs renvoyés par /api/participants (valeurs d'affichage, sans les dates/montants bruts)
+API_PARTICIPANT_FIELDS = ("id", "nom", "prenom", "email", "telephone", "adresse", "code_postal", "ville",
+                          "source_info", "financement_eligible", "rqth", "amenagements_necessaires",
+                          "amenagements_details", "nom_billet", "date_naissance_display", "date_creation_display",
+                          "montant_paye_display", "code_promo_display")
+
+@app.route("/api/participants")
+@login_required
+@metrics.timed("api_participants")
+def api_participants():
+    """
+    Paramètres : event_id (défaut : événement sélectionné en session), q (préfixes nom/prénom/email),
+    un paramètre par filtre (ex: rqth=Oui&rqth=Non renseigné, voir participants_search.FILTER_FIELDS),
+    sort (participants_search.SORT_OPTIONS, '-' pour l'ordre décroissant), page, per_page, facets=1.
+    """
+    event_id_str = request.args.get("event_id") or session.get("selected_event_id")
+    if not event_id_str or not str(event_id_str).isdigit():
+        return jsonify({"error": "Paramètre event_id manquant ou invalide."}), 400
+    try:
+        page = int(request.args.get("page", 1))
+        per_page = int(request.args.get("per_page", participants_search.DEFAULT_PER_PAGE))
+    except ValueError:
+        return jsonify({"error": "Paramètres page/per_page invalides."}), 400
+    sort = request.args.get("sort", participants_search.DEFAULT_SORT)
+    if sort not in participants_search.SORT_OPTIONS:
+        return jsonify({"error": f"Tri inconnu : '{sort}'.", "sorts": list(participants_search.SORT_OPTIONS)}), 400
+    filters = {field: request.args.getlist(field) for field in participants_search.FILTER_FIELDS if field in request.args}
+    etag, last_modified = data_validators([data_versions.EVENTS_SCOPE, data_versions.event_scope(event_id_str)],
+                                          "api_participants", event_id_str, sorted(request.args.items(multi=True)))
+    cached_response = not_modified(etag, last_modified)
+    if cached_response is not None:
+        return cached_response
+
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        if not conn:
+            raise ConnectionError("Connexion DB impossible depuis le pool.")
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT event_id FROM evenements WHERE event_id = %s AND actif = 1", (int(event_id_str),))
+        if not cursor.fetchone():
+            return jsonify({"error": "Événement introuvable ou inactif."}), 404
+        result = participants_search.search_participants(
+            cursor, int(event_id_str), q=request.args.get("q", "").strip(), filters=filters, sort=sort,
+            page=page, per_page=per_page, with_facets=request.args.get("facets") == "1")
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        app.logger.error(f"Erreur DB dans api_participants : {db_err}", exc_info=True)
+        return jsonify({"error": "Erreur de base de données."}), 500
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+    rows = result.pop("rows")
+    result["event_id"] = int(event_id_str)
+    result["participants"] = [{key: p[key] for key in API_PARTICIPANT_FIELDS}
+                              for p in map(format_participant, rows)]
+    return set_validators(jsonify(result), etag, last_modified)
+
+
 # ===== Endpoint pour déclencher la vérification de la taille de la BDD (appel externe) =====
 @app.route('/trigger-db-check/<secret_key>', methods=['POST'])
 def trigger_db_check_endpoint(secret_key):
-    """Endpoint sécurisé pour déclencher la vérification BDD par un service externe."""
+    """Endpoint sécurisé : lance la vérification BDD en arrière-plan et répond 202 immédiatement."""
     if secret_key != CRON_SECRET_KEY:
         print(f"ALERTE SÉCURITÉ: Tentative accès non autorisé au trigger DB check.")
         abort(403) # Forbidden
 
-    print("INFO: Requête reçue /trigger-db-check. Lancement vérification BDD...")
+    print("INFO: Requête reçue /trigger-db-check. Lancement vérification BDD en arrière-plan...")
     try:
-        check_database_size() # Appel de la fonction importée
-        print("INFO: Appel à check_database_size terminé.")
-        return "Vérification de la base de données déclenchée avec succès.", 200
+        if start_database_check():
+            return "Vérification de la base de données lancée en arrière-plan.", 202
+        print("INFO: Vérification BDD déjà en cours, pas de nouveau lancement.")
+        return "Vérification de la base de données déjà en cours.", 202
     except Exception as e:
-        print(f"ERREUR: Échec exécution check_database_size via endpoint: {e}")
+        print(f"ERREUR: Échec lancement check_database_size via endpoint: {e}")
         print(traceback.format_exc())
         return "Erreur interne lors du déclenchement de la vérification.", 500
 
+# ===== Endpoint de statut : dernier résultat de vérification BDD (lecture du cache) =====
+@app.route('/db-check-status/<secret_key>', methods=['GET'])
+def db_check_status_endpoint(secret_key):
+    """Retourne en JSON le dernier résultat de vérification, sans interroger la BDD."""
+    if secret_key != CRON_SECRET_KEY:
+        print(f"ALERTE SÉCURITÉ: Tentative accès non autorisé au statut DB check.")
+        abort(403)
+    return jsonify({"running": is_check_running(), "last_result": get_last_check_result()}), 200
+
+
+# ===== Endpoint Prometheus : métriques de performance du processus =====
+@app.route('/metrics')
+def metrics_endpoint():
+    """Expose les métriques (format texte Prometheus). Accès : session connectée ou jeton Bearer METRICS_TOKEN."""
+    auth_header = request.headers.get('Authorization', '')
+    token_ok = bool(METRICS_TOKEN) and auth_header == f"Bearer {METRICS_TOKEN}"
+    if not token_ok and 'logged_in' not in session:
+        abort(401)
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ===== Webhook Weezevent : notifications d'inscription (création/modification/annulation) =====
+@app.route('/webhooks/weezevent', methods=['POST'])
+@metrics.timed("webhook_receive")
+def weezevent_webhook():
+    """Vérifie la signature, enregistre la notification dans la file durable et répond 202 (traitement différé)."""
+    if not webhook_queue.WEBHOOK_SECRET:
+        abort(404) # Webhooks non configurés (WEBHOOK_SECRET absent)
+    if (request.content_length or 0) > webhook_queue.MAX_PAYLOAD_BYTES:
+        return jsonify({"error": "Notification trop volumineuse."}), 413
+    # Lecture bornée : un corps 'chunked' (sans Content-Length) n'est jamais lu au-delà de la limite
+    body = b""
+    while len(body) <= webhook_queue.MAX_PAYLOAD_BYTES:
+        chunk = request.stream.read(webhook_queue.MAX_PAYLOAD_BYTES + 1 - len(body))
+        if not chunk:
+            break
+        body += chunk
+    if len(body) > webhook_queue.MAX_PAYLOAD_BYTES:
+        return jsonify({"error": "Notification trop volumineuse."}), 413
+    if not webhook_queue.verify_signature(body, request.headers.get(webhook_queue.SIGNATURE_HEADER),
+                                          request.headers.get(webhook_queue.TIMESTAMP_HEADER)):
+        metrics.inc("webhook_rejected_total", reason="signature")
+        return jsonify({"error": "Signature invalide ou expirée."}), 401
+    try:
+        notification_id = webhook_queue.enqueue(json.loads(body))
+    except ValueError as parse_err: # JSON invalide ou notification inexploitable : inutile de renvoyer
+        metrics.inc("webhook_rejected_total", reason="payload")
+        return jsonify({"error": f"Notification invalide : {parse_err}"}), 400
+    if notification_id is None:
+        return jsonify({"error": "File indisponible, réessayer plus tard."}), 503 # L'émetteur renverra
+    webhook_queue.notify()
+    return jsonify({"id": notification_id}), 202
+
 
 # --- Démarrage de l'application Flask ---
 if __name__ == "__main__":
@@ -534,15 +789,12 @@ if __name__ == "__main__":
     if use_reloader and debug_mode:
         print("ATTENTION: Reloader activé, peut interférer avec les threads.")
 
-    # Configuration basique du logging Flask
-    if not debug_mode:
-        import logging
-        log_level = logging.INFO
-        logging.basicConfig(level=log_level, format='%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-        app.logger.setLevel(log_level)
-        app.logger.info("Logging configuré pour production.")
-    else:
-        app.logger.setLevel(logging.DEBUG)
-        app.logger.info("Logging configuré pour debug.")
+    # Journalisation déjà installée par setup_logging() (log_config.py) ; seul le niveau change en debug
+    if debug_mode:
+        logging.getLogger().setLevel(logging.DEBUG)
+    app.logger.info(f"Logging configuré pour {'debug' if debug_mode else 'production'}.")
 
+    # Migration du schéma (index de 'inscriptions') avant de servir, comme le maître gunicorn
+    if db_schema.ensure_schema():
+        db_schema.ensure_indexes()
     app.run(debug=debug_mode, host='0.0.0.0', port=port, use_reloader=use_reloader)
\ No newline at end of file
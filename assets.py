@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Fichiers statiques versionnés par leur contenu (cache navigateur longue durée).
+
+Au démarrage, chaque fichier de static/ est lu une fois : son empreinte (sha256) est insérée dans
+le nom servi (style.css -> /assets/style.3f2a9c1e0b7d.css) et ses variantes gzip/brotli sont
+précalculées en mémoire. Les gabarits utilisent asset_url('style.css') au lieu de
+url_for('static', ...). Une URL versionnée ne change jamais de contenu : elle est servie avec
+Cache-Control "public, max-age=31536000, immutable" ; un déploiement qui modifie le fichier
+produit un nouveau nom, donc aucun cache à purger.
+
+`python assets.py` affiche la table des URL versionnées et le gain de compression (vérification
+avant déploiement).
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import Response, abort, request, url_for
+from http_compression import accepted_encoding
+
+try:
+    import brotli # Optionnel : variante .br en plus de .gz
+except ImportError:
+    brotli = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable" # 1 an : le nom change avec le contenu
+PRECOMPRESSED_MIMETYPES = {"text/css", "application/javascript", "text/javascript", "image/svg+xml",
+                           "text/plain", "application/json"}
+
+_assets = {}     # nom logique (style.css) -> description
+_by_hashed = {}  # nom versionné (style.<hash>.css) -> description
+
+
+def _hashed_name(filename, digest):
+    root, ext = os.path.splitext(filename)
+    return f"{root}.{digest}{ext}"
+
+
+def _build_asset(filename, data):
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    variants = {None: data}
+    if mimetype in PRECOMPRESSED_MIMETYPES:
+        # Compression maximale : faite une seule fois par processus
+        candidates = {"gzip": gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            candidates["br"] = brotli.compress(data, quality=11)
+        variants.update({encoding: body for encoding, body in candidates.items() if len(body) < len(data)})
+    return {"filename": filename, "hashed": _hashed_name(filename, digest), "digest": digest,
+            "mimetype": mimetype, "variants": variants}
+
+
+def load_assets(static_dir=STATIC_DIR):
+    """(Re)charge l'index des fichiers statiques. Retourne le nombre de fichiers indexés."""
+    assets = {}
+    for root, _dirs, files in os.walk(static_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, static_dir).replace(os.sep, "/")
+            with open(path, "rb") as f:
+                assets[filename] = _build_asset(filename, f.read())
+    _assets.clear()
+    _assets.update(assets)
+    _by_hashed.clear()
+    _by_hashed.update({asset["hashed"]: asset for asset in assets.values()})
+    return len(assets)
+
+
+def fingerprint():
+    """Empreinte de l'ensemble des fichiers statiques (entre dans l'ETag des pages HTML)."""
+    return hashlib.sha1("".join(sorted(asset["hashed"] for asset in _assets.values())).encode("utf-8")).hexdigest()[:12]
+
+
+def asset_url(filename):
+    """URL versionnée d'un fichier de static/ (url_for('static') si le fichier est inconnu)."""
+    asset = _assets.get(filename)
+    if asset is None:
+        return url_for("static", filename=filename)
+    return url_for("hashed_asset", filename=asset["hashed"])
+
+
+def serve_asset(filename):
+    asset = _by_hashed.get(filename)
+    if asset is None:
+        abort(404) # Ancienne empreinte : la page qui la référence est revalidée (ETag) et pointe sur la nouvelle
+    encoding = accepted_encoding()
+    if encoding not in asset["variants"]:
+        encoding = "gzip" if encoding == "br" and "gzip" in asset["variants"] else None
+    response = Response(asset["variants"][encoding], mimetype=asset["mimetype"])
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if len(asset["variants"]) > 1:
+        response.vary.add("Accept-Encoding")
+    response.set_etag(f"{asset['digest']}-{encoding or 'identity'}")
+    response.headers["Cache-Control"] = ASSET_CACHE_CONTROL
+    return response.make_conditional(request)
+
+
+def init_app(app):
+    """Indexe static/, enregistre la route /assets/ et la fonction de gabarit asset_url()."""
+    load_assets(app.static_folder or STATIC_DIR)
+    app.add_url_rule("/assets/<path:filename>", "hashed_asset", serve_asset)
+    app.jinja_env.globals["asset_url"] = asset_url
+
+
+if __name__ == "__main__":
+    load_assets()
+    for asset in sorted(_assets.values(), key=lambda a: a["filename"]):
+        sizes = ", ".join(f"{encoding or 'brut'}: {len(body)} o" for encoding, body in asset["variants"].items())
+        print(f"{asset['filename']} -> /assets/{asset['hashed']} ({sizes})")
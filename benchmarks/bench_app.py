@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+Point d'entrée WSGI pour les tests de charge : branche l'application sur la base SQLite
+de benchmark si BENCH_SQLITE_PATH est défini, sinon sur la BDD configurée (.env).
+    BENCH_SQLITE_PATH=/tmp/load.sqlite3 gunicorn benchmarks.bench_app:app
+"""
+import os
+
+from benchmarks import sqlite_db
+
+if os.getenv("BENCH_SQLITE_PATH"):
+    sqlite_db.install(os.environ["BENCH_SQLITE_PATH"]) # Avant l'import de app
+
+from app import app # noqa: E402
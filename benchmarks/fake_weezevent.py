@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Serveur local simulant l'API Weezevent (aucun accès réseau requis).
+Sert /auth/access_token, /events, /tickets, /participant/list et /participant/{id}/answers
+avec des données synthétiques déterministes et une latence configurable par endpoint.
+Avec --rate-limit N, au-delà de N appels par fenêtre d'une seconde, répond 429 (Retry-After,
+X-RateLimit-*) comme une API limitée.
+
+Usage autonome :
+    python -m benchmarks.fake_weezevent --port 8765 --events 2 --participants 100 --latency-ms 5
+puis lancer l'application avec WEEZEVENT_API_URL=http://127.0.0.1:8765
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FIRST_EVENT_ID = 100001
+TICKETS_PER_EVENT = 3
+
+# Libellés identiques à ceux recherchés par weezevent_api.get_registrations
+ANSWER_LABELS = {
+    "source": "Comment avez-vous entendu parler de la Compagnie Maritime ? (bouche à oreille, site, presse, réseaux sociaux, autres à préciser).",
+    "financement": "Êtes-vous éligible à un financement pour cette formation ?",
+    "rqth": "Bénéficiez-vous d'une RQTH ?",
+    "amenagement": "Avez-vous besoin d'aménagements nécessaires pour facilité l'accès à la formation ? Si oui, précisez",
+}
+FIRST_NAMES = ["Camille", "Louis", "Chloé", "Hugo", "Léa", "Gabriel", "Manon", "Arthur", "Inès", "Jules"]
+LAST_NAMES = ["Martin", "Bernard", "Dubois", "Thomas", "Robert", "Richard", "Petit", "Durand", "Leroy", "Moreau"]
+CITIES = [("Marseille", "13002"), ("Toulon", "83000"), ("Brest", "29200"), ("Le Havre", "76600"), ("Nantes", "44000")]
+
+
+class FakeDataset:
+    """Jeu de données synthétique : `events` événements de `participants` participants chacun."""
+
+    def __init__(self, events=1, participants=100, seed=42):
+        self.events = events
+        self.participants = participants
+        self.seed = seed
+
+    def event_ids(self):
+        return [FIRST_EVENT_ID + i for i in range(self.events)]
+
+    def events_payload(self):
+        start = date.today() + timedelta(days=30)
+        return {"events": [
+            {
+                "id": event_id,
+                "name": f"Formation Bench {event_id}",
+                "date": {"start": f"{(start + timedelta(days=i)).isoformat()} 09:00:00"},
+                "sales_status": {"id_status": 1, "libelle_status": "En vente"},
+            }
+            for i, event_id in enumerate(self.event_ids())
+        ]}
+
+    def ticket_id(self, event_id, index):
+        return event_id * 10 + index
+
+    def tickets_payload(self, event_ids):
+        events = []
+        for event_id in event_ids:
+            if event_id not in self.event_ids():
+                continue
+            tickets = [{"id": self.ticket_id(event_id, i), "name": f"Billet {i}", "price": f"{50 + 25 * i}.00"}
+                       for i in range(TICKETS_PER_EVENT)]
+            # Premier billet direct, les autres dans une catégorie (parcours récursif côté client)
+            events.append({"id": event_id, "tickets": tickets[:1], "categories": [{"id": 1, "tickets": tickets[1:]}]})
+        return {"events": events}
+
+    def participant_id(self, event_id, index):
+        return event_id * 100000 + index
+
+    def _participant(self, event_id, index):
+        rng = random.Random(f"{self.seed}-{event_id}-{index}")
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        ticket_index = rng.randrange(TICKETS_PER_EVENT)
+        created = date(2025, 1, 1) + timedelta(days=rng.randrange(300))
+        return {
+            "id_participant": self.participant_id(event_id, index),
+            "id_event": event_id,
+            "id_ticket": self.ticket_id(event_id, ticket_index),
+            "ticket_name": f"Billet {ticket_index}",
+            "create_date": f"{created.isoformat()} {rng.randrange(8, 20):02d}:{rng.randrange(60):02d}:00",
+            "promo_code": "PROMO10" if rng.random() < 0.1 else "",
+            "owner": {
+                "first_name": first,
+                "last_name": last,
+                "email": f"{first}.{last}.{event_id}.{index}@example.org".lower(),
+            },
+        }
+
+    def participants_payload(self, event_id):
+        if event_id not in self.event_ids():
+            return {"participants": []}
+        return {"participants": [self._participant(event_id, i) for i in range(self.participants)]}
+
+    def answers_payload(self, participant_id):
+        event_id, index = divmod(participant_id, 100000)
+        if event_id not in self.event_ids() or index >= self.participants:
+            return None
+        rng = random.Random(f"{self.seed}-answers-{participant_id}")
+        city, zipcode = rng.choice(CITIES)
+        needs = rng.random() < 0.1
+        return {"answers": [
+            {"label": "Telephone", "value": f"06{rng.randrange(10**8):08d}"},
+            {"label": "Date de naissance", "value": f"{rng.randrange(1, 28):02d}/{rng.randrange(1, 13):02d}/{rng.randrange(1960, 2005)}"},
+            {"label": "Adresse", "value": f"{rng.randrange(1, 200)} rue du Port"},
+            {"label": "Ville", "value": city},
+            {"label": "Code postal", "value": zipcode},
+            {"label": ANSWER_LABELS["source"], "value": rng.choice(["Site", "Presse", "Bouche à oreille"])},
+            {"label": ANSWER_LABELS["financement"], "value": rng.choice(["Oui", "Non"])},
+            {"label": ANSWER_LABELS["rqth"], "value": "Oui" if rng.random() < 0.05 else "Non"},
+            {"label": ANSWER_LABELS["amenagement"], "value": "Accès fauteuil" if needs else "Non"},
+        ]}
+
+
+class FakeWeezeventServer:
+    """Serveur HTTP multi-thread démarrable en arrière-plan (start/stop) ou en avant-plan (serve_forever)."""
+
+    def __init__(self, dataset, host="127.0.0.1", port=0, latency_ms=0.0, endpoint_latency_ms=None, rate_limit=0):
+        self.dataset = dataset
+        self.latency_ms = latency_ms
+        self.endpoint_latency_ms = endpoint_latency_ms or {}
+        self.rate_limit = rate_limit # Appels par fenêtre d'une seconde (0 : illimité)
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        self._window = (0, 0) # (seconde en cours, appels acceptés)
+        self._thread = None
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, endpoint):
+        with self._stats_lock:
+            self.stats[endpoint] = self.stats.get(endpoint, 0) + 1
+
+    def take_quota(self):
+        """Fenêtre fixe d'une seconde. Retourne None sans limite, sinon (accepté, restant, secondes avant la fin)."""
+        if not self.rate_limit:
+            return None
+        now = time.time()
+        with self._stats_lock:
+            second, used = self._window
+            if int(now) != second:
+                second, used = int(now), 0
+            allowed = used < self.rate_limit
+            self._window = (second, used + allowed)
+            if not allowed:
+                self.stats["throttled"] = self.stats.get("throttled", 0) + 1
+            return allowed, self.rate_limit - used - allowed, round(second + 1 - now, 3)
+
+    def sleep_for(self, endpoint):
+        delay_ms = self.endpoint_latency_ms.get(endpoint, self.latency_ms)
+        if delay_ms:
+            time.sleep(delay_ms / 1000.0)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-weezevent", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            answers_path = re.compile(r"^/participant/(\d+)/answers$")
+
+            def log_message(self, format, *args): # Silencieux (bruit inutile en benchmark)
+                pass
+
+            quota = None
+
+            def _send_json(self, payload, status=200, etag=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                if etag:
+                    self.send_header("ETag", etag)
+                if self.quota:
+                    _allowed, remaining, reset = self.quota
+                    self.send_header("X-RateLimit-Limit", str(server.rate_limit))
+                    self.send_header("X-RateLimit-Remaining", str(remaining))
+                    self.send_header("X-RateLimit-Reset", str(reset))
+                    if status == 429:
+                        self.send_header("Retry-After", "1")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                length = int(self.headers.get("Content-Length") or 0)
+                if length:
+                    self.rfile.read(length)
+                self.quota = server.take_quota()
+                if self.quota and not self.quota[0]:
+                    return self._send_json({"error": "rate limit exceeded"}, status=429)
+                if path == "/auth/access_token":
+                    server.count("auth/access_token")
+                    server.sleep_for("auth/access_token")
+                    return self._send_json({"accessToken": "fake-access-token"})
+                self._send_json({"error": "not found"}, status=404)
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = parse_qs(parsed.query)
+                path = parsed.path
+                event_ids = [int(v) for v in query.get("id_event[]", []) if v.isdigit()]
+
+                if path == "/__stats": # Compteurs d'appels (lus par le harnais de benchmark)
+                    with server._stats_lock:
+                        return self._send_json(dict(server.stats))
+                self.quota = server.take_quota()
+                if self.quota and not self.quota[0]:
+                    return self._send_json({"error": "rate limit exceeded"}, status=429)
+                if path == "/events":
+                    endpoint, payload = "events", server.dataset.events_payload()
+                elif path == "/tickets":
+                    endpoint, payload = "tickets", server.dataset.tickets_payload(event_ids)
+                elif path == "/participant/list":
+                    endpoint = "participant/list"
+                    payload = {"participants": []}
+                    for event_id in event_ids:
+                        payload["participants"].extend(server.dataset.participants_payload(event_id)["participants"])
+                    participant_ids = {int(v) for v in query.get("ids_participant[]", []) if v.isdigit()}
+                    if participant_ids: # Relecture ciblée (webhooks sans bloc participant)
+                        payload["participants"] = [p for p in payload["participants"]
+                                                   if p["id_participant"] in participant_ids]
+                else:
+                    match = self.answers_path.match(path)
+                    if not match:
+                        return self._send_json({"error": "not found"}, status=404)
+                    endpoint = "participant/answers"
+                    payload = server.dataset.answers_payload(int(match.group(1)))
+                    # Réponses immuables : ETag stable, 304 sur requête conditionnelle (answers_cache)
+                    etag = f'"{server.dataset.seed}-{match.group(1)}"'
+                    if payload is not None and self.headers.get("If-None-Match") == etag:
+                        server.count(endpoint)
+                        server.sleep_for(endpoint)
+                        self.send_response(304)
+                        self.send_header("ETag", etag)
+                        self.end_headers()
+                        return
+
+                server.count(endpoint)
+                server.sleep_for(endpoint)
+                if payload is None:
+                    return self._send_json({"error": "not found"}, status=404)
+                self._send_json(payload, etag=etag if endpoint == "participant/answers" else None)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur local simulant l'API Weezevent.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--events", type=int, default=1, help="Nombre d'événements")
+    parser.add_argument("--participants", type=int, default=100, help="Participants par événement")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latence ajoutée à chaque réponse")
+    parser.add_argument("--answers-latency-ms", type=float, default=None, help="Latence spécifique /participant/{id}/answers")
+    parser.add_argument("--rate-limit", type=int, default=0, help="Appels acceptés par seconde (429 au-delà, 0 : illimité)")
+    args = parser.parse_args()
+
+    endpoint_latency = {}
+    if args.answers_latency_ms is not None:
+        endpoint_latency["participant/answers"] = args.answers_latency_ms
+    server = FakeWeezeventServer(FakeDataset(args.events, args.participants), args.host, args.port,
+                                 args.latency_ms, endpoint_latency, args.rate_limit)
+    print(f"Faux serveur Weezevent sur {server.url} ({args.events} événements x {args.participants} participants)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""
+Test de charge reproductible des routes web /select_event (GET/POST) et /export_participants.
+
+Étapes :
+  1. insère des événements/participants synthétiques de plusieurs tailles (ids 990001+) ;
+  2. démarre gunicorn (`gunicorn benchmarks.bench_app:app`, avec gunicorn.conf.py du dépôt) ou cible --url ;
+     --gunicorn-args "-c /dev/null" mesure un gunicorn nu (1 worker sync) pour comparaison ;
+  3. chaque utilisateur virtuel se connecte via /login puis enchaîne POST/GET /select_event et
+     /export_participants pendant --duration secondes, pour chaque niveau de --users ;
+  4. affiche p50/p95/p99, débit, erreurs et mémoire des workers ; compare à la référence enregistrée.
+
+Usage (hors-ligne, base SQLite locale) :
+    python -m benchmarks.loadtest --sqlite /tmp/load.sqlite3 --users 1 5 10 --duration 20
+    python -m benchmarks.loadtest --sqlite /tmp/load.sqlite3 --save-baseline     # enregistre la référence
+    python -m benchmarks.loadtest --sqlite /tmp/load.sqlite3 --compare           # code retour 1 si régression
+Contre la BDD de l'environnement (.env, ex: staging) : omettre --sqlite. --cleanup supprime les données insérées.
+"""
+import argparse
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import requests
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(REPO_ROOT, "benchmarks", "baselines")
+SEED_FIRST_EVENT_ID = 990001
+DEFAULT_SIZES = [50, 500, 5000]
+BENCH_USERNAME = os.environ.get("BENCH_USERNAME", "bench") # Compte créé pour gunicorn local (ou existant avec --url)
+EXPORT_PROBABILITY = 0.3 # Part des itérations qui téléchargent aussi l'export CSV
+
+
+# ===== Données synthétiques =====
+def seed_database(sizes, seed=7):
+    """Insère un événement par taille (participants synthétiques). Retourne {event_id: taille}."""
+    from db_connection import get_connection
+    rng = random.Random(seed)
+    event_sizes = {SEED_FIRST_EVENT_ID + i: size for i, size in enumerate(sizes)}
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        _delete_seed(cursor, event_sizes)
+        event_date = (date.today() + timedelta(days=60)).isoformat()
+        for event_id, size in event_sizes.items():
+            cursor.execute("INSERT INTO evenements (event_id, nom, date, actif) VALUES (%s, %s, %s, 1)",
+                           (event_id, f"Charge {size} participants", event_date))
+            rows = []
+            for i in range(size):
+                created = datetime(2025, 1, 1) + timedelta(minutes=rng.randrange(500000))
+                rows.append((
+                    f"Nom{i:05d}", f"Prenom{i % 97}", f"charge.{event_id}.{i}@example.org", f"06{rng.randrange(10**8):08d}",
+                    date(1960 + rng.randrange(45), 1 + rng.randrange(12), 1 + rng.randrange(28)),
+                    f"{rng.randrange(1, 200)} rue du Port", "Marseille", "13002", event_id,
+                    rng.choice(["Site", "Presse", "Bouche à oreille"]), rng.choice(["Oui", "Non"]),
+                    "Oui" if rng.random() < 0.05 else "Non", "Non", None,
+                    f"{rng.choice([50, 75, 100])}.00", f"Billet {rng.randrange(3)}",
+                    "PROMO10" if rng.random() < 0.1 else None, created,
+                ))
+            cursor.executemany("""
+                INSERT INTO inscriptions (
+                    nom, prenom, email, telephone, date_naissance, adresse, ville, code_postal, event_id,
+                    source_info, financement_eligible, rqth, amenagements_necessaires, amenagements_details,
+                    montant_paye, nom_billet, code_promo, date_creation_inscription
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, rows)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    return event_sizes
+
+
+def _delete_seed(cursor, event_sizes):
+    placeholders = ", ".join(["%s"] * len(event_sizes))
+    cursor.execute(f"DELETE FROM inscriptions WHERE event_id IN ({placeholders})", tuple(event_sizes))
+    cursor.execute(f"DELETE FROM evenements WHERE event_id IN ({placeholders})", tuple(event_sizes))
+
+
+def cleanup_database(event_sizes):
+    from db_connection import get_connection
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        _delete_seed(cursor, event_sizes)
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# ===== Serveur gunicorn local =====
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_gunicorn(args, password):
+    from werkzeug.security import generate_password_hash
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        f"{BENCH_USERNAME.upper()}_PASSWORD_HASH": generate_password_hash(password),
+        "FLASK_SECRET_KEY": env.get("FLASK_SECRET_KEY") or "loadtest-secret",
+    })
+    if args.sqlite:
+        env["BENCH_SQLITE_PATH"] = os.path.abspath(args.sqlite)
+    cmd = [sys.executable, "-m", "gunicorn", "--bind", f"127.0.0.1:{port}"] + args.gunicorn_args.split() + ["benchmarks.bench_app:app"]
+    process = subprocess.Popen(cmd, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            requests.get(f"{url}/login", timeout=1)
+            return process, url
+        except requests.exceptions.RequestException:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("gunicorn n'a pas démarré.")
+
+
+def worker_memory_mb(master_pid):
+    """RSS (Mo) du maître gunicorn et de ses workers, via `ps` (Linux et macOS)."""
+    try:
+        output = subprocess.run(["ps", "-A", "-o", "pid=,ppid=,rss="], capture_output=True, text=True).stdout
+    except OSError:
+        return {}
+    memory = {}
+    for line in output.splitlines():
+        parts = line.split()
+        if len(parts) == 3 and (int(parts[0]) == master_pid or int(parts[1]) == master_pid):
+            memory[int(parts[0])] = round(int(parts[2]) / 1024, 1)
+    return memory
+
+
+# ===== Utilisateurs virtuels =====
+def login(base_url, username, password):
+    session = requests.Session()
+    response = session.post(f"{base_url}/login", data={"username": username, "password": password},
+                            allow_redirects=False, timeout=30)
+    if response.status_code != 302 or "/login" in response.headers.get("Location", ""):
+        raise RuntimeError(f"Connexion refusée pour '{username}' (HTTP {response.status_code}).")
+    return session
+
+
+def virtual_user(base_url, username, password, event_sizes, stop_at, samples, lock, seed):
+    rng = random.Random(seed)
+    session = login(base_url, username, password)
+    event_ids = list(event_sizes)
+    while time.time() < stop_at:
+        event_id = rng.choice(event_ids)
+        size = event_sizes[event_id]
+        steps = [("POST /select_event", "post", "/select_event", {"event_id": str(event_id)}),
+                 ("GET /select_event", "get", "/select_event", None)]
+        if rng.random() < EXPORT_PROBABILITY:
+            steps.append(("GET /export_participants", "get", "/export_participants", None))
+        for label, method, path, data in steps:
+            start = time.perf_counter()
+            try:
+                response = session.request(method, f"{base_url}{path}", data=data, allow_redirects=False, timeout=120)
+                ok = response.status_code == 200
+                size_bytes = len(response.content)
+            except requests.exceptions.RequestException:
+                ok, size_bytes = False, 0
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples.append((label, size, elapsed, ok, size_bytes))
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(pct / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def run_level(base_url, users, duration, event_sizes, password, master_pid):
+    samples = []
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+    memory_peaks = {}
+    sampling = threading.Event()
+
+    def sample_memory():
+        while not sampling.is_set():
+            for pid, rss in worker_memory_mb(master_pid).items():
+                memory_peaks[pid] = max(rss, memory_peaks.get(pid, 0))
+            sampling.wait(0.5)
+
+    memory_thread = None
+    if master_pid:
+        memory_thread = threading.Thread(target=sample_memory, daemon=True)
+        memory_thread.start()
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=virtual_user, args=(base_url, BENCH_USERNAME, password, event_sizes,
+                                                         stop_at, samples, lock, i))
+               for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    sampling.set()
+    if memory_thread:
+        memory_thread.join()
+
+    routes = {}
+    for label, size, seconds, ok, size_bytes in samples:
+        key = f"{label} [{size}]"
+        routes.setdefault(key, []).append((seconds, ok, size_bytes))
+    route_stats = {}
+    for key, values in sorted(routes.items()):
+        latencies = sorted(v[0] for v in values)
+        route_stats[key] = {
+            "requests": len(values),
+            "errors": sum(1 for v in values if not v[1]),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            "avg_kb": round(sum(v[2] for v in values) / len(values) / 1024, 1),
+        }
+    return {
+        "users": users,
+        "duration_s": round(elapsed, 1),
+        "requests": len(samples),
+        "errors": sum(1 for s in samples if not s[3]),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "worker_rss_mb": memory_peaks,
+        "routes": route_stats,
+    }
+
+
+# ===== Rapport et référence =====
+def print_level(result):
+    memory = result["worker_rss_mb"]
+    memory_txt = f", RSS max {max(memory.values())} Mo / total {round(sum(memory.values()), 1)} Mo" if memory else ""
+    print(f"\n=== {result['users']} utilisateur(s) : {result['requests']} requêtes en {result['duration_s']} s, "
+          f"{result['throughput_rps']} req/s, {result['errors']} erreurs{memory_txt}")
+    print(f"{'Route [taille]':<36}{'Req.':>7}{'Err.':>6}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'Ko moy.':>9}")
+    for key, stats in result["routes"].items():
+        print(f"{key:<36}{stats['requests']:>7}{stats['errors']:>6}{stats['p50_ms']:>9}{stats['p95_ms']:>9}"
+              f"{stats['p99_ms']:>9}{stats['avg_kb']:>9}")
+
+
+def baseline_path(name):
+    return os.path.join(BASELINE_DIR, f"loadtest_{name}.json")
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Liste des régressions : p95 en hausse ou débit en baisse au-delà de la tolérance (%)."""
+    regressions = []
+    previous_levels = {level["users"]: level for level in baseline["levels"]}
+    for level in results:
+        previous = previous_levels.get(level["users"])
+        if not previous:
+            continue
+        if previous["throughput_rps"] and level["throughput_rps"] < previous["throughput_rps"] * (1 - tolerance / 100.0):
+            regressions.append(f"{level['users']} utilisateurs : débit {level['throughput_rps']} req/s "
+                               f"(référence {previous['throughput_rps']})")
+        for key, stats in level["routes"].items():
+            ref = previous["routes"].get(key)
+            if ref and ref["p95_ms"] and stats["p95_ms"] > ref["p95_ms"] * (1 + tolerance / 100.0):
+                regressions.append(f"{level['users']} utilisateurs, {key} : p95 {stats['p95_ms']} ms (référence {ref['p95_ms']} ms)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge /select_event et /export_participants.")
+    parser.add_argument("--url", help="Cibler un serveur déjà démarré (sinon gunicorn est lancé localement)")
+    parser.add_argument("--sqlite", help="Base SQLite locale (stand-in MySQL) au lieu de la BDD du .env")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Participants par événement synthétique")
+    parser.add_argument("--users", type=int, nargs="+", default=[1, 5, 10], help="Niveaux de concurrence")
+    parser.add_argument("--duration", type=float, default=20.0, help="Durée de chaque niveau (s)")
+    parser.add_argument("--gunicorn-args", default="", help="Options gunicorn supplémentaires (défaut : gunicorn.conf.py)")
+    parser.add_argument("--baseline", default="default", help="Nom de la référence (benchmarks/baselines/loadtest_<nom>.json)")
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistrer les résultats comme référence")
+    parser.add_argument("--compare", action="store_true", help="Comparer à la référence (code retour 1 si régression)")
+    parser.add_argument("--tolerance", type=float, default=20.0, help="Tolérance de régression (%%)")
+    parser.add_argument("--no-seed", action="store_true", help="Ne pas (ré)insérer les données synthétiques")
+    parser.add_argument("--cleanup", action="store_true", help="Supprimer les données synthétiques à la fin")
+    args = parser.parse_args()
+
+    if args.sqlite:
+        from benchmarks import sqlite_db
+        sqlite_db.install(os.path.abspath(args.sqlite))
+
+    event_sizes = {SEED_FIRST_EVENT_ID + i: size for i, size in enumerate(args.sizes)}
+    if not args.no_seed:
+        print(f"Insertion des données synthétiques : {args.sizes} participants...")
+        event_sizes = seed_database(args.sizes)
+
+    process = None
+    password = os.environ.get("BENCH_PASSWORD", "loadtest-password")
+    try:
+        if args.url:
+            base_url, master_pid = args.url.rstrip("/"), None
+        else:
+            process, base_url = start_gunicorn(args, password)
+            master_pid = process.pid
+        print(f"Cible : {base_url}")
+
+        results = []
+        for users in args.users:
+            result = run_level(base_url, users, args.duration, event_sizes, password, master_pid)
+            print_level(result)
+            results.append(result)
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=20)
+        if args.cleanup:
+            cleanup_database(event_sizes)
+
+    report = {"created_at": datetime.now().isoformat(timespec="seconds"), "sizes": args.sizes,
+              "duration_s": args.duration, "gunicorn_args": args.gunicorn_args, "levels": results}
+    path = baseline_path(re.sub(r"[^\w\-]+", "_", args.baseline))
+    exit_code = 0
+    if args.compare:
+        if not os.path.exists(path):
+            print(f"\nAucune référence trouvée ({path}). Lancer d'abord avec --save-baseline.")
+            exit_code = 2
+        else:
+            with open(path, encoding="utf-8") as f:
+                regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+            if regressions:
+                print(f"\nRÉGRESSIONS (tolérance {args.tolerance} %) :")
+                for line in regressions:
+                    print(f"  - {line}")
+                exit_code = 1
+            else:
+                print(f"\nAucune régression par rapport à la référence (tolérance {args.tolerance} %).")
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Référence enregistrée : {path}")
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
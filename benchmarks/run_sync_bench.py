@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark hors-ligne de la synchronisation Weezevent (get_events + get_registrations).
+Chaque scénario démarre un faux serveur Weezevent (benchmarks/fake_weezevent.py) et exécute la
+synchro dans un sous-processus dédié, branché sur une base SQLite locale (benchmarks/sqlite_db.py).
+Mesures : durée, appels API par seconde, écritures BDD (insérés/MAJ/inchangés) et pic de RSS.
+
+Usage (depuis la racine du dépôt, sans réseau) :
+    python -m benchmarks.run_sync_bench                       # scénarios par défaut
+    python -m benchmarks.run_sync_bench -s p10 p1000 --latency-ms 5 --passes 2
+    python -m benchmarks.run_sync_bench -s p10000 --output bench_output.json
+    python -m benchmarks.run_sync_bench -s p1000 --engine async --latency-ms 20
+
+Rejeu d'un enregistrement de l'API réelle (api_recorder.py, WEEZEVENT_RECORD) à la place du faux
+serveur, avec profil cProfile des passes (lecture : python -m pstats synchro.prof) :
+    python -m benchmarks.run_sync_bench --replay synchro.ndjson.gz --profile synchro.prof
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+# Nom -> taille du jeu de données (événements x participants par événement)
+SCENARIOS = {
+    "p10": {"events": 1, "participants": 10},
+    "p100": {"events": 2, "participants": 100},
+    "p1000": {"events": 1, "participants": 1000},
+    "p10000": {"events": 1, "participants": 10000},
+}
+DEFAULT_SCENARIOS = ["p10", "p100", "p1000"]
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss : kilo-octets sous Linux, octets sous macOS
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _wait_for_server(url, timeout=10):
+    import requests
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(f"{url}/__stats", timeout=1)
+            return True
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    return False
+
+
+# ===== Côté sous-processus : exécution réelle de la synchro =====
+def _api_calls(config):
+    """Compteurs d'appels par endpoint : faux serveur, ou réponses servies par le rejeu."""
+    if config.get("replay"):
+        import api_recorder
+        return api_recorder.replay_stats()
+    import requests
+    return requests.get(f"{config['api_url']}/__stats", timeout=5).json()
+
+
+def run_child(config):
+    """Exécute les passes de synchro dans ce processus et imprime le résultat JSON (dernière ligne)."""
+    os.environ.update({
+        "WEEZEVENT_API_URL": config["api_url"],
+        "WEEZEVENT_API_KEY": "bench-api-key",
+        "WEEZEVENT_USERNAME": "bench",
+        "WEEZEVENT_PASSWORD": "bench",
+    })
+    if config.get("replay"):
+        os.environ["WEEZEVENT_REPLAY"] = config["replay"] # Lu à l'import de weezevent_utils
+    import logging
+    from log_config import setup_logging
+    setup_logging(getattr(logging, config["log_level"])) # Même journalisation que l'application
+
+    from benchmarks import sqlite_db
+    sqlite_db.install(config["db_path"], reset=True) # Avant l'import des modules applicatifs
+    if config.get("engine") == "async":
+        from weezevent_async import get_events, get_registrations
+    else:
+        from weezevent_events import get_events
+        from weezevent_api import get_registrations
+    from sync_report import SyncReport
+
+    profiler = None
+    if config.get("profile"):
+        import cProfile
+        profiler = cProfile.Profile()
+
+    passes = []
+    for pass_index in range(config["passes"]):
+        calls_before = _api_calls(config)
+        if profiler:
+            profiler.enable()
+        report = SyncReport()
+        start = time.perf_counter()
+        get_events()
+        get_registrations(report=report)
+        duration = time.perf_counter() - start
+        if profiler:
+            profiler.disable()
+        report.finish()
+        calls_after = _api_calls(config)
+        calls = {k: calls_after.get(k, 0) - calls_before.get(k, 0) for k in calls_after}
+        total_calls = sum(calls.values())
+        passes.append({
+            "pass": pass_index + 1,
+            "duration_s": round(duration, 3),
+            "api_calls": total_calls,
+            "api_calls_by_endpoint": calls,
+            "calls_per_s": round(total_calls / duration, 1) if duration else None,
+            "participants_api": report.total("participants"),
+            "inserted": report.total("inserted"),
+            "updated": report.total("updated"),
+            "unchanged": report.total("unchanged"),
+            "deleted": report.total("deleted"),
+            "errors": report.total("errors"),
+            "api_quota": report.api_quota,
+            "participants_per_s": round(report.participants_processed / duration, 1) if duration else None,
+        })
+
+    if profiler:
+        profiler.dump_stats(config["profile"])
+    print(json.dumps({"passes": passes, "peak_rss_mb": _peak_rss_mb()}))
+
+
+# ===== Côté parent : orchestration des scénarios =====
+def _run_child_process(name, config):
+    child = subprocess.run([sys.executable, "-m", "benchmarks.run_sync_bench", "--child", json.dumps(config)],
+                           cwd=REPO_ROOT, capture_output=True, text=True)
+    if child.returncode != 0:
+        raise RuntimeError(f"Échec du scénario {name}:\n{child.stderr[-2000:]}")
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def _child_config(args, api_url, tmp_dir):
+    return {"api_url": api_url, "db_path": os.path.join(tmp_dir, "bench.sqlite3"), "passes": args.passes,
+            "log_level": args.log_level, "engine": args.engine,
+            "profile": os.path.abspath(args.profile) if args.profile else None}
+
+
+def run_scenario(name, size, args):
+    port = _free_port()
+    api_url = f"http://127.0.0.1:{port}"
+    server_cmd = [sys.executable, "-m", "benchmarks.fake_weezevent", "--port", str(port),
+                  "--events", str(size["events"]), "--participants", str(size["participants"]),
+                  "--latency-ms", str(args.latency_ms)]
+    if args.answers_latency_ms is not None:
+        server_cmd += ["--answers-latency-ms", str(args.answers_latency_ms)]
+    if args.api_rate_limit:
+        server_cmd += ["--rate-limit", str(args.api_rate_limit)]
+    server = subprocess.Popen(server_cmd, cwd=REPO_ROOT, stdout=subprocess.DEVNULL)
+    try:
+        if not _wait_for_server(api_url):
+            raise RuntimeError(f"Le faux serveur Weezevent n'a pas démarré ({api_url}).")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result = _run_child_process(name, _child_config(args, api_url, tmp_dir))
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+    result.update({"scenario": name, "events": size["events"], "participants_per_event": size["participants"],
+                   "latency_ms": args.latency_ms, "engine": args.engine})
+    return result
+
+
+def run_replay(args):
+    """Scénario 'replay' : synchro sur un enregistrement de l'API (aucun serveur, aucune latence)."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config = _child_config(args, "http://replay.invalid", tmp_dir)
+        config["replay"] = os.path.abspath(args.replay)
+        result = _run_child_process("replay", config)
+    result.update({"scenario": "replay", "recording": args.replay, "latency_ms": 0, "engine": args.engine})
+    return result
+
+
+def print_results(results):
+    header = f"{'Scénario':<10}{'Passe':>6}{'Part.':>8}{'Durée (s)':>11}{'Appels':>8}{'Appels/s':>10}{'Part./s':>9}{'Ins.':>7}{'MAJ':>6}{'Inch.':>7}{'Err.':>6}{'429':>6}{'RSS (Mo)':>10}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        for p in result["passes"]:
+            print(f"{result['scenario']:<10}{p['pass']:>6}{p['participants_api']:>8}{p['duration_s']:>11}{p['api_calls']:>8}"
+                  f"{p['calls_per_s'] or '-':>10}{p['participants_per_s'] or '-':>9}{p['inserted']:>7}{p['updated']:>6}"
+                  f"{p['unchanged']:>7}{p['errors']:>6}{(p.get('api_quota') or {}).get('throttled', 0):>6}"
+                  f"{result['peak_rss_mb']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark hors-ligne de la synchronisation Weezevent.")
+    parser.add_argument("-s", "--scenarios", nargs="+", default=DEFAULT_SCENARIOS, choices=sorted(SCENARIOS))
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Latence simulée par appel API")
+    parser.add_argument("--answers-latency-ms", type=float, default=None, help="Latence spécifique des appels answers")
+    parser.add_argument("--api-rate-limit", type=int, default=0, help="Limite du faux serveur (appels/s, 429 au-delà)")
+    parser.add_argument("--passes", type=int, default=2, help="Passes successives (la 2e mesure une resynchro sans changement)")
+    parser.add_argument("--engine", default="sync", choices=["sync", "async"], help="Moteur de synchro (SYNC_ENGINE)")
+    parser.add_argument("--log-level", default="WARNING", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    parser.add_argument("--replay", help="Enregistrement NDJSON.gz de l'API (api_recorder) rejoué à la place du faux serveur")
+    parser.add_argument("--profile", help="Fichier de profil cProfile des passes de synchro (python -m pstats)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(json.loads(args.child))
+        return
+
+    if args.replay:
+        results = [run_replay(args)]
+    else:
+        results = [run_scenario(name, SCENARIOS[name], args) for name in args.scenarios]
+    print_results(results)
+    if args.profile:
+        print(f"Profil cProfile écrit dans {args.profile} (python -m pstats {args.profile})")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Résultats écrits dans {args.output}")
+
+
+if __name__ == "__main__":
+    main()
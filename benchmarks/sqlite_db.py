@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""
+Remplaçant local de MySQL pour les benchmarks : base SQLite derrière l'interface utilisée
+par l'application (get_connection(), cursor(dictionary=True), execute/executemany, commit...).
+
+Les requêtes MySQL de l'application sont traduites à la volée :
+  - paramètres %s / %(nom)s ;
+  - INSERT ... ON DUPLICATE KEY UPDATE col=VALUES(col)  ->  ON CONFLICT(...) DO UPDATE,
+    avec le rowcount MySQL émulé (1 = insertion, 2 = mise à jour, 0 = inchangé) ;
+  - CURDATE()/NOW(), CREATE INDEX (rendu idempotent) et les options de CREATE TABLE propres à MySQL.
+
+install(path) doit être appelé AVANT d'importer les modules de l'application
+(ils font `from db_connection import get_connection` à l'import).
+"""
+import decimal
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+# Clés uniques des tables métier (cible du ON CONFLICT) ; complétées par les UNIQUE/PRIMARY KEY des CREATE TABLE
+UNIQUE_KEYS = {
+    "evenements": ("event_id",),
+    "inscriptions": ("email", "event_id"),
+}
+
+# Schéma des tables métier (créées par l'application hors de ce dépôt en production)
+BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS evenements (
+    event_id INTEGER PRIMARY KEY,
+    nom TEXT,
+    date TEXT,
+    actif INTEGER DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS inscriptions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nom TEXT, prenom TEXT, email TEXT NOT NULL, telephone TEXT, date_naissance TEXT,
+    adresse TEXT, ville TEXT, code_postal TEXT, event_id INTEGER NOT NULL,
+    source_info TEXT, financement_eligible TEXT, rqth TEXT,
+    amenagements_necessaires TEXT, amenagements_details TEXT,
+    montant_paye TEXT, nom_billet TEXT, code_promo TEXT, date_creation_inscription TEXT,
+    UNIQUE (email, event_id)
+);
+"""
+
+sqlite3.register_adapter(decimal.Decimal, lambda d: str(d))
+
+_RE_NAMED_PARAM = re.compile(r"%\((\w+)\)s")
+_RE_UPSERT = re.compile(r"^\s*INSERT\s+INTO\s+(\w+)\s*\((.*?)\)\s*(VALUES\s*\(.*?\)|SELECT\s.*?)\s*ON\s+DUPLICATE\s+KEY\s+UPDATE\s+(.*?);?\s*$",
+                        re.IGNORECASE | re.DOTALL)
+_RE_VALUES_FN = re.compile(r"VALUES\((\w+)\)", re.IGNORECASE)
+
+
+def translate_sql(sql):
+    """Traduit une requête MySQL de l'application en SQL SQLite. Retourne (sql, upsert_info ou None)."""
+    upsert = None
+    match = _RE_UPSERT.match(sql)
+    if match:
+        table, columns, source, assignments = match.groups()
+        key_cols = UNIQUE_KEYS.get(table.lower())
+        if key_cols:
+            updated_cols = [a.split("=")[0].strip() for a in _split_assignments(assignments)]
+            set_clause = _RE_VALUES_FN.sub(r"excluded.\1", assignments.strip().rstrip(";"))
+            # Ne met à jour que si une valeur change (émulation du rowcount 0 de MySQL)
+            changed = " OR ".join(f"{table}.{c} IS NOT excluded.{c}" for c in updated_cols)
+            if source.strip().upper().startswith("SELECT") and " WHERE " not in source.upper():
+                source = f"{source} WHERE true" # Requis par SQLite pour INSERT ... SELECT ... ON CONFLICT
+            sql = (f"INSERT INTO {table} ({columns}) {source} ON CONFLICT({', '.join(key_cols)}) "
+                   f"DO UPDATE SET {set_clause} WHERE {changed}")
+            upsert = (table, [c.strip() for c in columns.split(",")], key_cols, source)
+
+    sql = _RE_NAMED_PARAM.sub(r":\1", sql).replace("%s", "?")
+    sql = re.sub(r"CURDATE\(\)", "date('now')", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"NOW\(\)", "datetime('now')", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"^\s*CREATE\s+INDEX\s+(?!IF\s)", "CREATE INDEX IF NOT EXISTS ", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"^\s*DROP\s+TEMPORARY\s+TABLE", "DROP TABLE", sql, flags=re.IGNORECASE)
+    if re.match(r"^\s*CREATE\s+TABLE", sql, re.IGNORECASE):
+        sql = _translate_create_table(sql)
+    return sql, upsert
+
+
+def _split_assignments(assignments):
+    return [a for a in assignments.strip().rstrip(";").split(",") if "=" in a]
+
+
+def _translate_create_table(sql):
+    table_match = re.search(r"CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)", sql, re.IGNORECASE)
+    sql = re.sub(r"\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY", "INTEGER PRIMARY KEY AUTOINCREMENT", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bBIGINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY", "INTEGER PRIMARY KEY AUTOINCREMENT", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\)\s*(ENGINE|DEFAULT\s+CHARSET|CHARSET)[^;]*$", ")", sql.strip(), flags=re.IGNORECASE)
+    sql = re.sub(r"ON\s+UPDATE\s+CURRENT_TIMESTAMP", "", sql, flags=re.IGNORECASE)
+    # DECIMAL stocké en texte (comme les montants de 'inscriptions') : '50.00' reste '50.00' à la relecture
+    sql = re.sub(r"\bDECIMAL\(\d+,\s*\d+\)", "TEXT", sql, flags=re.IGNORECASE)
+    lines = []
+    for line in sql.split("\n"):
+        stripped = line.strip()
+        # Index secondaires/FULLTEXT inline : ignorés (non indispensables au benchmark)
+        if re.match(r"^(KEY|INDEX|FULLTEXT)\s", stripped, re.IGNORECASE):
+            continue
+        unique = re.match(r"^UNIQUE\s+(?:KEY|INDEX)\s+\w+\s*(\(.*?\))", stripped, re.IGNORECASE)
+        if unique:
+            line = f"    UNIQUE {unique.group(1)}" + ("," if stripped.endswith(",") else "")
+            if table_match:
+                UNIQUE_KEYS.setdefault(table_match.group(1).lower(),
+                                       tuple(c.strip() for c in unique.group(1).strip("()").split(",")))
+        lines.append(line)
+    sql = "\n".join(lines)
+    sql = re.sub(r",\s*\)\s*$", "\n)", sql) # Virgule finale laissée par une ligne d'index retirée
+    if table_match:
+        pk = re.search(r"^\s*(\w+)\s+[^,\n]*PRIMARY\s+KEY", sql, re.IGNORECASE | re.MULTILINE)
+        if pk and "AUTOINCREMENT" not in pk.group(0).upper():
+            UNIQUE_KEYS.setdefault(table_match.group(1).lower(), (pk.group(1),))
+        composite = re.search(r"PRIMARY\s+KEY\s*\((.*?)\)", sql, re.IGNORECASE)
+        if composite:
+            UNIQUE_KEYS.setdefault(table_match.group(1).lower(), tuple(c.strip() for c in composite.group(1).split(",")))
+    return sql
+
+
+class SQLiteCursor:
+    def __init__(self, connection, dictionary=False):
+        self._conn = connection
+        self._cursor = connection.raw.cursor()
+        self._dictionary = dictionary
+        self.rowcount = -1
+        self.lastrowid = None
+        self.statement = None
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return {desc[0]: value for desc, value in zip(self._cursor.description, row)}
+
+    def execute(self, sql, params=None):
+        translated, upsert = translate_sql(sql)
+        self.statement = translated
+        params = params if params is not None else ()
+        if upsert and "VALUES" in translated.upper().split("ON CONFLICT")[0]:
+            table, columns, key_cols, _source = upsert
+            values = params if isinstance(params, dict) else dict(zip(columns, params))
+            key_values = _key_values(translated, columns, key_cols, values, params)
+            existed = key_values is not None and self._conn.raw.execute(
+                f"SELECT 1 FROM {table} WHERE " + " AND ".join(f"{k} = ?" for k in key_cols), key_values).fetchone()
+            self._cursor.execute(translated, params)
+            changes = self._conn.raw.execute("SELECT changes()").fetchone()[0]
+            self.rowcount = 0 if not changes else (2 if existed else 1)
+        elif upsert:
+            # INSERT ... SELECT ... ON DUPLICATE KEY UPDATE : rowcount MySQL = insertions + 2 x modifications
+            table, columns, key_cols, source = upsert
+            source_sql, _ = translate_sql(source)
+            key_match = " AND ".join(f"t.{k} = s.{k}" for k in key_cols)
+            # Verrou d'écriture pris avant la lecture : un instantané lu puis écrit échouerait (SQLITE_BUSY)
+            # si une autre connexion a validé entre-temps
+            self._conn.raw.execute(f"UPDATE {table} SET {key_cols[0]} = {key_cols[0]} WHERE 0")
+            new_rows = self._conn.raw.execute(
+                f"SELECT COUNT(DISTINCT {' || char(0) || '.join(f's.{k}' for k in key_cols)}) FROM ({source_sql}) s "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {key_match})", params).fetchone()[0]
+            self._cursor.execute(translated, params)
+            changes = self._conn.raw.execute("SELECT changes()").fetchone()[0]
+            self.rowcount = new_rows + 2 * max(changes - new_rows, 0)
+        else:
+            self._cursor.execute(translated, params)
+            self.rowcount = self._cursor.rowcount
+        self.lastrowid = self._cursor.lastrowid
+        return None
+
+    def executemany(self, sql, seq_params):
+        translated, upsert = translate_sql(sql)
+        if upsert and "VALUES" in translated.upper().split("ON CONFLICT")[0]:
+            # Somme des rowcount MySQL (1 insertion, 2 modification, 0 inchangé), comme un INSERT multi-lignes
+            total = 0
+            for params in seq_params:
+                self.execute(sql, params)
+                total += self.rowcount
+            self.rowcount = total
+            return
+        self.statement = translated
+        self._cursor.executemany(translated, list(seq_params))
+        self.rowcount = self._cursor.rowcount
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(r) for r in self._cursor.fetchall()]
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._cursor.fetchmany(size)]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._row(row)
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def close(self):
+        self._cursor.close()
+
+
+def _key_values(translated, columns, key_cols, values, params):
+    """Valeurs de la clé unique pour la pré-vérification d'existence (émulation rowcount)."""
+    try:
+        if isinstance(params, dict):
+            # Colonnes -> noms de paramètres (%(x)s) dans l'ordre du VALUES
+            values_part = translated.split("VALUES", 1)[1].split("ON CONFLICT")[0]
+            names = re.findall(r":(\w+)", values_part)
+            mapping = dict(zip(columns, names))
+            return [params[mapping[k]] for k in key_cols]
+        return [values[k] for k in key_cols]
+    except (KeyError, IndexError):
+        return None
+
+
+class SQLiteConnection:
+    def __init__(self, path):
+        self.raw = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.raw.execute("PRAGMA journal_mode=WAL")
+
+    def cursor(self, dictionary=False, **kwargs):
+        return SQLiteCursor(self, dictionary=dictionary)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def start_transaction(self, **kwargs):
+        pass # SQLite ouvre implicitement la transaction à la première écriture
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        self.raw.close()
+
+
+_db_path = None
+_install_lock = threading.Lock()
+
+
+def get_connection():
+    """Équivalent de db_connection.get_connection() : une connexion SQLite par appel."""
+    if _db_path is None:
+        raise ConnectionError("Base SQLite de benchmark non installée (appeler install()).")
+    return SQLiteConnection(_db_path)
+
+
+def install(path, reset=False):
+    """Crée la base SQLite et remplace db_connection.get_connection (et les références déjà importées)."""
+    global _db_path
+    with _install_lock:
+        if reset and os.path.exists(path):
+            os.remove(path)
+        _db_path = path
+        raw = sqlite3.connect(path)
+        raw.executescript(BASE_SCHEMA)
+        raw.commit()
+        raw.close()
+
+        import db_connection
+        original = db_connection.get_connection
+        db_connection.get_connection = get_connection
+        for module in list(sys.modules.values()):
+            if getattr(module, "get_connection", None) is original:
+                module.get_connection = get_connection
+    return path
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Versions des données affichées, pour les requêtes conditionnelles (ETag / Last-Modified).
+
+Table 'data_versions' : une ligne par périmètre ("events" pour la liste des événements,
+"event:<id>" pour les participants d'un événement). La synchro change la version d'un périmètre
+dès qu'elle y insère ou modifie des lignes ; les routes comparent l'ETag reçu à la version
+courante et répondent 304 sans interroger 'inscriptions'.
+
+La version est un horodatage en microsecondes (strictement croissant par périmètre). Un périmètre
+encore absent de la table reçoit une version à sa première lecture.
+"""
+import logging
+import time
+from datetime import datetime
+import mysql.connector
+from db_connection import get_connection
+from db_schema import ensure_schema
+from parsing_utils import to_datetime
+
+EVENTS_SCOPE = "events"
+
+
+def event_scope(event_id):
+    return f"event:{int(event_id)}"
+
+
+def _new_version():
+    return time.time_ns() // 1000
+
+
+def _upsert(cursor, scopes):
+    now = datetime.now().replace(microsecond=0)
+    version = _new_version()
+    rows = [(scope, version, now) for scope in scopes]
+    cursor.executemany("""
+        INSERT INTO data_versions (scope, version, updated_at)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            version = VALUES(version),
+            updated_at = VALUES(updated_at)
+    """, rows)
+    return {scope: (version, now) for scope in scopes}
+
+
+def bump(scopes):
+    """Nouvelle version pour les périmètres donnés (appelé par la synchro après écriture)."""
+    scopes = sorted(set(scopes))
+    if not scopes or not ensure_schema():
+        return
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        _upsert(cursor, scopes)
+        conn.commit()
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Erreur mise à jour des versions de données {scopes}: {db_err}")
+        if conn: conn.rollback()
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+def bump_events(event_ids):
+    """Raccourci : nouvelle version des participants des événements donnés."""
+    bump(event_scope(event_id) for event_id in event_ids if event_id is not None)
+
+
+def get_versions(scopes):
+    """
+    Versions courantes {périmètre: (version, updated_at)} en une requête ; les périmètres absents
+    sont initialisés. Retourne {} si la BDD est indisponible (pas de réponse conditionnelle).
+    """
+    scopes = list(dict.fromkeys(scopes))
+    if not scopes or not ensure_schema():
+        return {}
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        placeholders = ", ".join(["%s"] * len(scopes))
+        cursor.execute(f"SELECT scope, version, updated_at FROM data_versions WHERE scope IN ({placeholders})",
+                       tuple(scopes))
+        versions = {scope: (int(version), to_datetime(updated_at)) for scope, version, updated_at in cursor.fetchall()}
+        missing = [scope for scope in scopes if scope not in versions]
+        if missing:
+            versions.update(_upsert(cursor, missing))
+            conn.commit()
+        return versions
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Erreur lecture des versions de données: {db_err}")
+        return {}
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
@@ -1,60 +1,101 @@
 import mysql.connector
 from mysql.connector import pooling
 import os
+import threading
+import time
 from dotenv import load_dotenv
 import logging # Pour logger les erreurs du pool
 
 load_dotenv()
 
+# Taille du pool par processus : borne aussi le nombre de threads gunicorn (voir gunicorn.conf.py)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+# Attente max (s) d'une connexion libre quand toutes sont prises, au lieu d'échouer immédiatement
+POOL_WAIT_SECONDS = float(os.getenv("DB_POOL_WAIT_SECONDS", 5))
+
 # Configuration du pool de connexions
+# Le pool est créé à la première demande de connexion, dans le processus qui l'utilise :
+# avec gunicorn preload_app, le maître importe l'app sans ouvrir de connexions, et
+# chaque worker forké crée son propre pool (jamais de sockets MySQL partagées entre processus).
 cnx_pool = None
-try:
-    db_config = {
-        "host": os.getenv("DB_HOST"),
-        "user": os.getenv("DB_USER"),
-        "password": os.getenv("DB_PASSWORD"),
-        "database": os.getenv("DB_NAME"),
-        "port": int(os.getenv("DB_PORT", 3306)), # Port DB, défaut 3306
-        "auth_plugin": 'mysql_native_password' # Ou l'auth plugin nécessaire
-    }
-
-    # Validation des paramètres essentiels
-    required_keys = ["host", "user", "password", "database"]
-    if any(not db_config.get(key) for key in required_keys):
-        raise ValueError("Variables d'environnement BDD manquantes (HOST, USER, PASSWORD, DATABASE).")
-
-    # Création du pool de connexions (une seule fois au démarrage)
-    print(f"Initialisation du pool de connexions MySQL vers {db_config['host']}:{db_config['port']}...")
-    cnx_pool = pooling.MySQLConnectionPool(
-        pool_name = "flask_weezevent_pool",
-        pool_size = 5, # Nombre de connexions maintenues ouvertes
-        pool_reset_session=True, # Recommandé pour réinitialiser l'état de la session entre les utilisations
-        **db_config # Passe les autres configs (host, user, etc.)
-    )
-    print("Pool de connexions initialisé.")
-
-except ValueError as e:
-    logging.error(f"Erreur de configuration DB: {e}")
-    # Le pool reste à None
-except mysql.connector.Error as err:
-    logging.error(f"Erreur lors de l'initialisation du pool de connexions MySQL: {err}")
-    # Le pool reste à None
-except Exception as e:
-    logging.error(f"Erreur inattendue lors de la configuration du pool DB: {e}")
-    # Le pool reste à None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def init_pool():
+    """ Crée le pool de connexions pour le processus courant. Retourne le pool (ou None si échec). """
+    global cnx_pool, _pool_pid
+    with _pool_lock:
+        if cnx_pool is not None and _pool_pid == os.getpid():
+            return cnx_pool
+        cnx_pool = None
+        try:
+            db_config = {
+                "host": os.getenv("DB_HOST"),
+                "user": os.getenv("DB_USER"),
+                "password": os.getenv("DB_PASSWORD"),
+                "database": os.getenv("DB_NAME"),
+                "port": int(os.getenv("DB_PORT", 3306)), # Port DB, défaut 3306
+                "auth_plugin": 'mysql_native_password' # Ou l'auth plugin nécessaire
+            }
+
+            # Validation des paramètres essentiels
+            required_keys = ["host", "user", "password", "database"]
+            if any(not db_config.get(key) for key in required_keys):
+                raise ValueError("Variables d'environnement BDD manquantes (HOST, USER, PASSWORD, DATABASE).")
+
+            # Création du pool de connexions (une seule fois par processus)
+            print(f"Initialisation du pool de connexions MySQL vers {db_config['host']}:{db_config['port']} (pid {os.getpid()})...")
+            cnx_pool = pooling.MySQLConnectionPool(
+                pool_name = f"flask_weezevent_pool_{os.getpid()}",
+                pool_size = POOL_SIZE, # Nombre de connexions maintenues ouvertes
+                pool_reset_session=True, # Recommandé pour réinitialiser l'état de la session entre les utilisations
+                **db_config # Passe les autres configs (host, user, etc.)
+            )
+            _pool_pid = os.getpid()
+            print("Pool de connexions initialisé.")
+
+        except ValueError as e:
+            logging.error(f"Erreur de configuration DB: {e}")
+            # Le pool reste à None
+        except mysql.connector.Error as err:
+            logging.error(f"Erreur lors de l'initialisation du pool de connexions MySQL: {err}")
+            # Le pool reste à None
+        except Exception as e:
+            logging.error(f"Erreur inattendue lors de la configuration du pool DB: {e}")
+            # Le pool reste à None
+        return cnx_pool
+
+
+def reset_pool():
+    """ Oublie le pool hérité d'un processus parent (hook post_fork gunicorn) ; recréé à la demande. """
+    global cnx_pool, _pool_pid
+    with _pool_lock:
+        cnx_pool = None
+        _pool_pid = None
+
 
 def get_connection():
-    """ Obtient une connexion depuis le pool. """
-    if cnx_pool is None:
+    """ Obtient une connexion depuis le pool (attend jusqu'à POOL_WAIT_SECONDS si le pool est épuisé). """
+    pool = cnx_pool if (cnx_pool is not None and _pool_pid == os.getpid()) else init_pool()
+    if pool is None:
         logging.error("Tentative d'obtenir une connexion alors que le pool n'est pas initialisé.")
         raise ConnectionError("Le pool de connexions à la base de données n'a pas pu être initialisé.")
 
-    try:
-        conn = cnx_pool.get_connection()
-        return conn
-    except mysql.connector.Error as err:
-        logging.error(f"Erreur pour obtenir une connexion du pool: {err}")
-        raise ConnectionError(f"Impossible d'obtenir une connexion du pool: {err}")
-    except Exception as e:
-         logging.error(f"Erreur inattendue lors de l'obtention d'une connexion du pool: {e}")
-         raise ConnectionError(f"Erreur inattendue pour obtenir une connexion du pool: {e}")
\ No newline at end of file
+    deadline = time.monotonic() + POOL_WAIT_SECONDS
+    while True:
+        try:
+            conn = pool.get_connection()
+            return conn
+        except mysql.connector.errors.PoolError as err:
+            # Toutes les connexions sont prêtées : on patiente brièvement plutôt que d'échouer
+            if time.monotonic() >= deadline:
+                logging.error(f"Pool de connexions épuisé après {POOL_WAIT_SECONDS}s d'attente: {err}")
+                raise ConnectionError(f"Impossible d'obtenir une connexion du pool: {err}")
+            time.sleep(0.05)
+        except mysql.connector.Error as err:
+            logging.error(f"Erreur pour obtenir une connexion du pool: {err}")
+            raise ConnectionError(f"Impossible d'obtenir une connexion du pool: {err}")
+        except Exception as e:
+             logging.error(f"Erreur inattendue lors de l'obtention d'une connexion du pool: {e}")
+             raise ConnectionError(f"Erreur inattendue pour obtenir une connexion du pool: {e}")
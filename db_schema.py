@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Tables techniques créées par l'application (rapports de synchro, caches...).
+Les tables métier 'evenements' et 'inscriptions' existent déjà en BDD et ne sont pas créées ici.
+Toutes les instructions sont idempotentes (CREATE TABLE IF NOT EXISTS ; les index déjà présents
+sur 'inscriptions' sont ignorés).
+
+Les tables techniques sont créées à la première utilisation (ensure_schema). Les index de la table
+métier 'inscriptions' (DDL potentiellement long sur une table volumineuse) ne sont créés que par
+ensure_indexes, étape de migration explicite : au démarrage de gunicorn (processus maître, avant les
+workers, gunicorn.conf.py on_starting), de `python app.py`, ou à la main :
+
+    python db_schema.py
+"""
+import logging
+import threading
+import mysql.connector
+from db_connection import get_connection
+
+# Une entrée par table : exécutées dans l'ordre par ensure_schema()
+SCHEMA_STATEMENTS = [
+    # Rapport de chaque exécution de la synchronisation (détail par événement en JSON)
+    """
+    CREATE TABLE IF NOT EXISTS sync_runs (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        started_at DATETIME NOT NULL,
+        finished_at DATETIME NULL,
+        duration_seconds DECIMAL(10,3) NULL,
+        status VARCHAR(30) NOT NULL,
+        message VARCHAR(255) NULL,
+        events_count INT NOT NULL DEFAULT 0,
+        participants_api INT NOT NULL DEFAULT 0,
+        participants_processed INT NOT NULL DEFAULT 0,
+        answers_calls INT NOT NULL DEFAULT 0,
+        inserted INT NOT NULL DEFAULT 0,
+        updated INT NOT NULL DEFAULT 0,
+        unchanged INT NOT NULL DEFAULT 0,
+        errors INT NOT NULL DEFAULT 0,
+        api_seconds DECIMAL(10,3) NOT NULL DEFAULT 0,
+        throughput_per_s DECIMAL(10,2) NULL,
+        details MEDIUMTEXT NULL,
+        KEY idx_sync_runs_started_at (started_at)
+    ) DEFAULT CHARSET=utf8mb4
+    """,
+    # Cache des réponses formulaire par participant (voir answers_cache.py)
+    """
+    CREATE TABLE IF NOT EXISTS participant_answers_cache (
+        id_participant BIGINT NOT NULL PRIMARY KEY,
+        event_id INT NOT NULL,
+        answers MEDIUMTEXT NOT NULL,
+        validator VARCHAR(64) NULL,
+        etag VARCHAR(255) NULL,
+        fetched_at DATETIME NOT NULL,
+        KEY idx_answers_cache_event (event_id)
+    ) DEFAULT CHARSET=utf8mb4
+    """,
+    # Prix de base des billets par ticket_id (voir ticket_price_cache.py)
+    """
+    CREATE TABLE IF NOT EXISTS ticket_prices (
+        ticket_id BIGINT NOT NULL PRIMARY KEY,
+        event_id INT NOT NULL,
+        price DECIMAL(10,2) NULL,
+        fetched_at DATETIME NOT NULL,
+        KEY idx_ticket_prices_event (event_id)
+    ) DEFAULT CHARSET=utf8mb4
+    """,
+    # Date du dernier chargement /tickets réussi par événement, y compris sans billet (voir ticket_price_cache.py)
+    """
+    CREATE TABLE IF NOT EXISTS ticket_prices_events (
+        event_id INT NOT NULL PRIMARY KEY,
+        fetched_at DATETIME NOT NULL
+    ) DEFAULT CHARSET=utf8mb4
+    """,
+    # Agrégats par événement pour le tableau de bord (voir event_stats.py)
+    """
+    CREATE TABLE IF NOT EXISTS event_stats (
+        event_id INT NOT NULL PRIMARY KEY,
+        participants INT NOT NULL DEFAULT 0,
+        montant_total DECIMAL(12,2) NOT NULL DEFAULT 0,
+        promo_codes INT NOT NULL DEFAULT 0,
+        rqth_oui INT NOT NULL DEFAULT 0,
+        financement_oui INT NOT NULL DEFAULT 0,
+        amenagements_oui INT NOT NULL DEFAULT 0,
+        tickets MEDIUMTEXT NULL,
+        computed_at DATETIME NOT NULL
+    ) DEFAULT CHARSET=utf8mb4
+    """,
+    # Version des données par périmètre, pour ETag/Last-Modified (voir data_versions.py)
+    """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        scope VARCHAR(50) NOT NULL PRIMARY KEY,
+        version BIGINT NOT NULL,
+        updated_at DATETIME NOT NULL
+    ) DEFAULT CHARSET=utf8mb4
+    """,
+    # État partagé par les workers de la surveillance BDD : dernier résultat, dernière alerte (voir monitoring.py)
+    """
+    CREATE TABLE IF NOT EXISTS monitoring_state (
+        name VARCHAR(50) NOT NULL PRIMARY KEY,
+        value MEDIUMTEXT NULL,
+        updated_at DATETIME NOT NULL
+    ) DEFAULT CHARSET=utf8mb4
+    """,
+    # File durable des notifications webhook Weezevent (voir webhook_queue.py)
+    """
+    CREATE TABLE IF NOT EXISTS webhook_events (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        received_at DATETIME NOT NULL,
+        action VARCHAR(20) NOT NULL,
+        event_id INT NULL,
+        participant_id BIGINT NULL,
+        payload MEDIUMTEXT NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        claim_token VARCHAR(32) NULL,
+        claimed_at DATETIME NULL,
+        attempts INT NOT NULL DEFAULT 0,
+        processed_at DATETIME NULL,
+        error VARCHAR(255) NULL,
+        email VARCHAR(255) NULL,
+        KEY idx_webhook_events_status (status, id),
+        KEY idx_webhook_events_event (event_id, email, received_at)
+    ) DEFAULT CHARSET=utf8mb4
+    """,
+    # Progression des synchros (reprise, budget, annulation ; voir sync_checkpoints.py)
+    """
+    CREATE TABLE IF NOT EXISTS sync_progress (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        started_at DATETIME NOT NULL,
+        heartbeat_at DATETIME NOT NULL,
+        finished_at DATETIME NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'running',
+        event_ids TEXT NULL,
+        events_done INT NOT NULL DEFAULT 0,
+        cancel_requested TINYINT(1) NOT NULL DEFAULT 0,
+        resumes INT NOT NULL DEFAULT 0,
+        KEY idx_sync_progress_status (status, started_at)
+    ) DEFAULT CHARSET=utf8mb4
+    """,
+    # Bail de la synchro en cours : une seule synchro à la fois, tous workers confondus (voir sync_checkpoints.py)
+    """
+    CREATE TABLE IF NOT EXISTS sync_lease (
+        name VARCHAR(50) NOT NULL PRIMARY KEY,
+        owner VARCHAR(32) NULL,
+        heartbeat_at DATETIME NOT NULL
+    ) DEFAULT CHARSET=utf8mb4
+    """,
+    # Points de reprise par événement d'une synchro (voir sync_checkpoints.py)
+    """
+    CREATE TABLE IF NOT EXISTS sync_checkpoints (
+        progress_id INT NOT NULL,
+        event_id INT NOT NULL,
+        participants_done INT NOT NULL DEFAULT 0,
+        participants_total INT NULL,
+        event_done TINYINT(1) NOT NULL DEFAULT 0,
+        updated_at DATETIME NOT NULL,
+        PRIMARY KEY (progress_id, event_id)
+    ) DEFAULT CHARSET=utf8mb4
+    """,
+]
+
+# Index de la table métier 'inscriptions' pour la recherche/tri de /api/participants (participants_search.py) :
+# préfixe LIKE 'xxx%' et ORDER BY au sein d'un événement. (email, event_id) est déjà indexé par la clé unique.
+# Créés par ensure_indexes (migration au démarrage), jamais depuis une requête web.
+INDEX_STATEMENTS = [
+    "CREATE INDEX idx_inscriptions_event_nom ON inscriptions (event_id, nom, prenom)",
+    "CREATE INDEX idx_inscriptions_event_prenom ON inscriptions (event_id, prenom)",
+    "CREATE INDEX idx_inscriptions_event_email ON inscriptions (event_id, email)",
+    "CREATE INDEX idx_inscriptions_event_date ON inscriptions (event_id, date_creation_inscription)",
+]
+ER_DUP_KEYNAME = 1061 # Index déjà existant (MySQL)
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_schema():
+    """Crée les tables techniques manquantes (une seule fois par processus). Retourne True si OK."""
+    global _schema_ready
+    if _schema_ready:
+        return True
+    with _schema_lock:
+        if _schema_ready:
+            return True
+        conn = None
+        cursor = None
+        try:
+            conn = get_connection()
+            cursor = conn.cursor()
+            for statement in SCHEMA_STATEMENTS:
+                cursor.execute(statement)
+            conn.commit()
+            _schema_ready = True
+            logging.debug("Schéma des tables techniques vérifié.")
+        except (mysql.connector.Error, ConnectionError) as db_err:
+            logging.error(f"Erreur création/vérification des tables techniques: {db_err}")
+        finally:
+            if cursor: cursor.close()
+            if conn: conn.close()
+    return _schema_ready
+
+
+def ensure_indexes():
+    """
+    Migration : crée les index manquants de 'inscriptions' (INDEX_STATEMENTS). À appeler au démarrage,
+    hors requête web (la création d'un index peut durer sur une table volumineuse). Retourne True si OK.
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        if not conn:
+            raise ConnectionError("Connexion DB impossible depuis le pool.")
+        cursor = conn.cursor()
+        for statement in INDEX_STATEMENTS:
+            try:
+                cursor.execute(statement)
+                logging.info(f"Index créé : {statement}")
+            except mysql.connector.Error as idx_err:
+                if getattr(idx_err, "errno", None) != ER_DUP_KEYNAME: # Index absent mais non créable : recherche plus lente
+                    logging.warning(f"Index non créé ({statement}): {idx_err}")
+        conn.commit()
+        return True
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Erreur création des index de 'inscriptions': {db_err}")
+        return False
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+if __name__ == "__main__":
+    from log_config import setup_logging
+    setup_logging(logging.INFO)
+    ok = ensure_schema() and ensure_indexes()
+    print("Migration du schéma terminée." if ok else "Migration du schéma en erreur (voir journaux).")
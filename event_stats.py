@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+Agrégats par événement pour le tableau de bord (table 'event_stats', une ligne par événement).
+
+Les chiffres (participants, montant total, codes promo, RQTH, financement, aménagements, détail
+par type de billet) sont calculés en SQL par GROUP BY sur 'inscriptions' : aucune ligne participant
+n'est transférée vers Python. La synchro ne recalcule que les événements dont des participants ont
+été insérés ou modifiés (SyncReport.changed_event_ids) ; le tableau de bord calcule à la demande
+les événements encore absents de la table.
+"""
+import decimal
+import json
+import logging
+from datetime import datetime
+import mysql.connector
+from db_connection import get_connection
+from db_schema import ensure_schema
+from parsing_utils import parse_amount, to_datetime
+
+CENTS = decimal.Decimal("0.01")
+SUMMARY_FIELDS = ("participants", "montant_total", "promo_codes", "rqth_oui", "financement_oui", "amenagements_oui")
+
+# Un groupe par (événement, type de billet) ; les totaux de l'événement sont la somme des groupes
+SQL_ROLLUP = """
+    SELECT event_id, nom_billet,
+           COUNT(*) AS participants,
+           SUM(montant_paye) AS montant_total,
+           SUM(CASE WHEN code_promo IS NOT NULL AND code_promo <> '' THEN 1 ELSE 0 END) AS promo_codes,
+           SUM(CASE WHEN rqth = 'Oui' THEN 1 ELSE 0 END) AS rqth_oui,
+           SUM(CASE WHEN financement_eligible = 'Oui' THEN 1 ELSE 0 END) AS financement_oui,
+           SUM(CASE WHEN amenagements_necessaires = 'Oui' THEN 1 ELSE 0 END) AS amenagements_oui
+    FROM inscriptions
+    WHERE event_id IN ({placeholders})
+    GROUP BY event_id, nom_billet
+"""
+
+
+def _empty_summary(event_id):
+    summary = {field: 0 for field in SUMMARY_FIELDS}
+    summary["montant_total"] = parse_amount(0)
+    summary.update({"event_id": event_id, "tickets": []})
+    return summary
+
+
+def compute_event_stats(cursor, event_ids):
+    """Calcule les agrégats (curseur dictionary=True). Retourne {event_id: résumé}."""
+    if not event_ids:
+        return {}
+    cursor.execute(SQL_ROLLUP.format(placeholders=", ".join(["%s"] * len(event_ids))), tuple(event_ids))
+    summaries = {event_id: _empty_summary(event_id) for event_id in event_ids}
+    for row in cursor.fetchall():
+        summary = summaries.setdefault(row["event_id"], _empty_summary(row["event_id"]))
+        amount = (parse_amount(row["montant_total"]) or parse_amount(0)).quantize(CENTS)
+        for field in SUMMARY_FIELDS:
+            summary[field] += amount if field == "montant_total" else int(row[field] or 0)
+        summary["tickets"].append({"nom_billet": row["nom_billet"] or "", "participants": int(row["participants"]),
+                                   "montant_total": str(amount)})
+    for summary in summaries.values():
+        summary["tickets"].sort(key=lambda ticket: ticket["participants"], reverse=True)
+    return summaries
+
+
+def refresh_event_stats(event_ids):
+    """Recalcule et enregistre les agrégats des événements donnés (appelé en fin de synchro)."""
+    event_ids = sorted({int(event_id) for event_id in event_ids if event_id is not None})
+    if not event_ids or not ensure_schema():
+        return {}
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        summaries = compute_event_stats(cursor, event_ids)
+        now = datetime.now().replace(microsecond=0)
+        cursor.executemany("""
+            INSERT INTO event_stats (event_id, participants, montant_total, promo_codes, rqth_oui,
+                                     financement_oui, amenagements_oui, tickets, computed_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                participants = VALUES(participants),
+                montant_total = VALUES(montant_total),
+                promo_codes = VALUES(promo_codes),
+                rqth_oui = VALUES(rqth_oui),
+                financement_oui = VALUES(financement_oui),
+                amenagements_oui = VALUES(amenagements_oui),
+                tickets = VALUES(tickets),
+                computed_at = VALUES(computed_at)
+        """, [(s["event_id"], s["participants"], s["montant_total"], s["promo_codes"], s["rqth_oui"],
+               s["financement_oui"], s["amenagements_oui"], json.dumps(s["tickets"], ensure_ascii=False), now)
+              for s in summaries.values()])
+        conn.commit()
+        logging.info(f"Agrégats tableau de bord recalculés pour {len(summaries)} événement(s).")
+        for summary in summaries.values():
+            summary["computed_at"] = now
+        return summaries
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Erreur recalcul agrégats événements {event_ids}: {db_err}")
+        if conn: conn.rollback()
+        return {}
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+def load_event_stats(event_ids):
+    """
+    Agrégats enregistrés des événements demandés ({event_id: résumé}) ; ceux qui n'ont pas encore
+    de ligne dans 'event_stats' sont calculés et enregistrés au passage.
+    """
+    event_ids = [int(event_id) for event_id in event_ids]
+    if not event_ids or not ensure_schema():
+        return {}
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        placeholders = ", ".join(["%s"] * len(event_ids))
+        cursor.execute(f"SELECT event_id, participants, montant_total, promo_codes, rqth_oui, financement_oui, "
+                       f"amenagements_oui, tickets, computed_at FROM event_stats WHERE event_id IN ({placeholders})",
+                       tuple(event_ids))
+        rows = cursor.fetchall()
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Erreur lecture agrégats événements: {db_err}")
+        return {}
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+    summaries = {}
+    for row in rows:
+        summary = {field: int(row[field] or 0) for field in SUMMARY_FIELDS if field != "montant_total"}
+        summary["montant_total"] = parse_amount(row["montant_total"]) or parse_amount(0)
+        try:
+            summary["tickets"] = json.loads(row["tickets"] or "[]")
+        except ValueError:
+            summary["tickets"] = []
+        summary.update({"event_id": int(row["event_id"]), "computed_at": to_datetime(row["computed_at"])})
+        summaries[summary["event_id"]] = summary
+    missing = [event_id for event_id in event_ids if event_id not in summaries]
+    if missing:
+        summaries.update(refresh_event_stats(missing))
+    return summaries
+
+
+def totals(summaries):
+    """Totaux tous événements confondus (somme des résumés)."""
+    result = {field: 0 for field in SUMMARY_FIELDS}
+    result["montant_total"] = parse_amount(0)
+    for summary in summaries:
+        for field in SUMMARY_FIELDS:
+            result[field] += summary[field]
+    return result
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Exports participants précalculés (CSV, XLSX optionnel) stockés sur disque.
+
+La synchro régénère l'export d'un événement dès que ses écritures sont terminées (participants
+insérés/modifiés) ; /export_participants se contente ensuite d'envoyer le fichier. Le nom du fichier
+contient la version des données (data_versions) : participants_<event_id>_<version>.<format>.
+L'écriture est atomique (fichier temporaire du même dossier puis os.replace) et les versions
+précédentes de l'événement sont supprimées. Un export absent (premier accès, redémarrage sur un
+disque vierge) est généré à la demande.
+
+Variables d'environnement : EXPORT_SNAPSHOT_DIR (défaut : ./export_snapshots),
+EXPORT_XLSX=true pour précalculer aussi le XLSX pendant la synchro (nécessite openpyxl).
+"""
+import csv
+import glob
+import logging
+import os
+import tempfile
+import mysql.connector
+from db_connection import get_connection
+import data_versions
+from parsing_utils import format_date, format_amount, to_datetime
+
+try:
+    from openpyxl import Workbook # Optionnel : export XLSX
+except ImportError:
+    Workbook = None
+
+SNAPSHOT_DIR = os.getenv("EXPORT_SNAPSHOT_DIR",
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), "export_snapshots"))
+PRECOMPUTE_XLSX = os.getenv("EXPORT_XLSX", "false").lower() == "true"
+PLACEHOLDER = "Non renseigné"
+
+MIMETYPES = {
+    "csv": "text/csv; charset=utf-8-sig",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+HEADER = [
+    "Nom", "Prénom", "Email", "Téléphone", "Date Naissance",
+    "Adresse", "Ville", "Code Postal",
+    "Date Inscription", "Heure Inscription",
+    "Connu la formation", "Éligible Financement", "RQTH",
+    "Besoin Aménagements", "Détails Aménagements",
+    "Montant Payé",
+    "Type Billet", "Code Promo Utilisé ?"
+]
+
+
+def format_available(fmt):
+    """Format d'export utilisable dans ce déploiement (XLSX : openpyxl installé)."""
+    return fmt == "csv" or (fmt == "xlsx" and Workbook is not None)
+
+
+def export_row(p):
+    """Ligne d'export (colonnes de HEADER) d'un participant de la table 'inscriptions'."""
+    amenagements = p.get("amenagements_necessaires") or PLACEHOLDER
+    needs_details = amenagements == "Oui"
+
+    date_creation_str = PLACEHOLDER
+    heure_creation_str = ""
+    parsed_creation = to_datetime(p.get("date_creation_inscription"))
+    if parsed_creation:
+        date_creation_str = parsed_creation.strftime('%d/%m/%Y')
+        heure_creation_str = parsed_creation.strftime('%H:%M:%S')
+
+    return [
+        p.get("nom") or PLACEHOLDER, p.get("prenom") or PLACEHOLDER, p.get("email") or PLACEHOLDER,
+        p.get("telephone") or PLACEHOLDER, format_date(p.get("date_naissance"), PLACEHOLDER),
+        p.get("adresse") or PLACEHOLDER, p.get("ville") or PLACEHOLDER, p.get("code_postal") or PLACEHOLDER,
+        date_creation_str, heure_creation_str,
+        p.get("source_info") or PLACEHOLDER, p.get("financement_eligible") or PLACEHOLDER, p.get("rqth") or PLACEHOLDER,
+        amenagements, p.get("amenagements_details") or (PLACEHOLDER if needs_details else ""),
+        format_amount(p.get("montant_paye"), PLACEHOLDER, export=True),
+        p.get("nom_billet") or PLACEHOLDER,
+        "Oui" if p.get("code_promo") else "Non",
+    ]
+
+
+def _fetch_participants(event_id):
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM inscriptions WHERE event_id=%s ORDER BY nom ASC, prenom ASC", (event_id,))
+        return cursor.fetchall()
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+def _write_csv(path, participants):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow(HEADER)
+        for p in participants:
+            writer.writerow(export_row(p))
+
+
+def _write_xlsx(path, participants):
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Participants")
+    sheet.append(HEADER)
+    for p in participants:
+        sheet.append(export_row(p))
+    workbook.save(path)
+
+
+_WRITERS = {"csv": _write_csv, "xlsx": _write_xlsx}
+
+
+def snapshot_path(event_id, version, fmt):
+    return os.path.join(SNAPSHOT_DIR, f"participants_{int(event_id)}_{int(version)}.{fmt}")
+
+
+def _purge_old_versions(event_id, fmt, keep_path):
+    for path in glob.glob(os.path.join(SNAPSHOT_DIR, f"participants_{int(event_id)}_*.{fmt}")):
+        if path != keep_path:
+            try:
+                os.remove(path)
+            except OSError:
+                pass # Déjà supprimé par un autre processus
+
+
+def default_formats():
+    """Formats régénérés par la synchro."""
+    return ["csv", "xlsx"] if PRECOMPUTE_XLSX else ["csv"]
+
+
+def write_snapshots(event_id, formats=None):
+    """
+    (Ré)génère les exports de l'événement pour la version courante des données.
+    Retourne {format: chemin} ; {} si l'événement n'a aucun participant ou en cas d'erreur.
+    """
+    formats = [fmt for fmt in (formats or default_formats()) if format_available(fmt)]
+    scope = data_versions.event_scope(event_id)
+    # Version lue AVANT les participants : une écriture concurrente donnera au pire un fichier plus récent que son nom
+    version = data_versions.get_versions([scope]).get(scope, (None, None))[0]
+    if version is None:
+        return {}
+    try:
+        participants = _fetch_participants(event_id)
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Export précalculé event {event_id}: lecture participants impossible: {db_err}")
+        return {}
+    if not participants:
+        return {}
+
+    paths = {}
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        for fmt in formats:
+            path = snapshot_path(event_id, version, fmt)
+            fd, tmp_path = tempfile.mkstemp(dir=SNAPSHOT_DIR, prefix=f".participants_{int(event_id)}_", suffix=".tmp")
+            os.close(fd)
+            try:
+                _WRITERS[fmt](tmp_path, participants)
+                os.replace(tmp_path, path) # Atomique : jamais de fichier partiel servi
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            _purge_old_versions(event_id, fmt, path)
+            paths[fmt] = path
+    except OSError as os_err:
+        logging.error(f"Export précalculé event {event_id}: écriture impossible dans {SNAPSHOT_DIR}: {os_err}")
+    logging.debug(f"Exports précalculés event {event_id} (version {version}): {sorted(paths)}")
+    return paths
+
+
+def get_snapshot(event_id, fmt="csv"):
+    """Chemin de l'export à jour (généré à la demande s'il manque), ou None si aucun participant."""
+    scope = data_versions.event_scope(event_id)
+    version = data_versions.get_versions([scope]).get(scope, (None, None))[0]
+    if version is not None:
+        path = snapshot_path(event_id, version, fmt)
+        if os.path.exists(path):
+            return path
+    return write_snapshots(event_id, [fmt]).get(fmt)
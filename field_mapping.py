@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Moteur de correspondance réponses formulaire Weezevent -> colonnes de la table 'inscriptions'.
+
+Les libellés (ou identifiants) de questions sont déclarés une fois par formulaire dans
+field_mapping.json (chemin surchargeable par FIELD_MAPPING_FILE), normalisés et compilés une
+seule fois par processus en tables de correspondance. Les réponses d'un participant sont ensuite
+résolues en un seul passage ; les libellés sans correspondance sont renvoyés à l'appelant
+(comptabilisés dans le rapport de synchro).
+"""
+import json
+import logging
+import os
+import threading
+
+MAPPING_FILE = os.getenv("FIELD_MAPPING_FILE",
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), "field_mapping.json"))
+DEFAULT_FORM = "default"
+
+_compiled = None # {"forms": {nom: CompiledForm}, "events": {event_id (str): nom}}
+_compile_lock = threading.Lock()
+
+
+def normalize_label(label):
+    """Forme canonique d'un libellé : minuscules, espaces superflus retirés."""
+    return " ".join(str(label).split()).lower()
+
+
+class CompiledForm:
+    """Tables de correspondance d'un formulaire, construites une fois à partir de la configuration."""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.fields = tuple(config)
+        self.by_label = {} # libellé normalisé -> (colonne, rang de priorité)
+        self.by_id = {} # id de question (str) -> (colonne, rang)
+        self.owner_fields = {}
+        for field, spec in config.items():
+            for rank, label in enumerate(spec.get("labels", [])):
+                self.by_label.setdefault(normalize_label(label), (field, rank))
+            for question_id in spec.get("question_ids", []):
+                self.by_id.setdefault(str(question_id), (field, -1))
+            self.owner_fields[field] = tuple(spec.get("owner_fields", []))
+
+    def resolve(self, answers_list, p_data=None):
+        """
+        Résout les réponses brutes ([{"label": ..., "value": ...}, ...]) en un seul passage.
+        Retourne ({colonne: valeur str, "" si absente}, [libellés normalisés sans correspondance]).
+        Sans réponse exploitable, la colonne prend la valeur des owner_fields du participant.
+        """
+        best = {}
+        unmatched = []
+        for answer in answers_list or ():
+            if not isinstance(answer, dict):
+                continue
+            target = None
+            if self.by_id:
+                question_id = answer.get("id_question", answer.get("id"))
+                if question_id is not None:
+                    target = self.by_id.get(str(question_id))
+            if target is None:
+                label = normalize_label(answer.get("label", ""))
+                target = self.by_label.get(label)
+                if target is None:
+                    if label:
+                        unmatched.append(label)
+                    continue
+            field, rank = target
+            raw_value = answer.get("value")
+            value = str(raw_value).strip() if raw_value is not None else ""
+            if value and (field not in best or rank < best[field][0]):
+                best[field] = (rank, value)
+
+        values = {}
+        owner_data = (p_data or {}).get("owner")
+        if not isinstance(owner_data, dict): owner_data = {}
+        for field in self.fields:
+            if field in best:
+                values[field] = best[field][1]
+                continue
+            values[field] = ""
+            for source in (owner_data, p_data or {}):
+                for key in self.owner_fields[field]:
+                    raw_value = source.get(key)
+                    if raw_value is not None and str(raw_value).strip():
+                        values[field] = str(raw_value).strip()
+                        break
+                if values[field]:
+                    break
+        return values, unmatched
+
+
+def _load():
+    """Lit et compile la configuration (appelé une fois, puis par reload_mapping())."""
+    try:
+        with open(MAPPING_FILE, encoding="utf-8") as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        logging.error(f"Configuration des champs formulaire illisible ({MAPPING_FILE}): {e}. "
+                      f"Seules les données du participant seront utilisées.")
+        config = {}
+    forms = {name: CompiledForm(name, spec) for name, spec in (config.get("forms") or {}).items()}
+    if DEFAULT_FORM not in forms:
+        forms[DEFAULT_FORM] = CompiledForm(DEFAULT_FORM, {})
+    events = {str(event_id): form for event_id, form in (config.get("events") or {}).items()}
+    for event_id, form in events.items():
+        if form not in forms:
+            logging.warning(f"Formulaire '{form}' inconnu pour l'événement {event_id} : formulaire '{DEFAULT_FORM}' utilisé.")
+    return {"forms": forms, "events": events}
+
+
+def reload_mapping():
+    """Recharge field_mapping.json (ex: après modification des libellés)."""
+    global _compiled
+    with _compile_lock:
+        _compiled = _load()
+
+
+def form_for_event(event_id):
+    """Formulaire compilé applicable à un événement."""
+    global _compiled
+    if _compiled is None:
+        with _compile_lock:
+            if _compiled is None:
+                _compiled = _load()
+    form_name = _compiled["events"].get(str(event_id), DEFAULT_FORM)
+    return _compiled["forms"].get(form_name) or _compiled["forms"][DEFAULT_FORM]
+
+
+def resolve_answers(payload, event_id, p_data=None):
+    """Raccourci : résout le payload /participant/{id}/answers selon le formulaire de l'événement."""
+    answers_list = (payload or {}).get("answers", []) if isinstance(payload, dict) else payload
+    return form_for_event(event_id).resolve(answers_list, p_data)
+
+
+def log_unmatched_labels(counts, limit=10):
+    """Journalise les libellés sans correspondance d'une synchro ({libellé: occurrences})."""
+    if not counts:
+        return
+    top = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:limit]
+    logging.warning(f"{len(counts)} libellé(s) de formulaire sans correspondance dans {os.path.basename(MAPPING_FILE)} : "
+                    + "; ".join(f"'{label}' ({count})" for label, count in top))
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Configuration gunicorn de l'application (chargée par `gunicorn -c gunicorn.conf.py app:app`).
+
+Modèle de concurrence :
+  - gthread (défaut) : N workers x T threads. Les routes passent l'essentiel de leur temps à attendre
+    MySQL ou l'API Weezevent (I/O), les threads permettent de servir d'autres utilisateurs pendant
+    un export long. T est borné par la taille du pool MySQL par processus (DB_POOL_SIZE) : une
+    connexion est réservée aux threads d'arrière-plan (synchro Weezevent, vérification BDD).
+  - gevent : greenlets coopératifs (nécessite le paquet gevent). Les requêtes au-delà du pool
+    attendent une connexion libre (DB_POOL_WAIT_SECONDS, voir db_connection.get_connection).
+  - sync : 1 requête à la fois par worker (ancien comportement de `gunicorn app:app`).
+
+Le nombre de workers dérive du nombre de CPU, plafonné pour que workers x DB_POOL_SIZE ne dépasse
+pas DB_MAX_CONNECTIONS (limite de connexions du serveur MySQL distant).
+
+Variables d'environnement :
+  GUNICORN_WORKER_CLASS  sync | gthread | gevent          (défaut : gthread)
+  WEB_CONCURRENCY        nombre de workers imposé          (défaut : calculé)
+  GUNICORN_THREADS       threads par worker (gthread)      (défaut : DB_POOL_SIZE - 1)
+  GEVENT_CONNECTIONS     requêtes simultanées par worker (gevent, défaut : 50)
+  DB_POOL_SIZE           connexions MySQL par worker       (défaut : 5)
+  DB_MAX_CONNECTIONS     connexions MySQL max côté serveur (défaut : 20)
+  GUNICORN_TIMEOUT       délai max d'une requête (s)       (défaut : 120, export des gros événements)
+  GUNICORN_MAX_REQUESTS  recyclage d'un worker après N requêtes (défaut : 1000, 0 = désactivé)
+  GUNICORN_PRELOAD       true/false                        (défaut : true)
+"""
+import multiprocessing
+import os
+
+_cpu_count = multiprocessing.cpu_count()
+_db_pool_size = int(os.getenv("DB_POOL_SIZE", 5))
+_db_max_connections = int(os.getenv("DB_MAX_CONNECTIONS", 20))
+
+# --- Écoute ---
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}" # Render fournit PORT
+
+# --- Classe de worker ---
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread").lower()
+if worker_class not in ("sync", "gthread", "gevent"):
+    print(f"AVERTISSEMENT: GUNICORN_WORKER_CLASS '{worker_class}' inconnu, utilisation de gthread.")
+    worker_class = "gthread"
+if worker_class == "gevent":
+    try:
+        import gevent # noqa: F401
+    except ImportError:
+        print("AVERTISSEMENT: gevent non installé (pip install gevent), utilisation de gthread.")
+        worker_class = "gthread"
+
+# --- Nombre de workers et de threads ---
+# Les workers sont des processus (mémoire ~70 Mo chacun) : 2 x CPU + 1 est la règle gunicorn,
+# plafonnée par les connexions MySQL disponibles (chaque worker ouvre DB_POOL_SIZE connexions).
+_max_workers_for_db = max(1, _db_max_connections // max(1, _db_pool_size))
+workers = int(os.getenv("WEB_CONCURRENCY", min(2 * _cpu_count + 1, _max_workers_for_db)))
+
+if worker_class == "gthread":
+    threads = int(os.getenv("GUNICORN_THREADS", max(1, _db_pool_size - 1)))
+    if threads > _db_pool_size:
+        print(f"AVERTISSEMENT: {threads} threads pour un pool de {_db_pool_size} connexions : "
+              f"des requêtes attendront une connexion libre.")
+elif worker_class == "gevent":
+    worker_connections = int(os.getenv("GEVENT_CONNECTIONS", 50))
+
+# --- Chargement de l'application ---
+# preload_app : l'app est importée une fois dans le maître (démarrage plus rapide, mémoire partagée).
+# Compatible avec le pool MySQL : celui-ci n'est créé qu'au premier get_connection(), dans chaque worker.
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# --- Délais ---
+# /export_participants et /select_event sur un gros événement peuvent dépasser le défaut de 30 s.
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+
+# --- Recyclage des workers (fuites mémoire éventuelles) ---
+# Attention : une synchro Weezevent lancée depuis un worker tourne dans un thread de ce worker ;
+# le recyclage attend la fin des requêtes en cours, pas celle du thread. Garder une valeur élevée.
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = max_requests // 10 if max_requests else 0
+
+# --- Journalisation ---
+accesslog = "-"
+errorlog = "-"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    """Migration du schéma dans le processus maître, avant le démarrage des workers : les index de
+    'inscriptions' ne sont jamais créés pendant une requête web (voir db_schema.ensure_indexes).
+    Le pool MySQL ouvert ici n'est pas hérité par les workers (reset_pool dans post_fork)."""
+    import db_schema
+    if db_schema.ensure_schema():
+        db_schema.ensure_indexes()
+
+
+def post_fork(server, worker):
+    """Chaque worker repart sans pool hérité du maître (créé à la première connexion),
+    relance le thread d'écriture des journaux (il ne survit pas au fork) et, si les webhooks
+    sont configurés, le thread de traitement de leur file (notifications restées en attente)."""
+    import db_connection
+    import log_config
+    import webhook_queue
+    db_connection.reset_pool()
+    log_config.setup_logging()
+    if webhook_queue.WEBHOOK_SECRET:
+        webhook_queue.start_worker()
+
+
+def when_ready(server):
+    details = f"{threads} threads" if worker_class == "gthread" else (
+        f"{worker_connections} connexions" if worker_class == "gevent" else "1 requête")
+    server.log.info(f"Concurrence : {workers} workers {worker_class} x {details} "
+                    f"(pool MySQL {_db_pool_size}/worker, timeout {timeout}s, preload={preload_app})")
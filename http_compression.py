@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Compression des réponses HTML/JSON/CSS/JS (hook after_request installé par init_app).
+
+  - brotli si le client l'accepte et que le module `brotli` est installé, sinon gzip ;
+  - seulement au-delà de COMPRESS_MIN_BYTES (défaut 1024) : en dessous le gain ne couvre pas le coût ;
+  - réponses en flux (stream_template) : gzip par morceau avec vidage (Z_SYNC_FLUSH), le navigateur
+    affiche chaque morceau dès réception ;
+  - fichiers (send_file) et réponses déjà encodées laissés tels quels ;
+  - l'ETag devient faible (W/"...") : la représentation compressée n'est pas identique octet pour
+    octet, les comparaisons If-None-Match restent valides (comparaison faible).
+
+Variables d'environnement : COMPRESS_MIN_BYTES, COMPRESS_LEVEL (gzip, défaut 6),
+COMPRESS_BROTLI_QUALITY (défaut 5 : rapide pour des réponses générées à chaque requête).
+"""
+import gzip
+import os
+import zlib
+from flask import request
+
+try:
+    import brotli # Optionnel : meilleure compression que gzip
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", 5))
+COMPRESSIBLE_MIMETYPES = {"text/html", "application/json", "text/css", "application/javascript", "text/plain"}
+
+
+def accepted_encoding(accept_encodings=None):
+    """Meilleur encodage accepté par le client ('br', 'gzip' ou None)."""
+    accept = accept_encodings if accept_encodings is not None else request.accept_encodings
+    if brotli is not None and accept["br"]:
+        return "br"
+    if accept["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_bytes(data, encoding, brotli_quality=BROTLI_QUALITY, gzip_level=COMPRESS_LEVEL):
+    if encoding == "br":
+        return brotli.compress(data, quality=brotli_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+def _gzip_stream(chunks):
+    """Compresse un flux morceau par morceau, chaque morceau étant immédiatement décodable."""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS) # 16+ : en-tête gzip
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, "close"):
+            chunks.close() # Propage la fermeture (client parti) au flux d'origine
+
+
+def _mark_varied(response):
+    response.vary.add("Accept-Encoding")
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+
+def compress_response(response):
+    """Hook after_request : compresse la réponse si utile."""
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or "Content-Encoding" in response.headers or response.direct_passthrough):
+        return response
+    encoding = accepted_encoding()
+
+    if response.is_streamed:
+        response.vary.add("Accept-Encoding")
+        if encoding is None:
+            return response
+        response.response = _gzip_stream(response.response)
+        response.headers["Content-Encoding"] = "gzip"
+        response.headers.pop("Content-Length", None)
+        _mark_varied(response)
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    response.vary.add("Accept-Encoding")
+    if encoding is None:
+        return response
+    response.set_data(compress_bytes(data, encoding)) # Met aussi à jour Content-Length
+    response.headers["Content-Encoding"] = encoding
+    _mark_varied(response)
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Configuration commune de la journalisation (application Flask et modules de synchro).
+
+  - non bloquante : les modules écrivent dans une file bornée (QueueHandler), un thread
+    QueueListener formate et écrit sur stderr. Si la file est pleine (LOG_QUEUE_SIZE),
+    les messages sont abandonnés et comptés plutôt que de ralentir la synchro ;
+  - structurée : LOG_FORMAT=json produit une ligne JSON par message (champs `extra` inclus),
+    LOG_FORMAT=text (défaut) ajoute les champs `extra` en clé=valeur ;
+  - échantillonnée : les messages par participant passent par log_sampled() (1 sur
+    LOG_SAMPLE_EVERY par type de message) ; un résumé par événement est journalisé à la place ;
+  - sans données personnelles : mask_email() / redact_record() pour les emails et paramètres SQL.
+
+Variables d'environnement : LOG_LEVEL (défaut INFO), LOG_FORMAT, LOG_QUEUE_SIZE (défaut 10000),
+LOG_SAMPLE_EVERY (défaut 100).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_SAMPLE_EVERY = max(1, int(os.getenv("LOG_SAMPLE_EVERY", 100)))
+
+# Attributs standard d'un LogRecord (le reste provient de `extra=`)
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+_HTTP_LOGGERS = ("urllib3", "httpx", "httpcore")
+
+_listener = None
+_listener_pid = None
+_setup_lock = threading.Lock()
+_sample_counts = {}
+_sample_lock = threading.Lock()
+
+
+class StructuredFormatter(logging.Formatter):
+    """Ligne JSON (json_output=True) ou texte lisible suivi des champs `extra` en clé=valeur."""
+
+    def __init__(self, json_output=False):
+        super().__init__("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+        self.json_output = json_output
+
+    def format(self, record):
+        extras = {k: v for k, v in record.__dict__.items() if k not in _STANDARD_ATTRS}
+        if self.json_output:
+            payload = {
+                "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+                "level": record.levelname,
+                "logger": record.name,
+                "thread": record.threadName,
+                "msg": record.getMessage(),
+            }
+            payload.update(extras)
+            if record.exc_info:
+                payload["exc"] = self.formatException(record.exc_info)
+            return json.dumps(payload, ensure_ascii=False, default=str)
+        line = super().format(record)
+        if extras:
+            line += " | " + " ".join(f"{k}={json.dumps(v, ensure_ascii=False, default=str)}" for k, v in extras.items())
+        return line
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui abandonne les messages quand la file est pleine au lieu de bloquer."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            BoundedQueueHandler.dropped += 1
+
+
+def setup_logging(level=None):
+    """
+    Installe la file de journalisation sur le logger racine (idempotent par processus).
+    À rappeler après un fork (hook post_fork gunicorn) : le thread d'écriture ne survit pas au fork.
+    """
+    global _listener, _listener_pid
+    with _setup_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            return
+        log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(StructuredFormatter(json_output=(LOG_FORMAT == "json")))
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            if isinstance(handler, BoundedQueueHandler) or type(handler) is logging.StreamHandler:
+                root.removeHandler(handler) # basicConfig / configuration héritée du processus parent
+        root.addHandler(BoundedQueueHandler(log_queue))
+        root.setLevel(level if level is not None else LOG_LEVEL)
+        # Un message par requête HTTP, URL complète (api_key/access_token) : limité aux avertissements
+        for name in _HTTP_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        _listener_pid = os.getpid()
+
+
+def _stop_listener():
+    """Vide la file avant la sortie du processus."""
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        if BoundedQueueHandler.dropped:
+            print(f"Journalisation: {BoundedQueueHandler.dropped} message(s) abandonné(s) (file pleine).")
+
+
+atexit.register(_stop_listener)
+
+
+def log_sampled(key, level, msg, *args):
+    """
+    Journalise un message répété par ligne (participant) : le 1er puis 1 sur LOG_SAMPLE_EVERY
+    pour la même clé. Arguments au format % (formatés seulement si le message est émis).
+    """
+    root = logging.getLogger()
+    if not root.isEnabledFor(level):
+        return
+    with _sample_lock:
+        count = _sample_counts.get(key, 0) + 1
+        _sample_counts[key] = count
+    if (count - 1) % LOG_SAMPLE_EVERY:
+        return
+    root.log(level, msg, *args, extra={"sample": key, "occurrences": count}, stacklevel=2)
+
+
+def mask_email(email):
+    """'jean.dupont@exemple.org' -> 'j***@exemple.org' (journaux sans données personnelles)."""
+    if not email:
+        return ""
+    local, _, domain = str(email).partition("@")
+    return f"{local[:1]}***@{domain}" if domain else "***"
+
+
+def redact_record(record):
+    """
+    Paramètres d'une écriture (namedtuple ou dict) sans données personnelles :
+    event_id et email masqué conservés, les autres champs réduits à leur type/longueur.
+    """
+    items = record._asdict().items() if hasattr(record, "_asdict") else dict(record).items()
+    redacted = {}
+    for key, value in items:
+        if key == "event_id":
+            redacted[key] = value
+        elif key == "email":
+            redacted[key] = mask_email(value)
+        elif value is None:
+            redacted[key] = None
+        else:
+            redacted[key] = f"{type(value).__name__}({len(str(value))})"
+    return redacted
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Instrumentation légère (sans dépendance) : compteurs et histogrammes de latence,
+exportés au format texte Prometheus par l'endpoint /metrics de app.py.
+Les valeurs sont propres à chaque processus (un jeu de métriques par worker gunicorn).
+"""
+import threading
+import time
+from functools import wraps
+
+# Bornes (secondes) des histogrammes de latence
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_counters = {}   # (nom, labels) -> valeur
+_histograms = {} # (nom, labels) -> [compteurs par borne, somme, nombre]
+
+
+def _label_key(labels):
+    return tuple(sorted((str(k), str(v)) for k, v in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Incrémente un compteur (suffixe '_total' conseillé dans le nom)."""
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, seconds, **labels):
+    """Enregistre une durée (secondes) dans l'histogramme `name`."""
+    key = (name, _label_key(labels))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = [[0] * len(DEFAULT_BUCKETS), 0.0, 0]
+            _histograms[key] = hist
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if seconds <= bound:
+                hist[0][i] += 1
+                break
+        hist[1] += seconds
+        hist[2] += 1
+
+
+def record_error(name, **labels):
+    """Compte une erreur pour l'opération `name` (pour les fonctions qui capturent leurs exceptions)."""
+    inc(f"{name}_errors_total", **labels)
+
+
+class timed:
+    """
+    Chronomètre une opération, utilisable en décorateur ou en context manager :
+        @timed("save_to_db")            /   with timed("select_event_query"): ...
+    Alimente l'histogramme '<name>_seconds' et compte les exceptions dans '<name>_errors_total'.
+    """
+
+    def __init__(self, name, **labels):
+        self.name = name
+        self.labels = labels
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(f"{self.name}_seconds", time.perf_counter() - self._start, **self.labels)
+        if exc_type is not None:
+            record_error(self.name, **self.labels)
+        return False # Ne masque jamais l'exception
+
+    def mark_error(self):
+        """Signale une erreur gérée (sans exception) pendant l'opération chronométrée."""
+        record_error(self.name, **self.labels)
+
+    def __call__(self, func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(self.name, **self.labels):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+# ===== Export au format texte Prometheus =====
+def _escape(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    """Retourne toutes les métriques au format d'exposition texte Prometheus (0.0.4)."""
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((key, (list(h[0]), h[1], h[2])) for key, h in _histograms.items())
+
+    lines = []
+    declared = set()
+    for (name, label_key), value in counters:
+        if name not in declared:
+            lines.append(f"# TYPE {name} counter")
+            declared.add(name)
+        lines.append(f"{name}{_format_labels(label_key)} {value}")
+
+    for (name, label_key), (bucket_counts, total, count) in histograms:
+        if name not in declared:
+            lines.append(f"# TYPE {name} histogram")
+            declared.add(name)
+        cumulative = 0
+        for bound, bucket_count in zip(DEFAULT_BUCKETS, bucket_counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(label_key, [('le', repr(bound))])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(label_key, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_format_labels(label_key)} {total:.6f}")
+        lines.append(f"{name}_count{_format_labels(label_key)} {count}")
+
+    return "\n".join(lines) + "\n"
@@ -1,9 +1,14 @@
+import json
 import os
+import queue
 import smtplib
+import threading
 import traceback 
+from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from dotenv import load_dotenv
 from db_connection import get_connection 
+from db_schema import ensure_schema
 import mysql.connector 
 load_dotenv()
 
@@ -18,25 +23,59 @@ SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
 SMTP_LOGIN = os.getenv('SMTP_LOGIN')
 SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
 
+# Délai minimal entre deux alertes tant que la BDD reste au-dessus du seuil
+ALERT_REPEAT_HOURS = float(os.getenv('DB_ALERT_REPEAT_HOURS', 24))
+
+# --- État partagé : dernier résultat, thread de vérification, file d'alertes ---
+# Le dernier résultat et la date de la dernière alerte sont en BDD (table monitoring_state) : communs à
+# tous les workers gunicorn et conservés au recyclage d'un worker. _last_result garde la copie locale
+# (réponse de /db-check-status si la BDD est injoignable).
+RESULT_STATE = "db_check_result"
+ALERT_STATE = "db_alert_sent_at" # value 'sent' pendant un épisode de dépassement, NULL sinon
+_last_result = None
+_last_result_lock = threading.Lock()
+_check_thread = None
+_check_thread_lock = threading.Lock()
+_alert_queue = queue.Queue()
+_alert_worker = None
+_alert_state_lock = threading.Lock()
+
 
 # ===== Fonction principale de vérification de la taille BDD =====
 def check_database_size():
-    """Interroge la BDD pour sa taille et la compare au seuil configuré."""
+    """
+    Interroge la BDD pour sa taille et la compare au seuil configuré.
+    Retourne le résultat (dict), également conservé en cache pour l'endpoint de statut.
+    L'email d'alerte éventuel est mis en file et envoyé en arrière-plan.
+    """
     conn = None
     cursor = None
     current_size_mb = 0.0
     threshold_mb = DB_SIZE_LIMIT_MB * (THRESHOLD_PERCENT / 100.0)
+    result_info = {
+        "checked_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "status": "error",
+        "size_mb": None,
+        "threshold_mb": round(threshold_mb, 2),
+        "limit_mb": DB_SIZE_LIMIT_MB,
+        "above_threshold": False,
+        "alert_queued": False,
+        "error": None,
+    }
 
     if not DB_NAME:
         print(f"ERREUR: La variable d'environnement 'DB_NAME' n'est pas définie.")
-        return
+        result_info["error"] = "DB_NAME non défini."
+        _store_result(result_info)
+        return result_info
 
     print("INFO: Début vérification taille BDD...")
     try:
         conn = get_connection()
         if conn is None:
             print("ERREUR: Impossible d'établir la connexion via get_connection.")
-            return
+            result_info["error"] = "Connexion BDD impossible."
+            return result_info
 
         cursor = conn.cursor(dictionary=True)
 
@@ -52,32 +91,183 @@ def check_database_size():
         result = cursor.fetchone()
 
         if result:
-            current_size_mb = result['size_in_mb']
+            current_size_mb = float(result['size_in_mb'])
             print(f"INFO: Taille actuelle BDD '{DB_NAME}': {current_size_mb:.2f} Mo.")
         else:
             print(f"AVERTISSEMENT: Impossible de récupérer la taille pour '{DB_NAME}'. Vérifiez le nom.")
-            return
+            result_info["error"] = f"Taille introuvable pour '{DB_NAME}'."
+            return result_info
+
+        result_info["status"] = "ok"
+        result_info["size_mb"] = round(current_size_mb, 2)
 
-        # Comparaison avec le seuil et déclenchement de la notification si nécessaire
+        # Comparaison avec le seuil et mise en file de la notification si nécessaire
         if current_size_mb >= threshold_mb:
             print(f"ALERTE: Seuil dépassé! Taille={current_size_mb:.2f} Mo, Seuil={threshold_mb:.2f} Mo ({THRESHOLD_PERCENT}%).")
-            send_notification(current_size_mb, threshold_mb)
+            result_info["above_threshold"] = True
+            result_info["alert_queued"] = queue_alert(current_size_mb, threshold_mb)
         else:
             print(f"INFO: Taille BDD en dessous du seuil ({threshold_mb:.2f} Mo).")
+            _reset_alert_state()
 
     except mysql.connector.Error as db_err:
         print(f"ERREUR MySQL lors de la vérification: {db_err}")
         print(traceback.format_exc()) 
+        result_info["error"] = f"Erreur MySQL: {db_err}"
     except Exception as e:
         print(f"ERREUR Générale lors de la vérification: {e}")
         print(traceback.format_exc()) 
+        result_info["error"] = f"Erreur: {e}"
     finally:
        
         if cursor:
             cursor.close()
         if conn and conn.is_connected():
             conn.close()
+        _store_result(result_info)
         print("INFO: Vérification taille BDD terminée.")
+    return result_info
+
+
+# ===== État partagé en BDD (table monitoring_state) =====
+def _state_execute(sql, params, fetch=False):
+    """Exécute une requête sur monitoring_state ; retourne les lignes (fetch) ou le rowcount, None si BDD indisponible."""
+    if not ensure_schema():
+        return None
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        if conn is None:
+            return None
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        result = cursor.fetchall() if fetch else cursor.rowcount
+        conn.commit()
+        return result
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        print(f"ERREUR MySQL état surveillance BDD: {db_err}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+def _save_state(name, value):
+    return _state_execute("""
+        INSERT INTO monitoring_state (name, value, updated_at)
+        VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            value = VALUES(value),
+            updated_at = VALUES(updated_at)
+    """, (name, value, datetime.now().replace(microsecond=0)))
+
+
+# ===== Vérification asynchrone et cache du dernier résultat =====
+def _store_result(result_info):
+    """Conserve le dernier résultat de vérification (lu par l'endpoint de statut, tous workers)."""
+    global _last_result
+    with _last_result_lock:
+        _last_result = dict(result_info)
+    _save_state(RESULT_STATE, json.dumps(result_info))
+
+
+def get_last_check_result():
+    """Retourne une copie du dernier résultat de vérification (ou None si aucune vérification)."""
+    rows = _state_execute("SELECT value FROM monitoring_state WHERE name = %s", (RESULT_STATE,), fetch=True)
+    if rows and rows[0][0]:
+        return json.loads(rows[0][0])
+    with _last_result_lock:
+        return dict(_last_result) if _last_result else None
+
+
+def is_check_running():
+    """Indique si une vérification est en cours dans le thread d'arrière-plan."""
+    with _check_thread_lock:
+        return _check_thread is not None and _check_thread.is_alive()
+
+
+def _run_check_in_background():
+    try:
+        check_database_size()
+    except Exception as e:
+        print(f"ERREUR: Échec vérification BDD en arrière-plan: {e}")
+        print(traceback.format_exc())
+
+
+def start_database_check():
+    """
+    Lance check_database_size dans un thread daemon et rend la main immédiatement.
+    Retourne False si une vérification est déjà en cours (pas de second lancement).
+    """
+    global _check_thread
+    with _check_thread_lock:
+        if _check_thread is not None and _check_thread.is_alive():
+            return False
+        _check_thread = threading.Thread(target=_run_check_in_background, name="db-size-check", daemon=True)
+        _check_thread.start()
+        return True
+
+
+# ===== File d'alertes (envoi SMTP en arrière-plan, avec déduplication) =====
+def _reset_alert_state():
+    """Repasse sous le seuil : la prochaine alerte sera envoyée sans attendre."""
+    _state_execute("UPDATE monitoring_state SET value = NULL WHERE name = %s AND value IS NOT NULL", (ALERT_STATE,))
+
+
+def _claim_alert(now):
+    """
+    Réserve l'envoi de l'alerte en BDD (UPDATE conditionnel : un seul worker l'obtient).
+    Retourne True si aucune alerte n'a été envoyée depuis ALERT_REPEAT_HOURS pour l'épisode en cours.
+    """
+    # Ligne créée au premier dépassement, sans toucher à une ligne existante
+    seeded = _state_execute("""
+        INSERT INTO monitoring_state (name, value, updated_at)
+        VALUES (%s, NULL, %s)
+        ON DUPLICATE KEY UPDATE
+            name = VALUES(name)
+    """, (ALERT_STATE, now))
+    if seeded is None:
+        return True # BDD injoignable : mieux vaut une alerte en double qu'aucune
+    claimed = _state_execute(
+        "UPDATE monitoring_state SET value = 'sent', updated_at = %s "
+        "WHERE name = %s AND (value IS NULL OR updated_at < %s)",
+        (now, ALERT_STATE, now - timedelta(hours=ALERT_REPEAT_HOURS)))
+    return claimed is None or claimed > 0
+
+
+def queue_alert(current_size, threshold_size):
+    """
+    Met une alerte en file si aucune n'a été envoyée (par ce worker ou un autre) depuis
+    ALERT_REPEAT_HOURS pour l'épisode de dépassement en cours. Retourne True si l'alerte est mise en file.
+    """
+    global _alert_worker
+    now = datetime.now().replace(microsecond=0)
+    if not _claim_alert(now):
+        print(f"INFO: Alerte déjà envoyée depuis moins de {ALERT_REPEAT_HOURS:g} h. Pas de nouvel email.")
+        return False
+    with _alert_state_lock:
+        if _alert_worker is None or not _alert_worker.is_alive():
+            _alert_worker = threading.Thread(target=_alert_worker_loop, name="db-alert-sender", daemon=True)
+            _alert_worker.start()
+    _alert_queue.put((current_size, threshold_size))
+    print("INFO: Alerte mise en file pour envoi en arrière-plan.")
+    return True
+
+
+def _alert_worker_loop():
+    """Consomme la file d'alertes et envoie les emails (hors thread de requête)."""
+    while True:
+        current_size, threshold_size = _alert_queue.get()
+        try:
+            send_notification(current_size, threshold_size)
+        except Exception as e:
+            print(f"ERREUR: Échec envoi alerte depuis la file: {e}")
+            print(traceback.format_exc())
+        finally:
+            _alert_queue.task_done()
 
 
 # ===== Fonction pour envoyer l'email de notification =====
@@ -124,4 +314,5 @@ def send_notification(current_size, threshold_size):
 if __name__ == "__main__":
     print("--- Exécution directe de monitoring.py ---")
     check_database_size()
+    _alert_queue.join() # Attend l'envoi éventuel de l'alerte avant de quitter
     print("--- Fin de l'exécution directe ---")
\ No newline at end of file
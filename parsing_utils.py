@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""
+Conversion des dates et montants, partagée par la synchro Weezevent (weezevent_api) et
+l'affichage/export des participants (app.py).
+
+  - chemins rapides par expression régulière (AAAA-MM-JJ[ HH:MM:SS], JJ/MM/AAAA, JJ-MM-AAAA)
+    au lieu d'essais strptime successifs ;
+  - mémoïsation bornée (lru_cache) : dates de naissance, dates d'inscription et prix se répètent
+    beaucoup d'un participant à l'autre ;
+  - avertissements de format invalide limités (WARNINGS_PER_MINUTE par minute et par type), le
+    nombre de messages supprimés étant signalé à la reprise.
+"""
+import decimal
+import logging
+import re
+import threading
+import time
+from datetime import date, datetime
+from functools import lru_cache
+
+CACHE_SIZE = 4096 # Valeurs distinctes mémorisées par type (date, datetime, montant)
+WARNINGS_PER_MINUTE = 5
+
+_RE_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_RE_YMD_DATE = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})$")
+_RE_DMY_DATE = re.compile(r"^(\d{1,2})[/-](\d{1,2})[/-](\d{4})$")
+_RE_ISO_DATETIME = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})[ T](\d{1,2}):(\d{1,2}):(\d{1,2})$")
+
+_warning_lock = threading.Lock()
+_warning_state = {} # type -> [début de fenêtre, avertissements émis, supprimés]
+
+
+def _warn_invalid(kind, value):
+    """Avertissement 'format invalide' limité à WARNINGS_PER_MINUTE par type et par minute."""
+    now = time.monotonic()
+    with _warning_lock:
+        state = _warning_state.setdefault(kind, [now, 0, 0])
+        if now - state[0] >= 60:
+            if state[2]:
+                logging.warning(f"{state[2]} avertissement(s) '{kind}' supprimé(s) durant la dernière minute.")
+            state[:] = [now, 0, 0]
+        if state[1] >= WARNINGS_PER_MINUTE:
+            state[2] += 1
+            return
+        state[1] += 1
+    logging.warning(f"Format {kind} non reconnu/invalide: '{value}'")
+
+
+# ===== Dates =====
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_date_str(value):
+    if _RE_ISO_DATE.match(value):
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            pass
+    else:
+        match = _RE_DMY_DATE.match(value)
+        if match:
+            day, month, year = match.groups()
+        else:
+            match = _RE_YMD_DATE.match(value)
+            if match:
+                year, month, day = match.groups()
+        if match:
+            try:
+                return date(int(year), int(month), int(day))
+            except ValueError:
+                pass
+    _warn_invalid("date", value)
+    return None
+
+
+def parse_date(date_str):
+    """Parse une date (DD/MM/YYYY, YYYY-MM-DD, DD-MM-YYYY). Retourne objet date ou None."""
+    if not date_str or not isinstance(date_str, str): return None
+    date_str_cleaned = date_str.strip()
+    if not date_str_cleaned: return None
+    return _parse_date_str(date_str_cleaned)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_datetime_str(value):
+    match = _RE_ISO_DATETIME.match(value)
+    if match:
+        # Champs sur 1 ou 2 chiffres, comme strptime ('2024-1-5 9:03:00')
+        try:
+            return datetime(*(int(part) for part in match.groups()))
+        except ValueError:
+            pass
+    _warn_invalid("datetime", value)
+    return None
+
+
+def parse_datetime(datetime_str):
+    """Parse date+heure (YYYY-MM-DD HH:MM:SS, YYYY-MM-DDTHH:MM:SS). Retourne objet datetime ou None."""
+    if not datetime_str or not isinstance(datetime_str, str): return None
+    datetime_str_cleaned = datetime_str.strip()
+    if not datetime_str_cleaned: return None
+    return _parse_datetime_str(datetime_str_cleaned)
+
+
+def to_date(value):
+    """Valeur BDD (date, datetime ou chaîne) -> date, ou None."""
+    if isinstance(value, datetime): return value.date()
+    if isinstance(value, date): return value
+    return parse_date(value)
+
+
+def to_datetime(value):
+    """Valeur BDD (datetime ou chaîne) -> datetime, ou None."""
+    if isinstance(value, datetime): return value
+    return parse_datetime(value)
+
+
+def format_date(value, default=""):
+    """Date au format d'affichage JJ/MM/AAAA (ou `default` si absente/invalide)."""
+    parsed = to_date(value)
+    return parsed.strftime('%d/%m/%Y') if parsed else default
+
+
+# ===== Montants =====
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_amount_str(value):
+    # Gère la virgule (français) comme séparateur décimal
+    normalized = value.replace(',', '.').strip()
+    if not normalized:
+        return None
+    try:
+        return decimal.Decimal(normalized)
+    except decimal.InvalidOperation:
+        _warn_invalid("montant", value)
+        return None
+
+
+def parse_amount(value):
+    """Montant (Decimal, nombre ou chaîne '12,50') -> Decimal, ou None si absent/invalide."""
+    if value is None or isinstance(value, bool): return None
+    if isinstance(value, decimal.Decimal): return value
+    if isinstance(value, int): return decimal.Decimal(value)
+    if isinstance(value, float): return decimal.Decimal(str(value))
+    return _parse_amount_str(str(value))
+
+
+def format_amount(value, default="", export=False):
+    """
+    Montant pour l'affichage (valeur telle que stockée, ex: '75.00') ou l'export CSV
+    (`export=True` : deux décimales, virgule décimale, ex: '75,00').
+    """
+    amount = parse_amount(value)
+    if amount is None:
+        return default
+    if export:
+        return "{:.2f}".format(amount).replace('.', ',')
+    return str(amount)
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+Écriture des participants d'un événement en une transaction (synchro Weezevent).
+
+  1. upsert par lots (executemany : INSERT multi-lignes ... ON DUPLICATE KEY UPDATE) ou, au-delà de
+     BULK_THRESHOLD lignes, chargement en masse : INSERT multi-lignes de grande taille dans une
+     table temporaire sans index (sync_staging_inscriptions), puis une seule fusion
+     INSERT ... SELECT ... ON DUPLICATE KEY UPDATE vers 'inscriptions' ;
+  2. réconciliation : les emails renvoyés par l'API sont chargés dans une table temporaire, puis
+     une seule requête (anti-jointure NOT EXISTS) supprime les inscriptions de l'événement absentes
+     de l'API (participant annulé ou supprimé dans Weezevent), sauf celles écrites par un webhook
+     reçu depuis la lecture de la liste (`snapshot_at`, table webhook_events) ;
+  3. COMMIT : la table n'est jamais observée à moitié réconciliée.
+
+Les résultats par ligne (inserted/updated/unchanged) se déduisent du rowcount MySQL des upserts
+(1 par insertion, 2 par modification, 0 si identique) et des emails déjà présents avant l'écriture.
+Un même email peut revenir plusieurs fois dans un événement (un acheteur, plusieurs billets) : une
+seule ligne par email est écrite (la dernière renvoyée par l'API), comme le ferait l'upsert.
+En cas d'erreur BDD, la transaction est annulée et l'événement est réécrit ligne par ligne
+(save_to_db), sans réconciliation.
+
+Variables d'environnement : SYNC_WRITE_BATCH_SIZE (lignes par INSERT multi-lignes, défaut 500),
+SYNC_BULK_THRESHOLD (lignes à partir desquelles la table de transit est utilisée, défaut 2000 ;
+0 pour ne jamais l'utiliser), SYNC_BULK_INSERT_ROWS (lignes par INSERT dans la table de transit,
+défaut 2000), SYNC_RECONCILE=off pour désactiver la suppression des inscriptions absentes de l'API.
+"""
+import logging
+import os
+from datetime import datetime
+import mysql.connector
+from db_connection import get_connection
+import metrics
+
+WRITE_BATCH_SIZE = int(os.getenv("SYNC_WRITE_BATCH_SIZE", 500))
+BULK_THRESHOLD = int(os.getenv("SYNC_BULK_THRESHOLD", 2000))
+BULK_INSERT_ROWS = int(os.getenv("SYNC_BULK_INSERT_ROWS", 2000))
+RECONCILE_ENABLED = os.getenv("SYNC_RECONCILE", "on").lower() not in ("off", "false", "0")
+STAGING_TABLE = "sync_staging_inscriptions"
+
+# Table temporaire propre à la connexion (invisible des autres sessions, sans COMMIT implicite)
+SQL_CREATE_API_KEYS = "CREATE TEMPORARY TABLE IF NOT EXISTS sync_api_keys (email VARCHAR(255) NOT NULL PRIMARY KEY)"
+SQL_DELETE_STALE = """
+    DELETE FROM inscriptions
+    WHERE event_id = %s
+      AND NOT EXISTS (SELECT 1 FROM sync_api_keys k WHERE k.email = inscriptions.email)
+      AND NOT EXISTS (SELECT 1 FROM webhook_events w
+                      WHERE w.event_id = inscriptions.event_id AND w.email = inscriptions.email
+                        AND w.action = 'upsert' AND w.received_at >= %s)
+"""
+
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _load_api_keys(cursor, api_emails):
+    cursor.execute(SQL_CREATE_API_KEYS)
+    cursor.execute("DELETE FROM sync_api_keys") # Connexion du pool : table d'une écriture précédente
+    for chunk in _chunks(sorted(api_emails), WRITE_BATCH_SIZE):
+        cursor.executemany("INSERT INTO sync_api_keys (email) VALUES (%s)", [(email,) for email in chunk])
+
+
+def _upsert_batches(cursor, records, upsert_sql):
+    """Chemin standard : INSERT ... ON DUPLICATE KEY UPDATE par lots. Retourne le rowcount cumulé."""
+    affected = 0
+    for chunk in _chunks(records, WRITE_BATCH_SIZE):
+        cursor.executemany(upsert_sql, chunk)
+        affected += max(cursor.rowcount, 0)
+    return affected
+
+
+def _bulk_merge(cursor, records, merge_sql):
+    """
+    Chemin masse : table de transit (mêmes colonnes que 'inscriptions', sans clé ni index, donc sans
+    vérification d'unicité au chargement) remplie par gros INSERT multi-lignes, puis une fusion.
+    Retourne le rowcount de la fusion (mêmes règles que l'upsert).
+    """
+    columns = records[0]._fields
+    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {STAGING_TABLE}")
+    cursor.execute(f"CREATE TEMPORARY TABLE {STAGING_TABLE} AS SELECT {', '.join(columns)} FROM inscriptions WHERE 1 = 0")
+    insert_sql = (f"INSERT INTO {STAGING_TABLE} ({', '.join(columns)}) "
+                  f"VALUES ({', '.join(['%s'] * len(columns))})")
+    for chunk in _chunks(records, BULK_INSERT_ROWS):
+        cursor.executemany(insert_sql, chunk) # Réécrit en un seul INSERT multi-lignes par le connecteur
+    cursor.execute(merge_sql)
+    affected = max(cursor.rowcount, 0)
+    cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {STAGING_TABLE}")
+    return affected
+
+
+def _unique_by_email(records, event_id):
+    """Une ligne par email (clé de 'inscriptions' avec event_id) : la dernière l'emporte."""
+    by_email = {record.email: record for record in records}
+    if len(by_email) < len(records):
+        logging.debug(f"Event {event_id}: {len(records) - len(by_email)} ligne(s) en double (même email) fusionnée(s).")
+    return list(by_email.values())
+
+
+def _write_rows_fallback(records, save_row):
+    """Écriture ligne par ligne (après échec de la transaction) : comptes par résultat."""
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0, "errors": 0}
+    for record in records:
+        outcome = save_row(record)
+        counts["errors" if outcome == "error" else outcome] += 1
+    return counts
+
+
+@metrics.timed("write_event_participants")
+def write_event_participants(event_id, records, upsert_sql, save_row, api_emails=None, merge_sql=None,
+                             snapshot_at=None):
+    """
+    Écrit les participants (ParticipantRecord, paramètres de `upsert_sql`) de l'événement et, si
+    `api_emails` est fourni (emails de TOUS les participants renvoyés par l'API), supprime les
+    inscriptions absentes, hors emails notifiés par webhook depuis `snapshot_at` (début de l'appel
+    participant/list ; défaut : maintenant). `merge_sql` (fusion depuis STAGING_TABLE) active le
+    chemin masse au-delà de BULK_THRESHOLD lignes. `save_row` (save_to_db) sert au repli ligne par ligne.
+    Retourne {"inserted", "updated", "unchanged", "deleted", "errors"}.
+    """
+    records = _unique_by_email(list(records), event_id)
+    reconcile = RECONCILE_ENABLED and bool(api_emails)
+    if not records and not reconcile:
+        return {"inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0, "errors": 0}
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        if not conn:
+            raise ConnectionError("Connexion DB impossible depuis le pool.")
+        cursor = conn.cursor() # autocommit désactivé : tout jusqu'au COMMIT est une seule transaction
+        cursor.execute("SELECT email FROM inscriptions WHERE event_id = %s", (event_id,))
+        existing = {row[0] for row in cursor.fetchall()}
+
+        bulk = bool(merge_sql) and 0 < BULK_THRESHOLD <= len(records)
+        if bulk:
+            with metrics.timed("write_event_participants_bulk"):
+                affected = _bulk_merge(cursor, records, merge_sql)
+        else:
+            affected = _upsert_batches(cursor, records, upsert_sql)
+        new_emails = {record.email for record in records} - existing
+        inserted = len(new_emails)
+        updated = max(affected - inserted, 0) // 2 # Une modification compte 2 dans le rowcount MySQL
+        counts = {"inserted": inserted, "updated": updated, "unchanged": max(len(records) - inserted - updated, 0),
+                  "deleted": 0, "errors": 0}
+
+        if reconcile:
+            _load_api_keys(cursor, api_emails)
+            snapshot_at = (snapshot_at or datetime.now()).replace(microsecond=0)
+            cursor.execute(SQL_DELETE_STALE, (event_id, snapshot_at))
+            counts["deleted"] = max(cursor.rowcount, 0)
+            cursor.execute("DROP TEMPORARY TABLE IF EXISTS sync_api_keys")
+        conn.commit()
+        logging.debug(f"Écriture event {event_id} ({'table de transit' if bulk else 'upsert par lots'}, "
+                      f"{len(records)} lignes): {counts}")
+        if counts["deleted"]:
+            logging.info(f"Réconciliation event {event_id}: {counts['deleted']} inscription(s) absente(s) de l'API supprimée(s).")
+        return counts
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Écriture groupée event {event_id} annulée ({db_err}) : écriture ligne par ligne sans réconciliation.")
+        metrics.record_error("write_event_participants")
+        if conn:
+            try: conn.rollback()
+            except Exception as rb_err: logging.error(f"  -> Erreur rollback: {rb_err}")
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+    return _write_rows_fallback(records, save_row)
+
+
+@metrics.timed("delete_event_participants")
+def delete_event_participants(event_id, emails):
+    """Supprime les inscriptions (email, event_id) données (annulations notifiées). Retourne le nombre supprimé."""
+    emails = sorted(set(emails))
+    if not emails:
+        return 0
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        if not conn:
+            raise ConnectionError("Connexion DB impossible depuis le pool.")
+        cursor = conn.cursor()
+        deleted = 0
+        for chunk in _chunks(emails, WRITE_BATCH_SIZE):
+            cursor.execute(f"DELETE FROM inscriptions WHERE event_id = %s AND email IN ({', '.join(['%s'] * len(chunk))})",
+                           (event_id, *chunk))
+            deleted += max(cursor.rowcount, 0)
+        conn.commit()
+        return deleted
+    except (mysql.connector.Error, ConnectionError):
+        if conn:
+            try: conn.rollback()
+            except Exception as rb_err: logging.error(f"  -> Erreur rollback: {rb_err}")
+        raise # Lot de notifications retenté
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
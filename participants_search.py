@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Recherche, filtres et tri des participants d'un événement côté serveur (endpoint /api/participants).
+
+  - recherche par préfixe sur nom/prénom/email : chaque mot doit commencer l'un des trois champs
+    ("jean dup" trouve Jean Dupont), via LIKE 'mot%' servi par les index (event_id, colonne)
+    déclarés dans db_schema.INDEX_STATEMENTS (créés au démarrage par db_schema.ensure_indexes) ;
+  - filtres à facettes sur les champs formulaire (FILTER_FIELDS), plusieurs valeurs possibles par
+    champ ; la valeur EMPTY_VALUE désigne les réponses absentes ;
+  - tri parmi SORT_OPTIONS (liste blanche, identifiant en départage pour une pagination stable) ;
+  - pagination LIMIT/OFFSET : seules les lignes de la page demandée quittent la BDD ;
+  - iter_participants : mêmes critères, lignes lues par paquets (fetchmany) pour l'affichage en flux
+    de /select_event.
+"""
+import math
+
+# Colonnes renvoyées par l'API (pas de SELECT *)
+RESULT_COLUMNS = ("id", "nom", "prenom", "email", "telephone", "date_naissance", "adresse", "code_postal", "ville",
+                  "source_info", "financement_eligible", "rqth", "amenagements_necessaires", "amenagements_details",
+                  "nom_billet", "montant_paye", "code_promo", "date_creation_inscription")
+SEARCH_COLUMNS = ("nom", "prenom", "email")
+FILTER_FIELDS = ("rqth", "financement_eligible", "amenagements_necessaires", "source_info", "nom_billet")
+EMPTY_VALUE = "Non renseigné"
+SORT_OPTIONS = {
+    "nom": "nom ASC, prenom ASC, id ASC",
+    "-nom": "nom DESC, prenom DESC, id DESC",
+    "prenom": "prenom ASC, nom ASC, id ASC",
+    "-prenom": "prenom DESC, nom DESC, id DESC",
+    "email": "email ASC, id ASC",
+    "-email": "email DESC, id DESC",
+    "date": "date_creation_inscription ASC, id ASC",
+    "-date": "date_creation_inscription DESC, id DESC",
+    "montant": "montant_paye ASC, id ASC",
+    "-montant": "montant_paye DESC, id DESC",
+}
+DEFAULT_SORT = "nom"
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 200
+MAX_SEARCH_TERMS = 5
+STREAM_CHUNK_ROWS = 100 # Lignes lues par fetchmany dans iter_participants
+
+
+def _escape_like(value):
+    """Échappe les jokers LIKE (caractère d'échappement '!', identique en MySQL et SQLite)."""
+    return value.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def _where_clause(event_id, q, filters, skip_field=None):
+    """Construit la clause WHERE et ses paramètres (filtre `skip_field` exclu, pour ses facettes)."""
+    clauses = ["event_id = %s"]
+    params = [event_id]
+    for term in (q or "").split()[:MAX_SEARCH_TERMS]:
+        pattern = _escape_like(term) + "%"
+        clauses.append("(" + " OR ".join(f"{col} LIKE %s ESCAPE '!'" for col in SEARCH_COLUMNS) + ")")
+        params.extend([pattern] * len(SEARCH_COLUMNS))
+    for field, values in (filters or {}).items():
+        if field == skip_field or field not in FILTER_FIELDS or not values:
+            continue
+        options = []
+        named = [v for v in values if v != EMPTY_VALUE]
+        if named:
+            options.append(f"{field} IN ({', '.join(['%s'] * len(named))})")
+            params.extend(named)
+        if EMPTY_VALUE in values:
+            options.append(f"({field} IS NULL OR {field} = '')")
+        clauses.append("(" + " OR ".join(options) + ")")
+    return " AND ".join(clauses), params
+
+
+def count_participants(cursor, event_id, q="", filters=None):
+    """Nombre de participants correspondant aux critères (curseur `dictionary=True`)."""
+    where, params = _where_clause(event_id, q, filters)
+    cursor.execute(f"SELECT COUNT(*) AS total FROM inscriptions WHERE {where}", tuple(params))
+    return cursor.fetchone()["total"]
+
+
+def iter_participants(cursor, event_id, q="", filters=None, sort=DEFAULT_SORT, limit=None,
+                      chunk_size=STREAM_CHUNK_ROWS):
+    """
+    Générateur des lignes (RESULT_COLUMNS) correspondant aux critères, dans l'ordre `sort`, au plus
+    `limit` lignes. Le curseur (non bufferisé) est lu par paquets de `chunk_size` : la liste complète
+    n'est jamais en mémoire. Le curseur reste occupé tant que le générateur n'est pas épuisé.
+    """
+    sort = sort if sort in SORT_OPTIONS else DEFAULT_SORT
+    where, params = _where_clause(event_id, q, filters)
+    sql = f"SELECT {', '.join(RESULT_COLUMNS)} FROM inscriptions WHERE {where} ORDER BY {SORT_OPTIONS[sort]}"
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(max(0, int(limit)))
+    cursor.execute(sql, tuple(params))
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def search_participants(cursor, event_id, q="", filters=None, sort=DEFAULT_SORT, page=1,
+                        per_page=DEFAULT_PER_PAGE, with_facets=False):
+    """
+    Exécute la recherche avec un curseur `dictionary=True`.
+    Retourne {"total", "page", "per_page", "pages", "sort", "rows"} (+ "facets" si with_facets :
+    {champ: [{"value", "count"}, ...]} calculées avec les autres critères appliqués).
+    """
+    sort = sort if sort in SORT_OPTIONS else DEFAULT_SORT
+    per_page = min(max(1, int(per_page)), MAX_PER_PAGE)
+    page = max(1, int(page))
+
+    where, params = _where_clause(event_id, q, filters)
+    total = count_participants(cursor, event_id, q, filters)
+
+    cursor.execute(f"SELECT {', '.join(RESULT_COLUMNS)} FROM inscriptions WHERE {where} "
+                   f"ORDER BY {SORT_OPTIONS[sort]} LIMIT %s OFFSET %s",
+                   tuple(params) + (per_page, (page - 1) * per_page))
+    result = {
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "pages": math.ceil(total / per_page) if total else 0,
+        "sort": sort,
+        "rows": cursor.fetchall(),
+    }
+
+    if with_facets:
+        facets = {}
+        for field in FILTER_FIELDS:
+            facet_where, facet_params = _where_clause(event_id, q, filters, skip_field=field)
+            cursor.execute(f"SELECT {field} AS valeur, COUNT(*) AS nb FROM inscriptions WHERE {facet_where} "
+                           f"GROUP BY {field} ORDER BY nb DESC", tuple(facet_params))
+            counts = {}
+            for row in cursor.fetchall():
+                value = row["valeur"] or EMPTY_VALUE # NULL et '' regroupés
+                counts[value] = counts.get(value, 0) + row["nb"]
+            facets[field] = [{"value": value, "count": count} for value, count in counts.items()]
+        result["facets"] = facets
+    return result
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Limiteur de débit partagé par tous les appels à l'API Weezevent (seau à jetons adaptatif).
+
+Un seul seau par processus (LIMITER), utilisé par weezevent_utils.weezevent_request (moteur
+synchrone, threads : acquire) et weezevent_async._request (moteur async : acquire_async) : chaque
+appel prend un jeton avant de partir.
+
+Adaptation (AIMD) :
+  - 429 Too Many Requests : débit divisé par 2 (sans limite jusque-là : moitié des réponses réussies
+    de la dernière seconde), pause de Retry-After secondes (secondes ou date HTTP, RATE_DEFAULT_BACKOFF
+    si absent) pour tous les appels, puis nouvel essai de la requête (jusqu'à WEEZEVENT_429_RETRIES
+    fois) : l'événement n'est plus perdu sur une limitation ;
+  - chaque seconde sans 429 : débit augmenté d'un pas fixe (10 % du plafond, ou du débit d'avant la
+    dernière réduction, MIN_RATE si aucun n'est connu), sans dépasser WEEZEVENT_RATE_LIMIT : le débit
+    remonte jusqu'à la limitation suivante ;
+  - en-têtes X-RateLimit-Limit / X-RateLimit-Remaining / X-RateLimit-Reset (si l'API les envoie) :
+    ils font foi, débit = remaining / reset (quota restant réparti jusqu'à la fin de la fenêtre),
+    pause jusqu'à la fin de la fenêtre si le quota est épuisé.
+
+La consommation (appels, 429, nouveaux essais, attente cumulée des appelants, dernier quota connu)
+est cumulée ;
+SyncReport en garde la part de chaque synchro (details.api_quota de sync_runs).
+
+Variables d'environnement : WEEZEVENT_RATE_LIMIT (appels/s, plafond et débit initial ; défaut 0 :
+pas de plafond, le débit est appris des réponses de l'API), WEEZEVENT_RATE_BURST (rafale, défaut 10),
+WEEZEVENT_429_RETRIES (défaut 3), WEEZEVENT_MAX_RETRY_AFTER (attente maximale acceptée en secondes,
+défaut 120 : au-delà, le 429 est rendu à l'appelant).
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+MAX_RATE = float(os.getenv("WEEZEVENT_RATE_LIMIT", 0))
+BURST = max(1, int(os.getenv("WEEZEVENT_RATE_BURST", 10)))
+MAX_RETRIES = int(os.getenv("WEEZEVENT_429_RETRIES", 3))
+MAX_RETRY_AFTER = float(os.getenv("WEEZEVENT_MAX_RETRY_AFTER", 120))
+MIN_RATE = 0.5 # Appels/s : plancher après des 429 successifs
+RATE_RECOVERY = 0.1 # Remontée par seconde sans 429 (part du plafond ou du débit d'avant réduction)
+RATE_DEFAULT_BACKOFF = 1.0 # Pause (s) sur un 429 sans Retry-After
+
+USAGE_COUNTERS = ("requests", "throttled", "retries", "wait_seconds")
+
+
+def parse_retry_after(value, now=None):
+    """Délai (s) d'un en-tête Retry-After (nombre de secondes ou date HTTP). None si absent/illisible."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - (now or time.time()))
+    except (TypeError, ValueError):
+        return None
+
+
+def _header_number(headers, name):
+    try:
+        return float(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """
+    Seau à jetons thread-safe : `rate` jetons/s (0 : pas de limite), `burst` au plus.
+    `max_rate` : plafond (0 : aucun). Un appelant sans jeton attend puis redemande : un changement
+    de débit s'applique aussitôt à tous les appels en attente.
+    """
+
+    def __init__(self, max_rate=MAX_RATE, burst=BURST):
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.step = max_rate * RATE_RECOVERY
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic() # Instant à partir duquel les jetons s'accumulent (futur pendant une pause)
+        self.increased = self.updated # Dernière variation du débit
+        self.quota_limit = None
+        self.quota_remaining = None
+        self.usage = dict.fromkeys(USAGE_COUNTERS, 0)
+        self._recent = deque() # Instants des réponses réussies de la dernière seconde (débit accepté par l'API)
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Prend un jeton si possible. Retourne 0, ou le délai (s) avant de redemander."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self.updated: # Pause (429 ou quota épuisé)
+                wait = self.updated - now
+            elif self.rate > 0:
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+            else:
+                wait = 0.0
+            if wait > 0:
+                return wait
+            if self.rate > 0:
+                self.tokens -= 1
+            self.usage["requests"] += 1
+            return 0.0
+
+    def _count_wait(self, seconds):
+        if seconds > 0:
+            with self._lock:
+                self.usage["wait_seconds"] += seconds
+
+    def acquire(self):
+        """Attend un jeton (threads du moteur synchrone)."""
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return self._count_wait(time.monotonic() - started)
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """Attend un jeton sans bloquer la boucle asyncio (moteur async)."""
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return self._count_wait(time.monotonic() - started)
+            await asyncio.sleep(wait)
+
+    def _pause(self, seconds, now):
+        self.tokens = min(self.tokens, 0.0)
+        self.updated = max(self.updated, now + seconds)
+
+    def observe(self, status, headers):
+        """
+        Adapte le débit d'après une réponse (statut, en-têtes). Retourne la pause (s) à respecter
+        avant de réessayer si la requête a été limitée (429), sinon None.
+        """
+        now = time.monotonic()
+        limit = _header_number(headers, "X-RateLimit-Limit")
+        remaining = _header_number(headers, "X-RateLimit-Remaining")
+        reset = _header_number(headers, "X-RateLimit-Reset")
+        if reset is not None and reset > 1e9: # Horodatage epoch plutôt que secondes restantes
+            reset = max(0.0, reset - time.time())
+        with self._lock:
+            if limit is not None:
+                self.quota_limit = int(limit)
+            if remaining is not None:
+                self.quota_remaining = int(remaining)
+            while self._recent and self._recent[0] < now - 1: # Réussites de plus d'une seconde : oubliées
+                self._recent.popleft()
+            if status == 429:
+                self.usage["throttled"] += 1
+                if now >= self.updated: # Une seule réduction par épisode (les 429 des appels déjà partis suivent)
+                    previous = self.rate or len(self._recent)
+                    self.rate = max(MIN_RATE, previous / 2)
+                    self.step = (self.max_rate or previous) * RATE_RECOVERY or MIN_RATE # Jamais nul : le débit remonte
+                    self.increased = now
+                retry_after = parse_retry_after(headers.get("Retry-After"))
+                retry_after = RATE_DEFAULT_BACKOFF if retry_after is None else retry_after
+                if retry_after > MAX_RETRY_AFTER:
+                    return None # Attente trop longue pour une synchro : le 429 est rendu à l'appelant
+                self._pause(retry_after, now)
+                return retry_after
+            if status < 400:
+                self._recent.append(now)
+            if remaining is not None and reset:
+                if remaining <= 0:
+                    self._pause(reset, now)
+                else:
+                    self.rate = max(MIN_RATE, remaining / reset) # Quota annoncé par l'API : fait foi
+            elif self.rate > 0 and status < 400 and now - self.increased >= 1:
+                self.rate += self.step
+                self.increased = now
+            if self.max_rate > 0:
+                self.rate = min(self.rate, self.max_rate)
+            return None
+
+    def count_retry(self):
+        with self._lock:
+            self.usage["retries"] += 1
+
+    def snapshot(self):
+        """Compteurs cumulés, dernier quota connu et débit courant."""
+        with self._lock:
+            data = dict(self.usage)
+            data.update({"quota_limit": self.quota_limit, "quota_remaining": self.quota_remaining,
+                         "rate": round(self.rate, 2)})
+            return data
+
+    def usage_since(self, start):
+        """Consommation depuis `start` (snapshot antérieur) : compteurs en différence, quota et débit actuels."""
+        current = self.snapshot()
+        for counter in USAGE_COUNTERS:
+            current[counter] -= start.get(counter, 0)
+        current["wait_seconds"] = round(current["wait_seconds"], 3)
+        return current
+
+
+LIMITER = RateLimiter()
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+Progression des synchros participants en BDD : reprise après interruption, budget de temps et
+annulation depuis l'interface.
+
+Tables 'sync_progress' (une ligne par synchro, reprise comprise) et 'sync_checkpoints' (un point
+de reprise par événement) :
+  - chaque événement est marqué terminé après son écriture en base ; une synchro interrompue
+    (worker redémarré, thread arrêté, budget atteint, annulation) est reprise par la suivante, qui
+    ne retraite que les événements non terminés (reprise possible pendant SYNC_RESUME_MAX_HOURS) ;
+  - au sein d'un événement, un point de reprise est posé toutes les SYNC_CHECKPOINT_PAGE
+    participants : les participants de la page sont écrits (upsert seul) et leurs réponses
+    formulaire enregistrées dans answers_cache ; la reprise de l'événement saute les
+    participants_done premiers participants de la liste (participant/list est rappelé : la
+    réconciliation, faite à la dernière écriture de l'événement, exige la liste complète) ;
+  - les arrêts (budget SYNC_TIME_BUDGET_SECONDS ou durée choisie au lancement, annulation demandée
+    depuis l'interface, drapeau relu au plus toutes les CANCEL_POLL_SECONDS) sont vérifiés entre
+    deux événements et entre deux pages : un événement arrêté en cours est écrit jusqu'à son
+    dernier point de reprise, la suite sera reprise ;
+  - une seule synchro à la fois, tous workers gunicorn confondus : la synchro prend le bail
+    'sync_lease' par un UPDATE conditionnel (un seul gagnant, rowcount), la suivante n'est pas lancée ;
+  - un thread date le bail et la ligne 'running' toutes les HEARTBEAT_INTERVAL secondes, même
+    pendant un appel API long (participant/list, attentes Retry-After) : sans signe de vie depuis
+    SYNC_HEARTBEAT_TIMEOUT secondes (processus arrêté), le bail est repris et la synchro reprise.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+import mysql.connector
+from db_connection import get_connection
+from db_schema import ensure_schema
+from parsing_utils import to_datetime # Dates renvoyées en chaînes par SQLite (benchmarks)
+
+CHECKPOINT_PAGE = max(1, int(os.getenv("SYNC_CHECKPOINT_PAGE", 200)))
+TIME_BUDGET_SECONDS = float(os.getenv("SYNC_TIME_BUDGET_SECONDS", 0)) # 0 : pas de budget
+RESUME_MAX_AGE = timedelta(hours=float(os.getenv("SYNC_RESUME_MAX_HOURS", 12)))
+HEARTBEAT_TIMEOUT = timedelta(seconds=int(os.getenv("SYNC_HEARTBEAT_TIMEOUT", 180)))
+HEARTBEAT_INTERVAL = max(1.0, HEARTBEAT_TIMEOUT.total_seconds() / 6)
+CANCEL_POLL_SECONDS = 5
+LEASE_NAME = "participants"
+
+# Statuts d'une ligne sync_progress repris par la synchro suivante (sinon 'running' ou 'done')
+RESUMABLE_STATUSES = ("interrupted", "budget", "cancelled")
+# Raison d'arrêt -> statut du rapport sync_runs
+STOP_REPORT_STATUS = {"budget": "budget_atteint", "cancelled": "annulee"}
+
+
+def _now():
+    return datetime.now().replace(microsecond=0)
+
+
+def _execute(sql, params=(), fetch=False, dictionary=False):
+    """Exécute une requête dans sa propre transaction ; retourne les lignes (fetch) ou le rowcount."""
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        if not conn:
+            raise ConnectionError("Connexion DB impossible depuis le pool.")
+        cursor = conn.cursor(dictionary=dictionary)
+        cursor.execute(sql, params)
+        result = cursor.fetchall() if fetch else cursor.rowcount
+        conn.commit()
+        return result
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+def _with_dates(row):
+    row["started_at"] = to_datetime(row["started_at"])
+    row["heartbeat_at"] = to_datetime(row["heartbeat_at"])
+    return row
+
+
+class SyncProgress:
+    """Progression d'une synchro en cours (créée par start_progress)."""
+
+    def __init__(self, progress_id, done_event_ids, offsets, budget_seconds, resumed_at=None, lease_owner=None):
+        self.id = progress_id
+        self.lease_owner = lease_owner # Jeton du bail sync_lease détenu par cette synchro
+        self.done_event_ids = set(done_event_ids)
+        self.offsets = offsets # event_id -> participants déjà passés lors d'une exécution précédente
+        self.resumed_at = resumed_at # Début de la synchro reprise (None : nouvelle synchro)
+        self.deadline = time.monotonic() + budget_seconds if budget_seconds else None
+        self.stop_reason = None
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._heartbeat_thread = None
+
+    def start_heartbeat(self):
+        """Date le bail et la ligne 'running' en arrière-plan jusqu'à finish()."""
+        if self.id is None:
+            return
+        self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop, name="sync-heartbeat", daemon=True)
+        self._heartbeat_thread.start()
+
+    def _heartbeat_loop(self):
+        while not self._stopped.wait(HEARTBEAT_INTERVAL):
+            try:
+                now = _now()
+                if not _execute("UPDATE sync_lease SET heartbeat_at = %s WHERE name = %s AND owner = %s",
+                                (now, LEASE_NAME, self.lease_owner)):
+                    logging.error("Bail de synchro perdu (signe de vie trop ancien) : une autre synchro peut démarrer.")
+                _execute("UPDATE sync_progress SET heartbeat_at = %s WHERE id = %s", (now, self.id))
+            except (mysql.connector.Error, ConnectionError) as db_err:
+                logging.warning(f"Signe de vie de la synchro non enregistré: {db_err}")
+
+    def pending(self, event_ids):
+        """Événements restant à traiter, dans l'ordre donné (les plus proches d'abord)."""
+        return [event_id for event_id in event_ids if event_id not in self.done_event_ids]
+
+    def should_stop(self):
+        """'budget', 'cancelled' ou None. Relit le drapeau d'annulation au plus toutes les CANCEL_POLL_SECONDS."""
+        with self._lock:
+            if self.stop_reason:
+                return self.stop_reason
+            if self.deadline is not None and time.monotonic() >= self.deadline:
+                self.stop_reason = "budget"
+                return self.stop_reason
+            if self.id is None or time.monotonic() - self._last_poll < CANCEL_POLL_SECONDS:
+                return None
+            self._last_poll = time.monotonic()
+        try:
+            rows = _execute("SELECT cancel_requested FROM sync_progress WHERE id = %s", (self.id,), fetch=True)
+        except (mysql.connector.Error, ConnectionError) as db_err:
+            logging.warning(f"Progression de la synchro non relue: {db_err}")
+            return None
+        if rows and rows[0][0]:
+            with self._lock:
+                self.stop_reason = "cancelled"
+        return self.stop_reason
+
+    def checkpoint(self, event_id, participants_done, participants_total):
+        """Point de reprise au sein d'un événement (participants de la page déjà écrits, réponses dans answers_cache)."""
+        self._save_event(event_id, participants_done, participants_total, done=False)
+
+    def event_done(self, event_id, participants_total):
+        """Événement écrit en base : il ne sera pas retraité par une reprise."""
+        self._save_event(event_id, participants_total, participants_total, done=True)
+        with self._lock:
+            self.done_event_ids.add(event_id)
+
+    def _save_event(self, event_id, participants_done, participants_total, done):
+        if self.id is None:
+            return
+        try:
+            # Suppression puis insertion : portable (MySQL / base SQLite des benchmarks), ligne unique par événement
+            conn = get_connection()
+            cursor = conn.cursor()
+            try:
+                now = _now()
+                cursor.execute("DELETE FROM sync_checkpoints WHERE progress_id = %s AND event_id = %s", (self.id, event_id))
+                cursor.execute("INSERT INTO sync_checkpoints (progress_id, event_id, participants_done, participants_total, "
+                               "event_done, updated_at) VALUES (%s, %s, %s, %s, %s, %s)",
+                               (self.id, event_id, participants_done, participants_total, int(done), now))
+                cursor.execute("UPDATE sync_progress SET events_done = "
+                               "(SELECT COUNT(*) FROM sync_checkpoints WHERE progress_id = %s AND event_done = 1) "
+                               "WHERE id = %s", (self.id, self.id))
+                conn.commit()
+            finally:
+                cursor.close()
+                conn.close()
+        except (mysql.connector.Error, ConnectionError, AttributeError) as db_err:
+            # Sans point de reprise, une synchro interrompue retraitera l'événement : pas d'arrêt pour autant
+            logging.warning(f"Point de reprise event {event_id} non enregistré: {db_err}")
+
+    def mark_report(self, report, event_ids):
+        """Statut du rapport (SyncReport) d'une synchro arrêtée avant la fin."""
+        remaining = len(self.pending(event_ids))
+        reason = "Budget de temps atteint" if self.stop_reason == "budget" else "Synchro annulée"
+        message = f"{reason} : {remaining} événement(s) restant(s), repris à la prochaine synchro."
+        logging.warning(message)
+        report.mark(STOP_REPORT_STATUS[self.stop_reason], message)
+
+    def finish(self, status):
+        """
+        Clôt la progression : 'done', ou 'interrupted' / 'budget' / 'cancelled' (reprise par la synchro
+        suivante). Arrête le signe de vie et libère le bail.
+        """
+        self._stopped.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+        if self.id is None:
+            return
+        try:
+            _execute("UPDATE sync_progress SET status = %s, finished_at = %s, heartbeat_at = %s WHERE id = %s",
+                     (status, _now(), _now(), self.id))
+            _execute("UPDATE sync_lease SET owner = NULL WHERE name = %s AND owner = %s", (LEASE_NAME, self.lease_owner))
+        except (mysql.connector.Error, ConnectionError) as db_err:
+            logging.error(f"Fin de la progression de synchro non enregistrée: {db_err}")
+
+
+def _claim_lease(owner, now):
+    """Prend le bail sync_lease s'il est libre ou sans signe de vie récent. Un seul appelant l'obtient (rowcount)."""
+    # Ligne créée au premier lancement, sans toucher à une ligne existante
+    _execute("INSERT INTO sync_lease (name, owner, heartbeat_at) VALUES (%s, NULL, %s) "
+             "ON DUPLICATE KEY UPDATE name = VALUES(name)", (LEASE_NAME, now))
+    return _execute("UPDATE sync_lease SET owner = %s, heartbeat_at = %s "
+                    "WHERE name = %s AND (owner IS NULL OR heartbeat_at < %s)",
+                    (owner, now, LEASE_NAME, now - HEARTBEAT_TIMEOUT)) == 1
+
+
+def start_progress(event_ids, budget_seconds=None):
+    """
+    Ouvre la progression d'une synchro sur `event_ids` : prend le bail, puis reprend la dernière
+    synchro interrompue (récente) ou en crée une. Retourne (SyncProgress, None), ou (None, message)
+    si une autre synchro détient le bail. Sans BDD disponible, la synchro tourne sans points de reprise.
+    """
+    budget_seconds = TIME_BUDGET_SECONDS if budget_seconds is None else budget_seconds
+    if not ensure_schema():
+        return SyncProgress(None, [], {}, budget_seconds), None
+    now = _now()
+    owner = uuid.uuid4().hex
+    try:
+        if not _claim_lease(owner, now):
+            rows = _execute("SELECT started_at, heartbeat_at FROM sync_progress WHERE status = 'running' "
+                            "ORDER BY id DESC LIMIT 1", fetch=True, dictionary=True)
+            since = f" (démarrée le {_with_dates(rows[0])['started_at']:%d/%m/%Y %H:%M})" if rows else ""
+            return None, f"Une synchro est déjà en cours{since}."
+        # Bail détenu : une ligne 'running' restante est celle d'une synchro arrêtée sans finish()
+        statuses = ("running",) + RESUMABLE_STATUSES
+        rows = _execute(f"SELECT id, started_at, heartbeat_at, status FROM sync_progress "
+                        f"WHERE status IN ({', '.join(['%s'] * len(statuses))}) AND started_at >= %s "
+                        f"ORDER BY id DESC LIMIT 1", statuses + (now - RESUME_MAX_AGE,), fetch=True, dictionary=True)
+        previous = _with_dates(rows[0]) if rows else None
+        event_list = json.dumps([int(event_id) for event_id in event_ids])
+        if previous:
+            checkpoints = _execute("SELECT event_id, participants_done, event_done FROM sync_checkpoints "
+                                   "WHERE progress_id = %s", (previous["id"],), fetch=True, dictionary=True)
+            _execute("UPDATE sync_progress SET status = 'running', heartbeat_at = %s, finished_at = NULL, "
+                     "cancel_requested = 0, resumes = resumes + 1, event_ids = %s WHERE id = %s",
+                     (now, event_list, previous["id"]))
+            done = [row["event_id"] for row in checkpoints if row["event_done"]]
+            offsets = {row["event_id"]: row["participants_done"] for row in checkpoints if not row["event_done"]}
+            logging.info(f"Reprise de la synchro du {previous['started_at']} ({previous['status']}) : "
+                         f"{len(done)} événement(s) déjà traité(s), {len(offsets)} en cours.")
+            progress = SyncProgress(previous["id"], done, offsets, budget_seconds, resumed_at=previous["started_at"],
+                                    lease_owner=owner)
+            progress.start_heartbeat()
+            return progress, None
+        conn = get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("INSERT INTO sync_progress (started_at, heartbeat_at, status, event_ids, events_done, "
+                           "cancel_requested, resumes) VALUES (%s, %s, 'running', %s, 0, 0, 0)", (now, now, event_list))
+            conn.commit()
+            progress = SyncProgress(cursor.lastrowid, [], {}, budget_seconds, lease_owner=owner)
+            progress.start_heartbeat()
+            return progress, None
+        finally:
+            cursor.close()
+            conn.close()
+    except (mysql.connector.Error, ConnectionError, AttributeError) as db_err:
+        logging.error(f"Progression de synchro indisponible (pas de reprise possible pour cette exécution): {db_err}")
+        try:
+            _execute("UPDATE sync_lease SET owner = NULL WHERE name = %s AND owner = %s", (LEASE_NAME, owner))
+        except (mysql.connector.Error, ConnectionError):
+            pass # Bail libéré à l'expiration de son signe de vie
+        return SyncProgress(None, [], {}, budget_seconds), None
+
+
+def request_cancel():
+    """Demande l'arrêt de la synchro en cours (tous workers). Retourne True si une synchro tournait."""
+    if not ensure_schema():
+        return False
+    try:
+        return _execute("UPDATE sync_progress SET cancel_requested = 1 WHERE status = 'running'") > 0
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Annulation de la synchro non enregistrée: {db_err}")
+        return False
+
+
+def current_progress():
+    """Synchro en cours (dict : started_at, events_done, events_total, cancel_requested) ou None."""
+    if not ensure_schema():
+        return None
+    try:
+        rows = _execute("SELECT id, started_at, heartbeat_at, event_ids, events_done, cancel_requested, resumes "
+                        "FROM sync_progress WHERE status = 'running' ORDER BY id DESC LIMIT 1", fetch=True, dictionary=True)
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Lecture de la progression de synchro impossible: {db_err}")
+        return None
+    progress = _with_dates(rows[0]) if rows else None
+    if not progress or progress["heartbeat_at"] < _now() - HEARTBEAT_TIMEOUT:
+        return None
+    try:
+        progress["events_total"] = len(json.loads(progress.pop("event_ids") or "[]"))
+    except (TypeError, ValueError):
+        progress["events_total"] = None
+    return progress
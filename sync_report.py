@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Rapport structuré d'une exécution de la synchronisation Weezevent.
+Alimenté pendant get_registrations(), puis enregistré dans la table 'sync_runs'.
+"""
+import json
+import logging
+import threading
+from datetime import datetime
+import mysql.connector
+from db_connection import get_connection
+from db_schema import ensure_schema
+from rate_limiter import LIMITER # Consommation du quota API Weezevent pendant l'exécution
+
+# Résultats possibles d'une écriture participant (valeur de retour de save_to_db)
+WRITE_OUTCOMES = ("inserted", "updated", "unchanged", "error")
+
+
+class EventStats:
+    """Compteurs d'un événement pour une exécution de synchro."""
+
+    FIELDS = ("participants", "answers_calls", "answers_cached", "inserted", "updated", "unchanged", "deleted", "errors")
+
+    def __init__(self, event_id):
+        self.event_id = event_id
+        self.api_seconds = 0.0
+        self.participants = 0
+        self.answers_calls = 0
+        self.answers_cached = 0 # Réponses servies par answers_cache (sans appel API)
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0 # Inscriptions absentes de l'API supprimées (réconciliation)
+        self.errors = 0
+
+    def to_dict(self):
+        data = {"event_id": self.event_id, "api_seconds": round(self.api_seconds, 3)}
+        for field in self.FIELDS:
+            data[field] = getattr(self, field)
+        return data
+
+
+class SyncReport:
+    """Rapport d'une exécution : horodatage, statut, compteurs par événement (thread-safe)."""
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.status = "en_cours"
+        self.message = None
+        self.events = {} # event_id -> EventStats (ordre de traitement)
+        self.phase_seconds = {} # Ex: {"get_events": 1.2, "ticket_prices": 0.4}
+        self.unmatched_labels = {} # Libellé formulaire sans correspondance -> occurrences
+        self.api_quota = None # Appels API, 429, nouveaux essais, attente (renseigné par finish())
+        self._quota_start = LIMITER.snapshot()
+        self._lock = threading.Lock()
+
+    def event(self, event_id):
+        """Retourne (et crée au besoin) les compteurs de l'événement."""
+        with self._lock:
+            stats = self.events.get(event_id)
+            if stats is None:
+                stats = EventStats(event_id)
+                self.events[event_id] = stats
+            return stats
+
+    def add(self, event_id, field, value=1):
+        """Incrémente un compteur de l'événement (ex: add(123, "answers_calls"))."""
+        stats = self.event(event_id)
+        with self._lock:
+            setattr(stats, field, getattr(stats, field) + value)
+
+    def add_api_time(self, event_id, seconds):
+        self.add(event_id, "api_seconds", seconds)
+
+    def record_write(self, event_id, outcome):
+        """Comptabilise le résultat d'une écriture participant (inserted/updated/unchanged/error)."""
+        if outcome in ("inserted", "updated", "unchanged"):
+            self.add(event_id, outcome)
+        elif outcome == "error":
+            self.add(event_id, "errors")
+
+    def record_write_counts(self, event_id, counts):
+        """Comptabilise les résultats d'une écriture groupée ({"inserted": n, ..., "deleted": n, "errors": n})."""
+        for field in ("inserted", "updated", "unchanged", "deleted", "errors"):
+            if counts.get(field):
+                self.add(event_id, field, counts[field])
+
+    def changed_event_ids(self):
+        """Événements dont au moins un participant a été inséré, modifié ou supprimé pendant l'exécution."""
+        with self._lock:
+            return [event_id for event_id, stats in self.events.items()
+                    if stats.inserted or stats.updated or stats.deleted]
+
+    def add_unmatched_labels(self, labels):
+        """Comptabilise les libellés de réponses non reconnus par field_mapping."""
+        with self._lock:
+            for label in labels:
+                self.unmatched_labels[label] = self.unmatched_labels.get(label, 0) + 1
+
+    def set_phase_time(self, phase, seconds):
+        with self._lock:
+            self.phase_seconds[phase] = round(seconds, 3)
+
+    def mark(self, status, message=None):
+        """Fixe le statut final (ex: 'aucun_evenement', 'erreur_token')."""
+        self.status = status
+        self.message = message
+
+    def finish(self, status=None, message=None):
+        """Clôt le rapport. Sans statut explicite, un rapport encore 'en_cours' passe à 'ok'."""
+        self.finished_at = datetime.now()
+        self.api_quota = LIMITER.usage_since(self._quota_start) # Tous les appels du processus pendant l'exécution
+        if status:
+            self.mark(status, message)
+        elif self.status == "en_cours":
+            self.status = "ok"
+
+    # --- Totaux ---
+    def total(self, field):
+        with self._lock:
+            return sum(getattr(stats, field) for stats in self.events.values())
+
+    @property
+    def duration_seconds(self):
+        end = self.finished_at or datetime.now()
+        return (end - self.started_at).total_seconds()
+
+    @property
+    def participants_processed(self):
+        return sum(self.total(outcome) for outcome in ("inserted", "updated", "unchanged"))
+
+    @property
+    def throughput_per_s(self):
+        duration = self.duration_seconds
+        return round(self.participants_processed / duration, 2) if duration > 0 else None
+
+    def summary_line(self):
+        line = (f"Synchro {self.status}: {len(self.events)} événements, {self.total('participants')} participants API, "
+                f"{self.total('inserted')} insérés / {self.total('updated')} MAJ / {self.total('unchanged')} inchangés / "
+                f"{self.total('deleted')} supprimés, "
+                f"{self.total('errors')} erreurs, {self.duration_seconds:.1f} s ({self.throughput_per_s or 0} part./s)")
+        if self.api_quota:
+            line += (f", {self.api_quota['requests']} appels API ({self.api_quota['throttled']} limités, "
+                     f"{self.api_quota['wait_seconds']:.1f} s d'attente)")
+        return line
+
+
+# ===== Persistance et lecture des rapports =====
+def save_sync_report(report):
+    """Enregistre le rapport dans 'sync_runs'. Retourne l'id inséré (ou None en cas d'erreur)."""
+    if not ensure_schema():
+        logging.error("Rapport de synchro non enregistré: schéma indisponible.")
+        return None
+
+    details = {
+        "events": [stats.to_dict() for stats in report.events.values()],
+        "phases": report.phase_seconds,
+        "unmatched_labels": report.unmatched_labels,
+        "api_quota": report.api_quota,
+    }
+    params = (
+        report.started_at, report.finished_at, round(report.duration_seconds, 3), report.status,
+        (report.message or "")[:255] or None,
+        len(report.events), report.total("participants"), report.participants_processed,
+        report.total("answers_calls"), report.total("inserted"), report.total("updated"),
+        report.total("unchanged"), report.total("errors"), round(report.total("api_seconds"), 3),
+        report.throughput_per_s, json.dumps(details),
+    )
+    sql = """
+        INSERT INTO sync_runs (
+            started_at, finished_at, duration_seconds, status, message,
+            events_count, participants_api, participants_processed, answers_calls,
+            inserted, updated, unchanged, errors, api_seconds, throughput_per_s, details
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        conn.commit()
+        logging.info(f"Rapport de synchro enregistré (id {cursor.lastrowid}). {report.summary_line()}")
+        return cursor.lastrowid
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Erreur enregistrement rapport de synchro: {db_err}")
+        return None
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+def get_recent_sync_runs(limit=30):
+    """Retourne les dernières exécutions (plus récente en premier), détails JSON décodés."""
+    if not ensure_schema():
+        return []
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM sync_runs ORDER BY started_at DESC LIMIT %s", (int(limit),))
+        runs = cursor.fetchall()
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Erreur lecture des rapports de synchro: {db_err}")
+        return []
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+    for run in runs:
+        try:
+            run["details"] = json.loads(run.get("details") or "{}")
+        except (TypeError, ValueError):
+            run["details"] = {}
+    return runs
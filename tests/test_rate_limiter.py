@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Limiteur de débit (rate_limiter.RateLimiter) : remontée du débit après un 429.
+
+    python -m unittest discover -s tests
+"""
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rate_limiter # noqa: E402
+
+
+class RateLimiterRecoveryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(rate_limiter.time, "monotonic", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_recovers_after_429_without_limit_nor_recent_success(self):
+        # Sans plafond (LIMITER par défaut) et sans réussite récente : débit plancher, puis remontée
+        limiter = rate_limiter.RateLimiter(max_rate=0)
+        self.assertEqual(limiter.observe(429, {"Retry-After": "0"}), 0.0)
+        self.assertEqual(limiter.rate, rate_limiter.MIN_RATE)
+        for _ in range(30): # 3 s de réponses 200
+            self.now += 0.1
+            limiter.observe(200, {})
+        self.assertGreater(limiter.rate, rate_limiter.MIN_RATE)
+
+    def test_old_successes_do_not_count_as_current_rate(self):
+        # Réussites vieilles de plus d'une seconde : oubliées avant d'estimer le débit accepté
+        limiter = rate_limiter.RateLimiter(max_rate=0)
+        for _ in range(20):
+            limiter.observe(200, {})
+        self.now += 5
+        limiter.observe(429, {"Retry-After": "0"})
+        self.assertEqual(limiter.rate, rate_limiter.MIN_RATE)
+
+    def test_rate_capped_by_max_rate(self):
+        limiter = rate_limiter.RateLimiter(max_rate=4)
+        limiter.observe(429, {"Retry-After": "0"})
+        self.assertEqual(limiter.rate, 2)
+        for _ in range(100):
+            self.now += 0.5
+            limiter.observe(200, {})
+        self.assertEqual(limiter.rate, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Cache persistant des prix de base des billets (table 'ticket_prices', une ligne par billet).
+
+Les prix servent de repli quand le montant payé n'est pas fourni par l'API. Ils sont rechargés
+depuis /tickets uniquement pour les événements dont le dernier chargement (table
+'ticket_prices_events', renseignée aussi pour les événements sans billet) a plus de
+TICKET_PRICES_TTL_HOURS heures (défaut : 24) ; sinon le dictionnaire {ticket_id: prix} est lu en
+SQL et survit aux redémarrages. En cas d'échec de l'API, les prix périmés restent utilisés.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+import mysql.connector
+from db_connection import get_connection
+from db_schema import ensure_schema
+from parsing_utils import parse_amount, to_datetime
+
+TTL_HOURS = float(os.getenv("TICKET_PRICES_TTL_HOURS", 24))
+
+
+def chunked(values, size):
+    """Découpe une liste en tranches de `size` éléments."""
+    size = max(1, int(size))
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+def load_prices(event_ids, now=None):
+    """
+    Lit les prix en cache des événements demandés.
+    Retourne ({ticket_id (str): prix Decimal ou None}, {event_id frais (moins de TTL_HOURS)}).
+    """
+    if not event_ids or not ensure_schema():
+        return {}, set()
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        placeholders = ", ".join(["%s"] * len(event_ids))
+        params = tuple(int(eid) for eid in event_ids)
+        cursor.execute(f"SELECT ticket_id, price FROM ticket_prices WHERE event_id IN ({placeholders})", params)
+        rows = cursor.fetchall()
+        cursor.execute(f"SELECT event_id, fetched_at FROM ticket_prices_events "
+                       f"WHERE event_id IN ({placeholders})", params)
+        markers = cursor.fetchall()
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Erreur lecture cache prix billets: {db_err}")
+        return {}, set()
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+    limit = (now or datetime.now()) - timedelta(hours=TTL_HOURS)
+    prices = {str(ticket_id): parse_amount(price) for ticket_id, price in rows}
+    fresh = set()
+    for event_id, fetched_at in markers:
+        fetched_at = to_datetime(fetched_at)
+        if fetched_at and fetched_at > limit:
+            fresh.add(int(event_id))
+    return prices, fresh
+
+
+def store_prices(prices_by_event):
+    """
+    Remplace les prix des événements rechargés ({event_id: {ticket_id: prix}}, dictionnaire vide pour
+    un événement sans billet) en une transaction : les billets supprimés côté Weezevent disparaissent
+    du cache, et la date de chargement de chaque événement est notée dans 'ticket_prices_events'.
+    """
+    event_ids = [int(eid) for eid in prices_by_event if eid is not None]
+    if not event_ids or not ensure_schema():
+        return
+    now = datetime.now().replace(microsecond=0)
+    rows = [(int(ticket_id), int(event_id), parse_amount(price), now)
+            for event_id, prices in prices_by_event.items() if event_id is not None
+            for ticket_id, price in prices.items() if str(ticket_id).isdigit()]
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        placeholders = ", ".join(["%s"] * len(event_ids))
+        cursor.execute(f"DELETE FROM ticket_prices WHERE event_id IN ({placeholders})", tuple(event_ids))
+        if rows:
+            cursor.executemany("""
+                INSERT INTO ticket_prices (ticket_id, event_id, price, fetched_at)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    event_id = VALUES(event_id),
+                    price = VALUES(price),
+                    fetched_at = VALUES(fetched_at)
+            """, rows)
+        cursor.executemany("""
+            INSERT INTO ticket_prices_events (event_id, fetched_at)
+            VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE fetched_at = VALUES(fetched_at)
+        """, [(event_id, now) for event_id in event_ids])
+        conn.commit()
+        logging.debug(f"Cache prix billets: {len(rows)} billets enregistrés pour {len(event_ids)} événements.")
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Erreur écriture cache prix billets: {db_err}")
+        if conn: conn.rollback()
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
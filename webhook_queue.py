@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+"""
+Notifications webhook Weezevent (création / modification / annulation d'inscription).
+
+Réception (route POST /webhooks/weezevent de app.py) :
+  - signature HMAC-SHA256 du corps brut, en-têtes X-Webhook-Timestamp et
+    X-Webhook-Signature: sha256=<hex de HMAC(WEBHOOK_SECRET, "<timestamp>.<corps>")>, horodatage
+    accepté à WEBHOOK_TOLERANCE_SECONDS près (rejeu d'une requête capturée refusé) ;
+  - la notification est enregistrée telle quelle dans la table 'webhook_events' (statut 'pending')
+    avant la réponse 202 : rien n'est perdu si le processus s'arrête.
+
+Traitement (thread de fond, un par processus) : les notifications arrivées pendant
+WEBHOOK_BATCH_WINDOW secondes sont réservées par lot (claim_token, sans double traitement entre
+workers gunicorn) puis appliquées par événement avec le même chemin que la synchro complète :
+réponses formulaire (answers_cache), field_mapping, build_participant_record, écriture groupée
+participant_writer, puis versions/exports/agrégats. Une annulation supprime l'inscription
+(email, event_id). Un lot en échec est retenté jusqu'à WEBHOOK_MAX_ATTEMPTS fois.
+Les synchros complètes restent la réconciliation de référence (participants annulés sans email
+connu, notifications perdues côté Weezevent).
+
+Format accepté (JSON) : {"action": "create" | "update" | "cancel", "id_event": 123,
+"participant": {... comme participant/list?full=1 ...}} ; "type": "participant.updated" et une
+enveloppe {"data": {...}} sont aussi reconnus. Sans bloc "participant" complet, le participant est
+relu via participant/list (ids_participant[]).
+
+Outils en ligne de commande (tests locaux) :
+  python webhook_queue.py replay fichier.jsonl [--url http://localhost:5000/webhooks/weezevent]
+      rejoue des notifications enregistrées (une par ligne), signées avec WEBHOOK_SECRET ;
+  python webhook_queue.py replay fichier.jsonl --direct   mise en file sans passer par HTTP ;
+  python webhook_queue.py dump [--status error] > fichier.jsonl   exporte les notifications reçues ;
+  python webhook_queue.py process                          traite la file une fois.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+import mysql.connector
+from db_connection import get_connection
+from db_schema import ensure_schema
+import metrics
+
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+SIGNATURE_HEADER = "X-Webhook-Signature"
+TIMESTAMP_HEADER = "X-Webhook-Timestamp"
+SIGNATURE_TOLERANCE = int(os.getenv("WEBHOOK_TOLERANCE_SECONDS", 300))
+BATCH_WINDOW = float(os.getenv("WEBHOOK_BATCH_WINDOW", 2))
+BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", 200))
+MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 5))
+IDLE_POLL_SECONDS = 60 # Relecture périodique : notifications laissées par un autre processus ou un redémarrage
+CLAIM_TIMEOUT = timedelta(minutes=10) # Lot réservé par un processus arrêté en cours de traitement
+MAX_PAYLOAD_BYTES = 256 * 1024
+
+# Action Weezevent -> traitement
+ACTIONS = {
+    "create": "upsert", "created": "upsert", "update": "upsert", "updated": "upsert",
+    "cancel": "cancel", "cancelled": "cancel", "canceled": "cancel", "delete": "cancel", "deleted": "cancel",
+}
+
+
+# ===== Signature =====
+def sign(body, timestamp, secret=None):
+    """Valeur de l'en-tête X-Webhook-Signature pour `body` (bytes) émis à `timestamp` (secondes)."""
+    secret = secret or WEBHOOK_SECRET
+    digest = hmac.new(secret.encode("utf-8"), f"{int(timestamp)}.".encode("utf-8") + body, hashlib.sha256)
+    return "sha256=" + digest.hexdigest()
+
+
+def verify_signature(body, signature, timestamp, secret=None, now=None):
+    """True si la signature correspond au corps brut et que l'horodatage est récent."""
+    secret = secret or WEBHOOK_SECRET
+    if not secret or not signature or not timestamp:
+        return False
+    try:
+        timestamp = int(timestamp)
+    except (TypeError, ValueError):
+        return False
+    if abs((now or time.time()) - timestamp) > SIGNATURE_TOLERANCE:
+        return False
+    return hmac.compare_digest(sign(body, timestamp, secret), signature.strip())
+
+
+# ===== Lecture d'une notification =====
+def parse_notification(payload):
+    """
+    Retourne (action, event_id, participant_id, participant) ; action : 'upsert' ou 'cancel',
+    participant : dict participant/list ou None. Lève ValueError si la notification est inexploitable.
+    """
+    if not isinstance(payload, dict):
+        raise ValueError("notification JSON attendue (objet)")
+    body = payload.get("data") if isinstance(payload.get("data"), dict) else payload
+    raw_action = str(payload.get("action") or payload.get("type") or body.get("action") or "").lower()
+    action = ACTIONS.get(raw_action.rsplit(".", 1)[-1])
+    if action is None:
+        raise ValueError(f"action inconnue : '{raw_action}'")
+    participant = body.get("participant") if isinstance(body.get("participant"), dict) else None
+    event_id = body.get("id_event") or body.get("event_id") or (participant or {}).get("id_event")
+    participant_id = body.get("id_participant") or (participant or {}).get("id_participant")
+    try:
+        event_id = int(event_id)
+        participant_id = int(participant_id) if participant_id else None
+    except (TypeError, ValueError):
+        raise ValueError("id_event/id_participant invalide")
+    if participant_id is None and participant is None:
+        raise ValueError("participant non identifié")
+    return action, event_id, participant_id, participant
+
+
+# ===== File durable (table webhook_events) =====
+def enqueue(payload):
+    """Enregistre une notification valide. Retourne son id, ou None si la BDD est indisponible."""
+    action, event_id, participant_id, _participant = parse_notification(payload)
+    if not ensure_schema():
+        return None
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO webhook_events (received_at, action, event_id, participant_id, payload, status, attempts)
+            VALUES (%s, %s, %s, %s, %s, 'pending', 0)
+        """, (datetime.now().replace(microsecond=0), action, event_id, participant_id,
+              json.dumps(payload, ensure_ascii=False)))
+        conn.commit()
+        metrics.inc("webhook_events_received_total", action=action)
+        return cursor.lastrowid
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        logging.error(f"Webhook non enregistré (event {event_id}): {db_err}")
+        metrics.record_error("webhook_enqueue")
+        return None
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+def _claim_batch(limit=BATCH_SIZE):
+    """Réserve jusqu'à `limit` notifications en attente ; retourne leurs lignes (ordre de réception)."""
+    token = uuid.uuid4().hex
+    now = datetime.now().replace(microsecond=0)
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor(dictionary=True)
+        # Réservations abandonnées (processus arrêté pendant un lot) : remises en attente
+        cursor.execute("UPDATE webhook_events SET status = 'pending', claim_token = NULL "
+                       "WHERE status = 'processing' AND claimed_at < %s", (now - CLAIM_TIMEOUT,))
+        cursor.execute("SELECT id FROM webhook_events WHERE status = 'pending' ORDER BY id LIMIT %s", (int(limit),))
+        ids = [row["id"] for row in cursor.fetchall()]
+        if not ids:
+            conn.commit()
+            return []
+        placeholders = ", ".join(["%s"] * len(ids))
+        # status = 'pending' dans le WHERE : une ligne réservée entre-temps par un autre worker est ignorée
+        cursor.execute(f"UPDATE webhook_events SET status = 'processing', claim_token = %s, claimed_at = %s, "
+                       f"attempts = attempts + 1 WHERE status = 'pending' AND id IN ({placeholders})",
+                       (token, now, *ids))
+        conn.commit()
+        cursor.execute("SELECT id, action, event_id, participant_id, payload, attempts FROM webhook_events "
+                       "WHERE claim_token = %s ORDER BY id", (token,))
+        return cursor.fetchall()
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+def _note_emails(rows_emails):
+    """
+    Note l'email écrit par chaque notification ([(ligne, email)]) avant l'écriture : la réconciliation
+    d'une synchro complète en cours épargne ces inscriptions (participant_writer.SQL_DELETE_STALE).
+    """
+    if not rows_emails:
+        return
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.executemany("UPDATE webhook_events SET email = %s WHERE id = %s",
+                           [(email, row["id"]) for row, email in rows_emails])
+        conn.commit()
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+def _finish(rows, status, error=None):
+    """Clôt des notifications réservées : 'done', 'error', ou 'pending' (nouvel essai) si tentatives restantes."""
+    if not rows:
+        return
+    now = datetime.now().replace(microsecond=0)
+    params = []
+    for row in rows:
+        row_status = status
+        if status == "error" and row["attempts"] < MAX_ATTEMPTS:
+            row_status = "pending"
+        params.append((row_status, now if row_status != "pending" else None, (error or "")[:255] or None, row["id"]))
+        metrics.inc("webhook_events_processed_total", status=row_status)
+    conn = None
+    cursor = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.executemany("UPDATE webhook_events SET status = %s, processed_at = %s, error = %s, claim_token = NULL "
+                           "WHERE id = %s", params)
+        conn.commit()
+    except (mysql.connector.Error, ConnectionError) as db_err:
+        # Lignes restées 'processing' : reprises après CLAIM_TIMEOUT
+        logging.error(f"Statut des notifications webhook non enregistré: {db_err}")
+    finally:
+        if cursor: cursor.close()
+        if conn: conn.close()
+
+
+# ===== Application d'un lot =====
+def _fetch_participants(access_token, event_id, participant_ids):
+    """
+    Participants complets (participant/list?full=1) pour des notifications sans bloc participant,
+    ou tous ceux de l'événement si `participant_ids` est vide.
+    """
+    from weezevent_api import API_KEY, API_BASE_URL, weezevent_get
+    ids = "".join(f"&ids_participant[]={int(pid)}" for pid in participant_ids)
+    url = (f"{API_BASE_URL}/participant/list?api_key={API_KEY}&access_token={access_token}"
+           f"&id_event[]={int(event_id)}{ids}&full=1")
+    response = weezevent_get(url, "participant/list", timeout=45)
+    response.raise_for_status()
+    return {int(p["id_participant"]): p for p in response.json().get("participants", [])
+            if isinstance(p, dict) and p.get("id_participant")}
+
+
+def apply_notifications(rows):
+    """
+    Applique un lot de notifications (lignes de webhook_events). Retourne (lignes appliquées,
+    [(ligne rejetée, raison)]) ; une erreur d'API/BDD lève l'exception (lot entier retenté).
+    """
+    import answers_cache
+    import event_stats
+    from sync_report import SyncReport
+    from weezevent_api import (get_access_token, get_ticket_prices, participant_email, participant_record,
+                               publish_event_changes, save_event_participants)
+    from participant_writer import delete_event_participants
+
+    # Dernière notification par participant et par événement (ordre de réception)
+    by_event = {}
+    rejected = []
+    ok_rows = [] # Appliquées, ou remplacées par une notification plus récente du même participant
+    for row in rows:
+        try:
+            action, event_id, participant_id, participant = parse_notification(json.loads(row["payload"]))
+        except ValueError as parse_err:
+            rejected.append((row, str(parse_err)))
+            continue
+        notes = by_event.setdefault(event_id, {})
+        key = participant_id or participant_email(participant)
+        if key in notes:
+            ok_rows.append(notes[key][3])
+            if action == "cancel" and participant is None:
+                participant = notes[key][2] # Annulation sans bloc participant : email connu par la précédente
+        notes[key] = (action, participant_id, participant, row)
+
+    report = SyncReport() # Compteurs du lot (journalisés, non enregistrés dans sync_runs)
+    access_token = None
+    ticket_prices = {}
+    if by_event: # Upserts (prix, relectures) et annulations (participants restants) interrogent l'API
+        access_token = get_access_token()
+        if not access_token:
+            raise ConnectionError("token d'accès Weezevent non obtenu")
+    if any(action == "upsert" for notes in by_event.values() for action, *_ in notes.values()):
+        ticket_prices = get_ticket_prices(access_token, list(by_event))
+
+    for event_id, notes in by_event.items():
+        upserts = [(pid, participant, row) for action, pid, participant, row in notes.values() if action == "upsert"]
+        cancels = [(pid, participant, row) for action, pid, participant, row in notes.values() if action == "cancel"]
+        # Notifications sans données complètes (email du propriétaire) : participant relu depuis l'API
+        missing = [pid for pid, participant, _row in upserts if pid and not participant_email(participant or {})]
+        fetched = _fetch_participants(access_token, event_id, missing) if missing else {}
+
+        answers_cached = answers_cache.load_event_answers(event_id)
+        answers_to_cache = []
+        records = []
+        rows_emails = []
+        for num, (pid, participant, row) in enumerate(upserts, start=1):
+            p_data = participant if participant_email(participant or {}) else fetched.get(pid)
+            if p_data is None:
+                rejected.append((row, "participant introuvable dans l'API"))
+                continue
+            p_data = dict(p_data, id_participant=p_data.get("id_participant") or pid)
+            record = participant_record(access_token, event_id, num, p_data, answers_cached, answers_to_cache,
+                                        ticket_prices, report)
+            if record is None:
+                rejected.append((row, "email manquant"))
+                continue
+            records.append(record)
+            rows_emails.append((row, record.email))
+            ok_rows.append(row)
+        if records:
+            _note_emails(rows_emails)
+            report.record_write_counts(event_id, save_event_participants(event_id, records))
+            answers_cache.store_event_answers(event_id, answers_to_cache)
+
+        cancel_emails = set()
+        cancel_ids = set()
+        report.add(event_id, "participants", len(upserts) + len(cancels))
+        for pid, participant, row in cancels:
+            email = participant_email(participant or {})
+            if not email:
+                rejected.append((row, "annulation sans email : appliquée à la prochaine synchro complète"))
+                continue
+            cancel_emails.add(email)
+            cancel_ids.add(pid)
+            ok_rows.append(row)
+        # Une inscription (email, event_id) peut couvrir plusieurs participants : elle n'est supprimée que si
+        # aucun autre participant actif (écrit dans ce lot, ou encore présent dans l'API) ne porte l'email.
+        cancel_emails -= {record.email for record in records}
+        if cancel_emails:
+            remaining = {participant_email(p_data) for pid, p_data in _fetch_participants(access_token, event_id, []).items()
+                         if pid not in cancel_ids}
+            kept = cancel_emails & remaining
+            if kept:
+                logging.debug(f"Webhooks event {event_id}: {len(kept)} annulation(s) sans suppression (email encore actif).")
+            cancel_emails -= kept
+        if cancel_emails:
+            report.add(event_id, "deleted", delete_event_participants(event_id, cancel_emails))
+
+        if event_id in report.changed_event_ids():
+            publish_event_changes(event_id)
+    event_stats.refresh_event_stats(report.changed_event_ids())
+    logging.info(f"Webhooks: {len(rows)} notification(s), {len(rejected)} rejetée(s). {report.summary_line()}")
+    return ok_rows, rejected
+
+
+def process_pending():
+    """Traite la file jusqu'à épuisement. Retourne le nombre de notifications traitées."""
+    if not ensure_schema():
+        return 0
+    processed = 0
+    while True:
+        try:
+            rows = _claim_batch()
+        except (mysql.connector.Error, ConnectionError) as db_err:
+            logging.error(f"Lecture de la file webhook impossible: {db_err}")
+            return processed
+        if not rows:
+            return processed
+        try:
+            with metrics.timed("webhook_batch"):
+                ok_rows, rejected = apply_notifications(rows)
+        except Exception as batch_err:
+            logging.error(f"Lot de {len(rows)} notification(s) webhook en échec (nouvel essai): {batch_err}", exc_info=True)
+            _finish(rows, "error", str(batch_err))
+            return processed # Prochain essai au réveil suivant (pas de boucle serrée sur une API en panne)
+        _finish(ok_rows, "done")
+        for row, reason in rejected:
+            row["attempts"] = MAX_ATTEMPTS # Rejet définitif : inutile de réessayer
+            _finish([row], "error", reason)
+        processed += len(rows)
+
+
+# ===== Thread de traitement =====
+_wakeup = threading.Event()
+_worker_lock = threading.Lock()
+_worker_pid = None
+
+
+def _worker_loop():
+    while True:
+        _wakeup.wait(timeout=IDLE_POLL_SECONDS)
+        _wakeup.clear()
+        time.sleep(BATCH_WINDOW) # Regroupe les notifications arrivées dans la fenêtre
+        try:
+            process_pending()
+        except Exception as e:
+            logging.error(f"Erreur inattendue du traitement des webhooks: {e}", exc_info=True)
+
+
+def start_worker():
+    """Démarre le thread de traitement de ce processus (sans effet s'il tourne déjà)."""
+    global _worker_pid
+    with _worker_lock:
+        if _worker_pid == os.getpid():
+            return
+        _worker_pid = os.getpid()
+        threading.Thread(target=_worker_loop, name="webhook-worker", daemon=True).start()
+    _wakeup.set() # Notifications restées en file (redémarrage)
+
+
+def notify():
+    """Signale une nouvelle notification au thread de traitement."""
+    start_worker()
+    _wakeup.set()
+
+
+# ===== Outils en ligne de commande =====
+def _replay(path, url, direct):
+    import requests
+    sent = failed = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            if direct:
+                ok = enqueue(json.loads(line)) is not None
+            else:
+                body = line.strip().encode("utf-8")
+                timestamp = int(time.time())
+                response = requests.post(url, data=body, timeout=10, headers={
+                    "Content-Type": "application/json", TIMESTAMP_HEADER: str(timestamp),
+                    SIGNATURE_HEADER: sign(body, timestamp)})
+                ok = response.status_code == 202
+                if not ok:
+                    print(f"  {response.status_code}: {response.text[:200]}")
+            sent += ok
+            failed += not ok
+    print(f"{sent} notification(s) rejouée(s), {failed} en échec.")
+
+
+def _dump(status=None):
+    conn = get_connection()
+    cursor = conn.cursor()
+    try:
+        sql = "SELECT payload FROM webhook_events"
+        params = ()
+        if status:
+            sql += " WHERE status = %s"
+            params = (status,)
+        cursor.execute(sql + " ORDER BY id", params)
+        for (payload,) in cursor:
+            print(payload)
+    finally:
+        cursor.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    from log_config import setup_logging
+    load_dotenv()
+    WEBHOOK_SECRET = WEBHOOK_SECRET or os.getenv("WEBHOOK_SECRET")
+    setup_logging(logging.INFO)
+    parser = argparse.ArgumentParser(description="Outils de la file des webhooks Weezevent")
+    sub = parser.add_subparsers(dest="command", required=True)
+    replay = sub.add_parser("replay", help="Rejoue des notifications enregistrées (JSON, une par ligne)")
+    replay.add_argument("path")
+    replay.add_argument("--url", default="http://localhost:5000/webhooks/weezevent")
+    replay.add_argument("--direct", action="store_true", help="Mise en file directe, sans requête HTTP")
+    dump = sub.add_parser("dump", help="Exporte les notifications reçues (JSON, une par ligne)")
+    dump.add_argument("--status", choices=["pending", "processing", "done", "error"])
+    sub.add_parser("process", help="Traite la file une fois")
+    args = parser.parse_args()
+    if args.command == "replay":
+        if not args.direct and not WEBHOOK_SECRET:
+            parser.error("WEBHOOK_SECRET requis pour signer les notifications")
+        _replay(args.path, args.url, args.direct)
+    elif args.command == "dump":
+        _dump(args.status)
+    else:
+        print(f"{process_pending()} notification(s) traitée(s).")
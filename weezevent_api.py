@@ -1,22 +1,39 @@
 import requests
+import time
 from datetime import datetime, date
 from db_connection import get_connection
 import os
 from dotenv import load_dotenv
 import logging
 import traceback
-import decimal # Pour gérer les montants
 import json
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 import mysql.connector
+import metrics
+from parsing_utils import parse_date, parse_datetime, parse_amount # Conversions mémoïsées (dates, montants)
+import field_mapping # Correspondance questions formulaire -> colonnes (field_mapping.json)
+import ticket_price_cache # Cache des prix de base des billets (table ticket_prices)
+import answers_cache # Cache persistant des réponses formulaire (table participant_answers_cache)
+import event_stats # Agrégats du tableau de bord (table event_stats)
+import data_versions # Versions des données par événement (ETag des pages participants)
+import export_snapshots # Exports CSV/XLSX précalculés après les écritures d'un événement
+import participant_writer # Écriture groupée + réconciliation par événement (une transaction)
+import sync_checkpoints # Progression en BDD : reprise, budget de temps, annulation (table sync_progress)
+from sync_report import SyncReport, save_sync_report
+from log_config import log_sampled, mask_email, redact_record, setup_logging # Journaux échantillonnés, sans données personnelles
 
 try:
-    # Fonction pour obtenir le token d'accès Weezevent
-    from weezevent_utils import get_access_token
+    # Fonction pour obtenir le token d'accès Weezevent + appel HTTP instrumenté
+    from weezevent_utils import get_access_token, weezevent_get, API_BASE_URL
 except ImportError:
     logging.critical("ERREUR CRITIQUE: Impossible d'importer 'get_access_token' depuis 'weezevent_utils.py'.")
     def get_access_token():
         logging.error("Fonction get_access_token non trouvée.")
         return None
+    def weezevent_get(url, endpoint, **kwargs):
+        return requests.get(url, **kwargs)
+    API_BASE_URL = "https://api.weezevent.com"
 
 load_dotenv()
 
@@ -24,209 +41,162 @@ API_KEY = os.getenv("WEEZEVENT_API_KEY")
 if not API_KEY:
      logging.critical("ERREUR CRITIQUE: WEEZEVENT_API_KEY n'est pas défini dans .env.")
 
+# /tickets : événements par appel (longueur d'URL bornée) et appels simultanés
+TICKETS_CHUNK_SIZE = int(os.getenv("TICKETS_CHUNK_SIZE", 20))
+TICKETS_PARALLEL = int(os.getenv("TICKETS_PARALLEL", 4))
+
 def get_participant_answers(access_token, participant_id):
     """Récupère les réponses au formulaire pour un participant donné."""
+    payload, _, _ = fetch_answers_payload(access_token, participant_id)
+    if payload is None:
+        return {}
+    answers_dict = parse_answers_payload(payload)
+    return answers_dict
+
+def fetch_answers_payload(access_token, participant_id, etag=None):
+    """
+    Télécharge le payload JSON brut des réponses d'un participant.
+    Avec `etag` (entrée du cache answers_cache), la requête est conditionnelle (If-None-Match).
+    Retourne (payload, etag, statut) ; statut : "ok", "not_modified" (304, payload None),
+    "not_found" (404, payload vide) ou "error" (payload None, ne pas mettre en cache).
+    """
     if not API_KEY:
         logging.error("API_KEY manquant pour get_participant_answers.")
-        return {}
+        return None, None, "error"
     if not access_token:
         logging.error(f"Access token manquant pour get_participant_answers (participant {participant_id}).")
-        return {}
+        return None, None, "error"
 
-    url = f"https://api.weezevent.com/participant/{participant_id}/answers?api_key={API_KEY}&access_token={access_token}"
-    logging.debug(f"Récupération réponses pour participant ID: {participant_id}")
+    url = f"{API_BASE_URL}/participant/{participant_id}/answers?api_key={API_KEY}&access_token={access_token}"
+    headers = {"If-None-Match": etag} if etag else None
     response = None
     try:
-        response = requests.get(url, timeout=15)
+        response = weezevent_get(url, "participant/answers", timeout=15, headers=headers)
+        if response.status_code == 304: # Inchangé depuis la mise en cache
+            return None, etag, "not_modified"
         if response.status_code == 404: # Pas une erreur, juste pas de réponse
-             logging.warning(f"Aucune réponse trouvée (404) pour participant {participant_id}.")
-             return {}
+             log_sampled("answers_not_found", logging.WARNING, "Aucune réponse trouvée (404) pour participant %s.", participant_id)
+             return {"answers": []}, None, "not_found"
         response.raise_for_status() # Lève une exception pour les autres erreurs HTTP
 
-        answers_data = response.json().get("answers", [])
-        answers_dict = {}
-        for ans in answers_data:
-            # Clé normalisée (minuscule, sans espaces) pour faciliter la recherche
-            label = str(ans.get("label", "")).strip().lower()
-            value = ans.get("value")
-            if label:
-                answers_dict[label] = value
-
-        logging.debug(f"Réponses pour {participant_id} traitées.")
-        return answers_dict
+        return response.json(), response.headers.get("ETag"), "ok"
     except requests.exceptions.Timeout:
         logging.error(f"Erreur connexion/requête (Timeout) réponses participant {participant_id}")
-        return {}
     except requests.exceptions.RequestException as e:
         status_code = response.status_code if response is not None else 'N/A'
         response_text = response.text if response is not None else 'N/A'
         logging.error(f"Erreur connexion/requête réponses participant {participant_id}: {e} (Status: {status_code})")
         logging.debug(f"Détails erreur requête réponses: Response={response_text[:500]}")
-        return {}
     except json.JSONDecodeError as e_json:
         response_text = response.text if response is not None else 'N/A'
         logging.error(f"Erreur décodage JSON réponse answers pour participant {participant_id}: {e_json}")
         logging.debug(f"Réponse brute non-JSON (answers): {response_text[:500]}")
-        return {}
     except Exception as e:
         logging.error(f"Erreur inattendue (réponses participant {participant_id}): {e}", exc_info=True)
-        return {}
+    return None, None, "error"
+
+def parse_answers_payload(payload):
+    """Convertit la réponse JSON de /participant/{id}/answers en dict {libellé normalisé: valeur}."""
+    answers_dict = {}
+    for ans in payload.get("answers", []):
+        # Clé normalisée (minuscule, sans espaces) pour faciliter la recherche
+        label = str(ans.get("label", "")).strip().lower()
+        value = ans.get("value")
+        if label:
+            answers_dict[label] = value
+    return answers_dict
+
+# Ligne 'inscriptions' prête à écrire : valeurs nettoyées/typées, dans l'ordre des colonnes de l'INSERT.
+# Construite une fois par participant (build_participant_record), passée telle quelle comme paramètres SQL.
+ParticipantRecord = namedtuple("ParticipantRecord", [
+    "nom", "prenom", "email", "telephone", "date_naissance", "adresse", "ville", "code_postal", "event_id",
+    "source_info", "financement_eligible", "rqth", "amenagements_necessaires", "amenagements_details",
+    "montant_paye", "nom_billet", "code_promo", "date_creation_inscription",
+])
+
+# Colonnes mises à jour si (email, event_id) existe déjà
+_UPDATED_COLUMNS = [c for c in ParticipantRecord._fields if c not in ("email", "event_id")]
+SQL_UPSERT_INSCRIPTION = (
+    f"INSERT INTO inscriptions ({', '.join(ParticipantRecord._fields)}) "
+    f"VALUES ({', '.join(['%s'] * len(ParticipantRecord._fields))}) "
+    f"ON DUPLICATE KEY UPDATE {', '.join(f'{c}=VALUES({c})' for c in _UPDATED_COLUMNS)}"
+)
+# Fusion de la table de transit (chemin masse de participant_writer) : mêmes règles que l'upsert
+SQL_MERGE_STAGING = (
+    f"INSERT INTO inscriptions ({', '.join(ParticipantRecord._fields)}) "
+    f"SELECT {', '.join(ParticipantRecord._fields)} FROM {participant_writer.STAGING_TABLE} "
+    f"ON DUPLICATE KEY UPDATE {', '.join(f'{c}=VALUES({c})' for c in _UPDATED_COLUMNS)}"
+)
+
+
+def _clean(value, max_length=None):
+    """Chaîne nettoyée (tronquée à max_length) ou None si vide."""
+    if not value:
+        return None
+    cleaned = str(value).strip()
+    return cleaned[:max_length] if max_length else cleaned
 
-def normalize_data(data, *keys):
-    """Recherche une valeur pour plusieurs clés possibles (insensible casse), retourne la première trouvée (str)."""
-    if not isinstance(data, dict):
-        return ""
-    for key_or_value in keys:
-        value_str = None
-        if isinstance(key_or_value, str):
-            search_key = key_or_value.lower().strip() # Recherche insensible à la casse
-            if search_key in data:
-                raw_value = data[search_key]
-                value_str = str(raw_value).strip() if raw_value is not None else ""
-                if value_str: return value_str
-        elif key_or_value is not None: # Si une valeur directe est passée en fallback
-            value_str = str(key_or_value).strip()
-            if value_str: return value_str
-    return "" # Retourne chaîne vide si rien n'est trouvé
-
-def parse_date(date_str):
-    """Tente de parser une date (DD/MM/YYYY, YYYY-MM-DD, DD-MM-YYYY). Retourne objet date ou None."""
-    if not date_str or not isinstance(date_str, str): return None
-    date_str_cleaned = date_str.strip()
-    if not date_str_cleaned: return None
-    for fmt in ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y"):
-        try:
-            # Retourne un objet date (sans heure)
-            return datetime.strptime(date_str_cleaned, fmt).date()
-        except ValueError:
-            continue
-    logging.warning(f"Format date non reconnu/invalide: '{date_str_cleaned}'")
-    return None
 
-def parse_datetime(datetime_str):
-    """Tente de parser date+heure (YYYY-MM-DD HH:MM:SS, YYYY-MM-DDTHH:MM:SS). Retourne objet datetime ou None."""
-    if not datetime_str or not isinstance(datetime_str, str): return None
-    datetime_str_cleaned = datetime_str.strip()
-    if not datetime_str_cleaned: return None
-    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S"): # Gère le 'T' séparateur
-        try:
-            return datetime.strptime(datetime_str_cleaned, fmt)
-        except ValueError:
-            continue
-    logging.warning(f"Format datetime non reconnu/invalide: '{datetime_str_cleaned}'")
-    return None
-
-def save_to_db(nom, prenom, email, telephone, date_naissance_str, adresse, ville, code_postal, event_id,
-               source_info, financement_eligible, rqth, amenagements_necessaires, amenagements_details,
-               montant_paye, nom_billet, code_promo, date_creation_inscription_str):
-    """Enregistre ou met à jour un participant dans la DB via ON DUPLICATE KEY UPDATE."""
+@metrics.timed("save_to_db")
+def save_to_db(record):
+    """
+    Enregistre ou met à jour un participant (ParticipantRecord) dans la DB via ON DUPLICATE KEY UPDATE.
+    Retourne le résultat de l'écriture : 'inserted', 'updated', 'unchanged' ou 'error'.
+    """
     conn = None
     cursor = None
-    logging.debug(f"save_to_db: Tentative sauvegarde pour {email} (Event: {event_id})")
-
-    # Nettoyage et validation des données
-    nom_cleaned = str(nom).strip()[:255] if nom else ""
-    prenom_cleaned = str(prenom).strip()[:255] if prenom else ""
-    email_cleaned = str(email).strip().lower()[:255] if email else ""
-    if not email_cleaned:
-         logging.error(f"save_to_db: Email manquant pour Nom='{nom_cleaned}', Prénom='{prenom_cleaned}'. Sauvegarde annulée.")
-         return # Email est requis (potentiellement partie de la clé unique)
-
-    telephone_cleaned = str(telephone).strip()[:20] if telephone else None
-    adresse_cleaned = str(adresse).strip() if adresse else None
-    ville_cleaned = str(ville).strip()[:100] if ville else None
-    code_postal_cleaned = str(code_postal).strip()[:10] if code_postal else None
-
-    date_naissance_obj = parse_date(date_naissance_str) # Peut être None
-    date_creation_obj = parse_datetime(date_creation_inscription_str) # Peut être None
-    logging.debug(f"  -> Dates parsées pour DB: Naissance={date_naissance_obj}, Création={date_creation_obj}")
-
-    source_info_cleaned = str(source_info).strip()[:255] if source_info else None
-    financement_eligible_cleaned = str(financement_eligible).strip()[:50] if financement_eligible else None
-    rqth_cleaned = str(rqth).strip()[:10] if rqth else None
-    amenagements_necessaires_cleaned = str(amenagements_necessaires).strip()[:10] if amenagements_necessaires else None
-    amenagements_details_cleaned = str(amenagements_details).strip() if amenagements_details else None
-    nom_billet_cleaned = str(nom_billet).strip()[:255] if nom_billet else None
-    code_promo_cleaned = str(code_promo).strip()[:100] if code_promo else None
-
-    # Conversion et validation montant payé en Decimal
-    montant_paye_decimal = None
-    if montant_paye is not None:
-        try:
-            # Gère les virgules (français) et les espaces comme séparateur décimal
-            montant_paye_str_norm = str(montant_paye).replace(',', '.').strip()
-            if montant_paye_str_norm: # Vérifie si chaîne non vide après nettoyage
-                 montant_paye_decimal = decimal.Decimal(montant_paye_str_norm)
-        except (ValueError, TypeError, decimal.InvalidOperation) as e:
-             logging.warning(f"  -> Impossible de convertir montant payé '{montant_paye}' en Decimal pour {email_cleaned}: {e}. Sera NULL.")
-             # montant_paye_decimal reste None
-
-    logging.debug(f"  -> Montant payé pour DB: {montant_paye_decimal}")
-
-    # Requête SQL - Assurez-vous que la clé unique est bien (email, event_id) ou équivalent
-    sql = """
-       INSERT INTO inscriptions (
-           nom, prenom, email, telephone, date_naissance, adresse, ville, code_postal, event_id,
-           source_info, financement_eligible, rqth, amenagements_necessaires, amenagements_details,
-           montant_paye, nom_billet, code_promo, date_creation_inscription
-       ) VALUES (
-           %(nom)s, %(prenom)s, %(email)s, %(telephone)s, %(date_naissance)s, %(adresse)s, %(ville)s, %(code_postal)s, %(event_id)s,
-           %(source_info)s, %(financement_eligible)s, %(rqth)s, %(amenagements_necessaires)s, %(amenagements_details)s,
-           %(montant_paye)s, %(nom_billet)s, %(code_promo)s, %(date_creation)s
-       ) ON DUPLICATE KEY UPDATE
-           nom=VALUES(nom), prenom=VALUES(prenom), telephone=VALUES(telephone), date_naissance=VALUES(date_naissance),
-           adresse=VALUES(adresse), ville=VALUES(ville), code_postal=VALUES(code_postal), source_info=VALUES(source_info),
-           financement_eligible=VALUES(financement_eligible), rqth=VALUES(rqth),
-           amenagements_necessaires=VALUES(amenagements_necessaires), amenagements_details=VALUES(amenagements_details),
-           montant_paye=VALUES(montant_paye), nom_billet=VALUES(nom_billet), code_promo=VALUES(code_promo),
-           date_creation_inscription=VALUES(date_creation_inscription);
-       """
-    params = {
-        'nom': nom_cleaned, 'prenom': prenom_cleaned, 'email': email_cleaned, 'telephone': telephone_cleaned,
-        'date_naissance': date_naissance_obj, 'adresse': adresse_cleaned, 'ville': ville_cleaned, 'code_postal': code_postal_cleaned,
-        'event_id': int(event_id), 'source_info': source_info_cleaned, 'financement_eligible': financement_eligible_cleaned, 'rqth': rqth_cleaned,
-        'amenagements_necessaires': amenagements_necessaires_cleaned, 'amenagements_details': amenagements_details_cleaned,
-        'montant_paye': montant_paye_decimal, 'nom_billet': nom_billet_cleaned, 'code_promo': code_promo_cleaned,
-        'date_creation': date_creation_obj
-    }
-
     try:
         conn = get_connection() # Depuis le pool
         if not conn:
-            logging.error(f"save_to_db: Impossible d'obtenir une connexion DB pour {email_cleaned}")
-            return
+            logging.error(f"save_to_db: Impossible d'obtenir une connexion DB pour {mask_email(record.email)}")
+            metrics.record_error("save_to_db")
+            return "error"
         cursor = conn.cursor()
-        cursor.execute(sql, params)
+        cursor.execute(SQL_UPSERT_INSCRIPTION, record)
         conn.commit()
         affected_rows = cursor.rowcount
         # rowcount: 1=INSERT, 2=UPDATE, 0=Aucun changement (MySQL)
-        if affected_rows == 1: logging.info(f"DB OK: Participant {email_cleaned} (Event: {event_id}) inséré.")
-        elif affected_rows == 2: logging.info(f"DB OK: Participant {email_cleaned} (Event: {event_id}) mis à jour.")
-        elif affected_rows == 0: logging.info(f"DB OK: Participant {email_cleaned} (Event: {event_id}) déjà à jour.")
-        else: logging.warning(f"DB: Rowcount inattendu ({affected_rows}) pour {email_cleaned} (Event: {event_id}).")
+        if affected_rows == 1:
+            log_sampled("save_to_db_inserted", logging.DEBUG, "DB OK: Participant %s (Event: %s) inséré.",
+                        mask_email(record.email), record.event_id)
+            return "inserted"
+        elif affected_rows == 2:
+            log_sampled("save_to_db_updated", logging.DEBUG, "DB OK: Participant %s (Event: %s) mis à jour.",
+                        mask_email(record.email), record.event_id)
+            return "updated"
+        elif affected_rows == 0:
+            log_sampled("save_to_db_unchanged", logging.DEBUG, "DB OK: Participant %s (Event: %s) déjà à jour.",
+                        mask_email(record.email), record.event_id)
+            return "unchanged"
+        logging.warning(f"DB: Rowcount inattendu ({affected_rows}) pour {mask_email(record.email)} (Event: {record.event_id}).")
+        return "error"
     except mysql.connector.Error as db_err:
-         logging.error(f"Erreur DB sauvegarde {email_cleaned} (Event: {event_id}): {db_err}", exc_info=True)
-         # Log SQL et Params pour debug en cas d'erreur
-         try: debug_sql = cursor.statement if cursor else sql; logging.error(f"   -> SQL Échoué (approx): {debug_sql}")
-         except Exception as log_e: logging.error(f"   -> Erreur formatage SQL debug: {log_e}")
-         logging.error(f"   -> Params Échoués: {params}")
+         # Paramètres sans données personnelles (cursor.statement contiendrait les valeurs)
+         logging.error(f"Erreur DB sauvegarde {mask_email(record.email)} (Event: {record.event_id}): {db_err}",
+                       exc_info=True, extra={"params": redact_record(record)})
+         metrics.record_error("save_to_db")
          if conn:
              try: conn.rollback()
              except Exception as rb_err: logging.error(f"  -> Erreur rollback: {rb_err}")
+         return "error"
     except Exception as e:
-        logging.error(f"Erreur non-DB sauvegarde {email_cleaned} (Event: {event_id}): {e}", exc_info=True)
+        logging.error(f"Erreur non-DB sauvegarde {mask_email(record.email)} (Event: {record.event_id}): {e}", exc_info=True)
+        metrics.record_error("save_to_db")
         if conn:
             try: conn.rollback()
             except Exception as rb_err: logging.error(f"  -> Erreur rollback: {rb_err}")
+        return "error"
     finally:
         if cursor: cursor.close()
         if conn: conn.close() # Remet la connexion dans le pool
 
 
+@metrics.timed("get_active_event_ids")
 def get_active_event_ids():
     """
     Récupère IDs des événements depuis BDD: actifs (non-annulés) ET futurs/sans date.
-    Utilisés pour filtrer les participants à synchroniser.
+    Utilisés pour filtrer les participants à synchroniser. Les plus proches d'abord (sans date en
+    dernier) : une synchro arrêtée en cours (budget, annulation) a traité les plus urgents.
     """
     conn = None
     cursor = None
@@ -237,6 +207,7 @@ def get_active_event_ids():
         conn = get_connection()
         if not conn:
             logging.error("get_active_event_ids: Connexion DB échouée depuis le pool.")
+            metrics.record_error("get_active_event_ids")
             return []
 
         cursor = conn.cursor()
@@ -245,6 +216,7 @@ def get_active_event_ids():
         sql_get_ids = """
             SELECT event_id FROM evenements
             WHERE actif = 1 AND (date IS NULL OR date >= CURDATE())
+            ORDER BY date IS NULL, date, event_id
         """
         cursor.execute(sql_get_ids)
         results = cursor.fetchall()
@@ -260,92 +232,296 @@ def get_active_event_ids():
 
     except mysql.connector.Error as db_err:
         logging.error(f"Erreur DB récupération event_ids actifs/futurs: {db_err}", exc_info=True)
+        metrics.record_error("get_active_event_ids")
         return []
     except Exception as e:
         logging.error(f"Erreur inattendue récupération event_ids actifs/futurs: {e}", exc_info=True)
+        metrics.record_error("get_active_event_ids")
         return []
     finally:
         if cursor: cursor.close()
         if conn: conn.close()
 
 
-def get_ticket_prices(access_token, event_ids):
-    """Récupère les prix de base des billets pour une liste d'event_ids (pour fallback)."""
-    if not API_KEY:
-        logging.error("API_KEY manquant pour get_ticket_prices.")
-        return {}
-    if not access_token:
-        logging.error("Access token manquant pour get_ticket_prices.")
-        return {}
-    if not event_ids:
-        logging.warning("get_ticket_prices: Aucun event_id fourni.")
-        return {}
+def participant_email(p_data):
+    """Email normalisé (clé de 'inscriptions' avec event_id) d'un participant API, '' si absent."""
+    owner_data = p_data.get("owner")
+    if not isinstance(owner_data, dict): owner_data = {}
+    return str(owner_data.get("email") or p_data.get("email") or "").strip().lower()[:255]
+
 
-    ticket_prices = {}
-    # Construit paramètre id_event[]=... pour l'URL
+def event_api_emails(participants_api_data):
+    """
+    Emails de tous les participants renvoyés par l'API pour un événement (réconciliation).
+    None si une entrée n'est pas exploitable : sans liste fiable, rien n'est supprimé.
+    """
+    if not all(isinstance(p_data, dict) for p_data in participants_api_data):
+        return None
+    return {email for email in map(participant_email, participants_api_data) if email}
+
+
+def save_event_participants(event_id, records, api_emails=None, snapshot_at=None):
+    """
+    Écrit les participants de l'événement en une transaction et supprime ceux absents de l'API
+    (sauf ceux notifiés par webhook depuis `snapshot_at`, début de l'appel participant/list).
+    """
+    return participant_writer.write_event_participants(event_id, records, SQL_UPSERT_INSCRIPTION, save_to_db,
+                                                       api_emails=api_emails, merge_sql=SQL_MERGE_STAGING,
+                                                       snapshot_at=snapshot_at)
+
+
+def build_participant_record(p_data, fields, event_id, ticket_prices):
+    """
+    Transforme les données API d'un participant (p_data + colonnes résolues par
+    field_mapping.resolve_answers) en ParticipantRecord prêt pour save_to_db.
+    Retourne None si l'email est manquant (participant ignoré).
+    Partagé par le moteur synchrone (get_registrations) et le moteur asyncio (weezevent_async).
+    """
+    # Extraction des données participant
+    owner_data = p_data.get("owner", {})
+    if not isinstance(owner_data, dict): owner_data = {}
+
+    nom = owner_data.get("last_name", p_data.get("last_name", ""))
+    prenom = owner_data.get("first_name", p_data.get("first_name", ""))
+    email = participant_email(p_data)
+    if not email:
+        return None # Email requis
+
+    # Colonnes issues du formulaire (correspondance compilée depuis field_mapping.json)
+    telephone = fields.get("telephone", "")
+    date_naissance_str = fields.get("date_naissance", "")
+    adresse = fields.get("adresse", "")
+    ville = fields.get("ville", "")
+    code_postal = fields.get("code_postal", "")
+    source_info = fields.get("source_info", "")
+    financement_eligible = fields.get("financement_eligible", "")
+    rqth = fields.get("rqth", "")
+
+    # Logique pour les aménagements (Oui/Non + Détails)
+    valeur_amenagement_combine = fields.get("amenagements", "")
+    amenagements_necessaires = None
+    amenagements_details = None
+    if valeur_amenagement_combine:
+        if valeur_amenagement_combine.lower().strip() in ["non", "no", "0", "false", "aucun"]:
+            amenagements_necessaires = "Non"
+        else:
+            amenagements_necessaires = "Oui"
+            amenagements_details = valeur_amenagement_combine # La valeur est le détail
+
+    # Données directes depuis p_data
+    code_promo = p_data.get("promo_code", "")
+    date_creation_inscription_str = p_data.get("create_date", "") # Ex: 'YYYY-MM-DD HH:MM:SS'
+    id_ticket_str = str(p_data.get("id_ticket", ""))
+    nom_billet = p_data.get("ticket_name", id_ticket_str if id_ticket_str else "N/A")
+
+    # --- Logique Montant Payé ---
+    montant_a_sauvegarder = None
+    # !!! ACTION REQUISE !!!
+    # Vérifiez le nom exact du champ contenant le PRIX FINAL PAYÉ dans vos données p_data.
+    CHAMP_PRIX_FINAL_API = "PRICE_FIELD_NOT_FOUND_IN_LOGS" # Placeholder - À METTRE À JOUR !
+
+    if CHAMP_PRIX_FINAL_API != "PRICE_FIELD_NOT_FOUND_IN_LOGS" and CHAMP_PRIX_FINAL_API in p_data:
+        montant_final_api = p_data.get(CHAMP_PRIX_FINAL_API)
+        if montant_final_api is not None:
+            montant_a_sauvegarder = montant_final_api
+    # Fallback sur le prix de base si le prix final n'est pas trouvé/utilisé
+    if montant_a_sauvegarder is None:
+        if id_ticket_str and id_ticket_str in ticket_prices:
+            prix_base = ticket_prices[id_ticket_str]
+            if prix_base is not None:
+                montant_a_sauvegarder = prix_base
+            else: log_sampled("price_none", logging.WARNING, "Prix base trouvé pour ticket %s mais valeur None. Montant sera NULL.", id_ticket_str)
+        elif id_ticket_str: log_sampled("price_missing", logging.WARNING, "Prix base non trouvé pour ticket %s. Montant sera NULL.", id_ticket_str)
+        else: log_sampled("ticket_missing", logging.WARNING, "id_ticket manquant (participant %s). Montant sera NULL.", p_data.get("id_participant"))
+    # --- Fin Logique Montant Payé ---
+
+    # Nettoyage et typage (une seule fois par participant)
+    return ParticipantRecord(
+        nom=str(nom).strip()[:255] if nom else "",
+        prenom=str(prenom).strip()[:255] if prenom else "",
+        email=email[:255],
+        telephone=_clean(telephone, 20),
+        date_naissance=parse_date(date_naissance_str), # Peut être None
+        adresse=_clean(adresse),
+        ville=_clean(ville, 100),
+        code_postal=_clean(code_postal, 10),
+        event_id=int(event_id),
+        source_info=_clean(source_info, 255),
+        financement_eligible=_clean(financement_eligible, 50),
+        rqth=_clean(rqth, 10),
+        amenagements_necessaires=_clean(amenagements_necessaires, 10),
+        amenagements_details=_clean(amenagements_details),
+        montant_paye=parse_amount(montant_a_sauvegarder), # Virgule française acceptée, None si invalide
+        nom_billet=_clean(nom_billet, 255),
+        code_promo=_clean(code_promo, 100),
+        date_creation_inscription=parse_datetime(date_creation_inscription_str), # Peut être None
+    )
+
+
+def participant_record(access_token, event_id, participant_num, p_data, answers_cached, answers_to_cache,
+                       ticket_prices, report):
+    """
+    Réponses formulaire (cache answers_cache ou API) + correspondance des champs + ligne
+    ParticipantRecord d'un participant API. Retourne None si l'email manque.
+    `answers_to_cache` reçoit les réponses à enregistrer (answers_cache.store_event_answers).
+    Partagé par la synchro complète et le traitement des webhooks (webhook_queue).
+    """
+    participant_id = p_data.get("id_participant")
+    cached = answers_cached.get(str(participant_id))
+    validator = answers_cache.participant_validator(p_data)
+    if answers_cache.is_fresh(cached, validator):
+        payload = cached.payload
+        report.add(event_id, "answers_cached")
+    else:
+        call_start = time.perf_counter()
+        payload, etag, fetch_status = fetch_answers_payload(access_token, participant_id,
+                                                            etag=cached.etag if cached else None)
+        report.add_api_time(event_id, time.perf_counter() - call_start)
+        report.add(event_id, "answers_calls")
+        if fetch_status == "not_modified":
+            payload = cached.payload
+        elif fetch_status == "error" and cached:
+            # Échec API transitoire : dernières réponses connues plutôt que des champs vidés en base
+            log_sampled("answers_stale_fallback", logging.WARNING, "Réponses P %s (Event %s) : échec API, cache utilisé.",
+                        participant_id, event_id)
+            payload = cached.payload
+        if fetch_status != "error":
+            answers_to_cache.append((participant_id, payload, validator, etag))
+    fields, unmatched = field_mapping.resolve_answers(payload, event_id, p_data)
+    if unmatched:
+        report.add_unmatched_labels(unmatched)
+
+    record = build_participant_record(p_data, fields, event_id, ticket_prices)
+    if record is None:
+        log_sampled("participant_no_email", logging.WARNING, "P %s (ID: %s, Event: %s) ignoré: Email manquant.",
+                    participant_num, participant_id, event_id)
+    return record
+
+
+def publish_event_changes(event_id):
+    """Après écriture des participants d'un événement : nouvelle version (ETag) et export régénéré."""
+    data_versions.bump_events([event_id]) # Invalide les ETag des pages/exports de l'événement
+    export_snapshots.write_snapshots(event_id) # Export prêt à servir pour la nouvelle version
+
+
+def _extract_tickets(items_list):
+    """Extrait récursivement {ticket_id: prix de base} des événements et catégories."""
+    prices = {}
+    if not isinstance(items_list, list): return prices
+    for item in items_list:
+        if not isinstance(item, dict): continue
+        # Tickets directs dans l'item
+        if "tickets" in item and isinstance(item["tickets"], list):
+            for ticket in item["tickets"]:
+                if isinstance(ticket, dict):
+                    ticket_id = ticket.get("id")
+                    ticket_price = ticket.get("price") # Prix de base
+                    if ticket_id is not None:
+                        prices[str(ticket_id)] = ticket_price # ID comme chaîne
+        # Appel récursif pour sous-catégories
+        if "categories" in item and isinstance(item["categories"], list):
+            prices.update(_extract_tickets(item["categories"]))
+    return prices
+
+def extract_event_ticket_prices(data):
+    """Convertit la réponse JSON de /tickets en {event_id: {ticket_id (str): prix de base}}."""
+    if isinstance(data, dict) and "events" in data and isinstance(data["events"], list):
+        items = data["events"]
+    elif isinstance(data, list): # Si la réponse est directement une liste
+        items = data
+    else:
+        logging.warning(f"Structure inattendue réponse API /tickets: Clés = {list(data.keys()) if isinstance(data, dict) else type(data)}")
+        return {}
+    prices_by_event = {}
+    for item in items:
+        if not isinstance(item, dict): continue
+        event_id = item.get("id")
+        event_id = int(event_id) if str(event_id).isdigit() else None # None : non mis en cache
+        prices_by_event.setdefault(event_id, {}).update(_extract_tickets([item]))
+    return prices_by_event
+
+def _fetch_ticket_prices_chunk(access_token, event_ids):
+    """Appel /tickets pour une tranche d'événements. Retourne {event_id: {ticket_id: prix}} ou None si échec."""
+    # Construit paramètre id_event[]=... pour l'URL (tranche bornée : URL de longueur limitée)
     id_param = "&".join([f"id_event[]={eid}" for eid in event_ids])
-    url = f"https://api.weezevent.com/tickets?api_key={API_KEY}&access_token={access_token}&{id_param}"
-    logging.info(f"Récupération prix de base billets pour {len(event_ids)} événements...")
+    url = f"{API_BASE_URL}/tickets?api_key={API_KEY}&access_token={access_token}&{id_param}"
     logging.debug(f"Appel API tickets: {url}")
     response = None
-
     try:
-        response = requests.get(url, timeout=20) # Timeout un peu plus long
+        response = weezevent_get(url, "tickets", timeout=20) # Timeout un peu plus long
         response.raise_for_status()
-        data = response.json()
-
-        # Fonction récursive pour extraire les tickets des événements et catégories
-        def extract_tickets(items_list):
-            prices = {}
-            if not isinstance(items_list, list): return prices
-            for item in items_list:
-                if not isinstance(item, dict): continue
-                # Tickets directs dans l'item
-                if "tickets" in item and isinstance(item["tickets"], list):
-                    for ticket in item["tickets"]:
-                        if isinstance(ticket, dict):
-                            ticket_id = ticket.get("id")
-                            ticket_price = ticket.get("price") # Prix de base
-                            if ticket_id is not None:
-                                prices[str(ticket_id)] = ticket_price # ID comme chaîne
-                # Appel récursif pour sous-catégories
-                if "categories" in item and isinstance(item["categories"], list):
-                    prices.update(extract_tickets(item["categories"]))
-            return prices
-
-        found_prices = {}
-        if "events" in data and isinstance(data["events"], list):
-             found_prices = extract_tickets(data["events"])
-        elif isinstance(data, list): # Si la réponse est directement une liste
-             found_prices = extract_tickets(data)
-        else:
-             logging.warning(f"Structure inattendue réponse API /tickets: Clés = {list(data.keys())}")
-
-        ticket_prices.update(found_prices)
-        logging.info(f"Récupéré {len(ticket_prices)} définitions de prix de base de billets.")
-        logging.debug(f"Prix de base billets (ID -> Prix Base): {ticket_prices}")
-        return ticket_prices
-
+        prices_by_event = extract_event_ticket_prices(response.json())
+        for event_id in event_ids: # Événement sans billet : chargé quand même (pas de rappel avant le TTL)
+            prices_by_event.setdefault(int(event_id), {})
+        return prices_by_event
     except requests.exceptions.Timeout:
         logging.error(f"Erreur requête API /tickets: Timeout.")
-        return {}
     except requests.exceptions.RequestException as e:
         status_code = response.status_code if response is not None else 'N/A'
         response_text = response.text if response is not None else 'N/A'
         logging.error(f"Erreur requête API /tickets: {e} (Status: {status_code})")
         logging.debug(f"Détails erreur API tickets: Response={response_text[:500]}")
-        return {}
     except json.JSONDecodeError as e_json:
         response_text = response.text if response is not None else 'N/A'
         logging.error(f"Erreur décodage JSON réponse /tickets: {e_json}")
         logging.debug(f"Réponse brute non-JSON (/tickets): {response_text[:500]}")
-        return {}
     except Exception as e:
         logging.error(f"Erreur inattendue récupération prix billets: {e}", exc_info=True)
+    return None
+
+def get_ticket_prices(access_token, event_ids):
+    """
+    Prix de base des billets {ticket_id (str): prix} pour une liste d'event_ids (pour fallback).
+    Lus depuis le cache 'ticket_prices' ; seuls les événements périmés sont rechargés depuis l'API,
+    par tranches de TICKETS_CHUNK_SIZE événements appelées en parallèle.
+    """
+    if not API_KEY:
+        logging.error("API_KEY manquant pour get_ticket_prices.")
+        return {}
+    if not access_token:
+        logging.error("Access token manquant pour get_ticket_prices.")
         return {}
+    if not event_ids:
+        logging.warning("get_ticket_prices: Aucun event_id fourni.")
+        return {}
+
+    ticket_prices, fresh_event_ids = ticket_price_cache.load_prices(event_ids)
+    stale_event_ids = [eid for eid in event_ids if int(eid) not in fresh_event_ids]
+    logging.info(f"Prix de base billets: {len(event_ids) - len(stale_event_ids)} événements en cache, "
+                 f"{len(stale_event_ids)} à recharger.")
+    if stale_event_ids:
+        chunks = ticket_price_cache.chunked(stale_event_ids, TICKETS_CHUNK_SIZE)
+        with ThreadPoolExecutor(max_workers=min(TICKETS_PARALLEL, len(chunks))) as executor:
+            results = list(executor.map(lambda chunk: _fetch_ticket_prices_chunk(access_token, chunk), chunks))
+        fetched = {}
+        for result in results:
+            if result: fetched.update(result) # Tranche en échec : prix en cache (périmés) conservés
+        ticket_price_cache.store_prices(fetched)
+        for prices in fetched.values():
+            ticket_prices.update(prices)
+    logging.info(f"{len(ticket_prices)} définitions de prix de base de billets disponibles.")
+    return ticket_prices
+
+def get_registrations(report=None, budget_seconds=None):
+    """
+    Fonction principale: récupère et traite inscriptions des événements actifs ET futurs/sans date.
+    `report` (SyncReport) est alimenté pendant la synchro. Sans rapport fourni, un rapport est
+    créé puis enregistré dans 'sync_runs' en fin d'exécution. `budget_seconds` : durée maximale
+    (défaut SYNC_TIME_BUDGET_SECONDS), la suite étant reprise par la synchro suivante.
+    """
+    own_report = report is None
+    if own_report:
+        report = SyncReport()
+    try:
+        _sync_registrations(report, budget_seconds)
+    finally:
+        if own_report:
+            report.finish()
+            save_sync_report(report)
+    return report
 
-def get_registrations():
-    """Fonction principale: récupère et traite inscriptions des événements actifs ET futurs/sans date."""
+
+def _sync_registrations(report, budget_seconds=None):
     logging.info("="*20 + " DÉBUT SYNCHRO PARTICIPANTS " + "="*20)
 
     # Récupère IDs des événements pertinents depuis la BDD
@@ -353,22 +529,39 @@ def get_registrations():
     if not event_ids:
         logging.info("Aucun événement actif et futur/sans date trouvé pour la synchronisation. Arrêt.")
         logging.info("="*20 + " FIN SYNCHRO (Aucun Event Pertinent) " + "="*20)
+        report.mark("aucun_evenement", "Aucun événement actif et futur/sans date.")
         return
 
     access_token = get_access_token()
     if not access_token:
         logging.error("Impossible de continuer sans token d'accès.")
         logging.info("="*20 + " FIN SYNCHRO (Erreur Token) " + "="*20)
+        report.mark("erreur_token", "Token d'accès Weezevent non obtenu.")
         return
 
     if not API_KEY: # Vérification redondante mais sûre
          logging.error("API_KEY manquant. Impossible de continuer.")
          logging.info("="*20 + " FIN SYNCHRO (Erreur API_KEY) " + "="*20)
+         report.mark("erreur_config", "WEEZEVENT_API_KEY manquant.")
          return
 
+    # Progression en BDD : reprise d'une synchro interrompue (événements déjà écrits sautés), budget, annulation
+    progress, busy_message = sync_checkpoints.start_progress(event_ids, budget_seconds)
+    if progress is None:
+        logging.warning(busy_message)
+        logging.info("="*20 + " FIN SYNCHRO (Déjà en cours) " + "="*20)
+        report.mark("deja_en_cours", busy_message)
+        return
+    if progress.resumed_at:
+        report.message = f"Reprise de la synchro du {progress.resumed_at:%d/%m/%Y %H:%M}."
+    all_event_ids = event_ids
+    event_ids = progress.pending(event_ids)
+
     # Récupère les prix de base (pour fallback si prix final non trouvé)
     logging.info("Récupération prix de base des billets (fallback)...")
+    phase_start = time.perf_counter()
     all_ticket_prices = get_ticket_prices(access_token, event_ids)
+    report.set_phase_time("ticket_prices", time.perf_counter() - phase_start)
     if not all_ticket_prices:
          logging.warning("Aucun prix de base de billet récupéré. Fallback de prix impossible.")
     else:
@@ -377,167 +570,152 @@ def get_registrations():
     total_participants_api = 0
     total_participants_processed = 0
 
-    # Boucle sur les événements pertinents
-    for event_id in event_ids:
-        logging.info(f"--- Traitement Événement ID: {event_id} ---")
-        url_participants = (f"https://api.weezevent.com/participant/list?"
-                            f"api_key={API_KEY}&access_token={access_token}&id_event[]={event_id}&full=1")
-        logging.debug(f"Appel API participants: {url_participants}")
-        response = None
-
-        try:
-            response = requests.get(url_participants, timeout=45) # Timeout plus long
-            response.raise_for_status()
-            data = response.json()
-
-            if "participants" not in data:
-                 logging.error(f"Clé 'participants' manquante dans réponse API pour event {event_id}.")
-                 logging.debug(f"Réponse API brute: {str(data)[:1000]}")
-                 continue # Événement suivant
-
-            participants_api_data = data.get("participants", [])
-            count_api_event = len(participants_api_data)
-            total_participants_api += count_api_event
-            logging.info(f"API a retourné {count_api_event} participants pour l'événement {event_id}.")
-
-            if not participants_api_data:
-                logging.info(f"Aucun participant pour l'événement {event_id}. Passage au suivant.")
-                continue
-
-            processed_in_event = 0
-            # Boucle sur les participants de cet événement
-            for index, p_data in enumerate(participants_api_data):
-                participant_num = index + 1
-                logging.debug(f"\nTraitement P {participant_num}/{count_api_event} (Event {event_id})...")
-
-                if not isinstance(p_data, dict):
-                    logging.warning(f"P {participant_num} ignoré (Event {event_id}): Donnée non valide.")
-                    continue
-
-                participant_id = p_data.get("id_participant")
-                if not participant_id:
-                    owner_data_log = p_data.get("owner", {})
-                    email_log = str(owner_data_log.get("email") or p_data.get("email") or "N/A").strip().lower()
-                    logging.warning(f"P {participant_num} ignoré (Event {event_id}): ID Participant Manquant. Email: {email_log}.")
+    completed = False
+    try:
+        # Boucle sur les événements pertinents
+        for event_id in event_ids:
+            if progress.should_stop(): # Budget atteint ou annulation demandée : les suivants seront repris
+                break
+            logging.info(f"--- Traitement Événement ID: {event_id} ---")
+            url_participants = (f"{API_BASE_URL}/participant/list?"
+                                f"api_key={API_KEY}&access_token={access_token}&id_event[]={event_id}&full=1")
+            logging.debug(f"Appel API participants: {url_participants}")
+            response = None
+            report.event(event_id) # L'événement apparaît dans le rapport même sans participant
+
+            try:
+                call_start = time.perf_counter()
+                list_started_at = datetime.now() # Webhooks reçus après : épargnés par la réconciliation
+                response = weezevent_get(url_participants, "participant/list", timeout=45) # Timeout plus long
+                response.raise_for_status()
+                data = response.json()
+                report.add_api_time(event_id, time.perf_counter() - call_start)
+
+                if "participants" not in data:
+                     logging.error(f"Clé 'participants' manquante dans réponse API pour event {event_id}.")
+                     logging.debug(f"Réponse API brute: {str(data)[:1000]}")
+                     continue # Événement suivant
+
+                participants_api_data = data.get("participants", [])
+                count_api_event = len(participants_api_data)
+                total_participants_api += count_api_event
+                report.add(event_id, "participants", count_api_event)
+                logging.info(f"API a retourné {count_api_event} participants pour l'événement {event_id}.")
+
+                if not participants_api_data:
+                    logging.info(f"Aucun participant pour l'événement {event_id}. Passage au suivant.")
+                    progress.event_done(event_id, 0)
                     continue
 
-                logging.debug(f"  Participant ID: {participant_id}")
-
-                answers = get_participant_answers(access_token, participant_id)
-
-                # Extraction des données participant
-                owner_data = p_data.get("owner", {})
-                if not isinstance(owner_data, dict): owner_data = {}
-
-                nom = owner_data.get("last_name", p_data.get("last_name", ""))
-                prenom = owner_data.get("first_name", p_data.get("first_name", ""))
-                email = str(owner_data.get("email") or p_data.get("email") or "").strip().lower()
-                if not email:
-                    logging.warning(f"P {participant_num} (ID: {participant_id}, Event: {event_id}) ignoré: Email manquant.")
-                    continue # Email requis
-
-                telephone = normalize_data(answers, "telephone", "portable", owner_data.get("phone"), p_data.get("phone"))
-                date_naissance_str = normalize_data(answers, "date de naissance", "date_de_naissance", owner_data.get("birthdate"), p_data.get("birthdate"))
-                adresse = normalize_data(answers, "adresse", owner_data.get("address"), p_data.get("address"))
-                ville = normalize_data(answers, "ville", owner_data.get("city"), p_data.get("city"))
-                code_postal = normalize_data(answers, "code postal", "code_postal", owner_data.get("zipcode"), p_data.get("zipcode"))
-
-                # Champs spécifiques formulaire (adapter les libellés exacts si besoin)
-                libelle_exact_source = "comment avez-vous entendu parler de la compagnie maritime ? (bouche à oreille, site, presse, réseaux sociaux, autres à préciser)."
-                libelle_exact_financement = "êtes-vous éligible à un financement pour cette formation ?"
-                libelle_exact_rqth = "bénéficiez-vous d'une rqth ?"
-                libelle_exact_amenagement_combine = "avez-vous besoin d'aménagements nécessaires pour facilité l'accès à la formation ? si oui, précisez"
-
-                source_info = normalize_data(answers, libelle_exact_source)
-                financement_eligible = normalize_data(answers, libelle_exact_financement)
-                rqth = normalize_data(answers, libelle_exact_rqth)
-
-                # Logique pour les aménagements (Oui/Non + Détails)
-                valeur_amenagement_combine = normalize_data(answers, libelle_exact_amenagement_combine)
-                amenagements_necessaires = None
-                amenagements_details = None
-                if valeur_amenagement_combine:
-                    if valeur_amenagement_combine.lower().strip() in ["non", "no", "0", "false", "aucun"]:
-                        amenagements_necessaires = "Non"
-                    else:
-                        amenagements_necessaires = "Oui"
-                        amenagements_details = valeur_amenagement_combine # La valeur est le détail
-
-                # Données directes depuis p_data
-                code_promo = p_data.get("promo_code", "")
-                date_creation_inscription_str = p_data.get("create_date", "") # Ex: 'YYYY-MM-DD HH:MM:SS'
-                id_ticket_str = str(p_data.get("id_ticket", ""))
-                nom_billet = p_data.get("ticket_name", id_ticket_str if id_ticket_str else "N/A")
-
-                # --- Logique Montant Payé ---
-                montant_a_sauvegarder = None
-                # !!! ACTION REQUISE !!!
-                # Vérifiez le nom exact du champ contenant le PRIX FINAL PAYÉ dans vos données p_data.
-                CHAMP_PRIX_FINAL_API = "PRICE_FIELD_NOT_FOUND_IN_LOGS" # Placeholder - À METTRE À JOUR !
-
-                if CHAMP_PRIX_FINAL_API != "PRICE_FIELD_NOT_FOUND_IN_LOGS" and CHAMP_PRIX_FINAL_API in p_data:
-                    montant_final_api = p_data.get(CHAMP_PRIX_FINAL_API)
-                    if montant_final_api is not None:
-                        montant_a_sauvegarder = montant_final_api
-                        logging.debug(f"  -> Utilisé montant payé '{montant_a_sauvegarder}' via clé API '{CHAMP_PRIX_FINAL_API}'.")
-                # Fallback sur le prix de base si le prix final n'est pas trouvé/utilisé
-                if montant_a_sauvegarder is None:
-                    logging.debug("  -> Montant final non trouvé/utilisé. Tentative fallback PRIX DE BASE.")
-                    if id_ticket_str and id_ticket_str in all_ticket_prices:
-                        prix_base = all_ticket_prices[id_ticket_str]
-                        if prix_base is not None:
-                            montant_a_sauvegarder = prix_base
-                            logging.debug(f"  -> Utilisation PRIX DE BASE '{montant_a_sauvegarder}' pour ticket ID {id_ticket_str}.")
-                        else: logging.warning(f"  -> Prix base trouvé pour ticket {id_ticket_str} mais valeur None. Montant sera NULL.")
-                    elif id_ticket_str: logging.warning(f"  -> Prix base non trouvé pour ticket {id_ticket_str}. Montant sera NULL.")
-                    else: logging.warning(f"  -> id_ticket manquant. Montant sera NULL.")
-                # --- Fin Logique Montant Payé ---
-
-                # Sauvegarde en base de données
-                save_to_db(
-                    nom, prenom, email, telephone, date_naissance_str, adresse, ville, code_postal, event_id,
-                    source_info, financement_eligible, rqth,
-                    amenagements_necessaires, amenagements_details,
-                    montant_a_sauvegarder, # Peut être None
-                    nom_billet, code_promo, date_creation_inscription_str
-                )
-                processed_in_event += 1
-                total_participants_processed += 1
-            # Fin boucle participants
-            logging.info(f"{processed_in_event} participants traités pour l'événement {event_id}.")
-
-        # Gestion des erreurs pour la boucle d'un événement
-        except requests.exceptions.Timeout:
-            logging.error(f"Erreur Timeout requête participant/list Event {event_id}.")
-            logging.warning(f"Skipping event {event_id} due to API timeout.")
-            continue # Passe à l'événement suivant
-        except requests.exceptions.RequestException as req_err:
-            status_code = response.status_code if response is not None else 'N/A'
-            response_text = response.text if response is not None else 'N/A'
-            logging.error(f"Erreur requête participant/list Event {event_id}: {req_err} (Status: {status_code})")
-            logging.debug(f"Détails erreur API participants: Response={response_text[:500]}")
-            logging.warning(f"Skipping event {event_id} due to API request error.")
-            continue
-        except json.JSONDecodeError as e_json:
-             response_text = response.text if response is not None else 'N/A'
-             logging.error(f"Erreur décodage JSON participant/list Event {event_id}: {e_json}")
-             logging.debug(f"Réponse brute non-JSON participants: {response_text[:500]}")
-             logging.warning(f"Skipping event {event_id} due to JSON error.")
-             continue
-        except Exception as general_err:
-            logging.error(f"Erreur inattendue majeure durant traitement Event {event_id}: {general_err}", exc_info=True)
-            logging.warning(f"Skipping event {event_id} due to unexpected error.")
-            continue
+                processed_in_event = 0
+                records = [] # Écrits à chaque point de reprise (upsert seul), le reste en fin d'événement avec réconciliation
+                answers_cached = answers_cache.load_event_answers(event_id) # {id_participant: CachedAnswers}
+                answers_to_cache = [] # Réponses téléchargées/revalidées, enregistrées à chaque point de reprise
+                skip = progress.offsets.get(event_id, 0) # Déjà écrits par la synchro interrompue
+                if skip:
+                    logging.info(f"Reprise de l'événement {event_id} : {skip} premiers participants déjà écrits, ignorés.")
+                # Boucle sur les participants de cet événement
+                for index, p_data in enumerate(participants_api_data):
+                    participant_num = index + 1
+                    if index < skip:
+                        continue
+                    if index > skip and index % sync_checkpoints.CHECKPOINT_PAGE == 0:
+                        # Point de reprise : participants de la page écrits (la réconciliation attend la liste
+                        # complète, en fin d'événement) et réponses enregistrées ; une reprise repart d'ici
+                        report.record_write_counts(event_id, save_event_participants(event_id, records))
+                        records = []
+                        answers_cache.store_event_answers(event_id, answers_to_cache)
+                        answers_to_cache = []
+                        progress.checkpoint(event_id, index, count_api_event)
+                        if progress.should_stop():
+                            break
+                    if not isinstance(p_data, dict):
+                        log_sampled("participant_invalid", logging.WARNING, "P %s ignoré (Event %s): Donnée non valide.", participant_num, event_id)
+                        continue
+
+                    participant_id = p_data.get("id_participant")
+                    if not participant_id:
+                        owner_data_log = p_data.get("owner") if isinstance(p_data.get("owner"), dict) else {}
+                        email_log = mask_email(str(owner_data_log.get("email") or p_data.get("email") or "").strip().lower())
+                        log_sampled("participant_no_id", logging.WARNING, "P %s ignoré (Event %s): ID Participant Manquant. Email: %s.",
+                                    participant_num, event_id, email_log or "N/A")
+                        continue
+
+                    record = participant_record(access_token, event_id, participant_num, p_data, answers_cached,
+                                                answers_to_cache, all_ticket_prices, report)
+                    if record is None:
+                        continue # Email requis
+
+                    records.append(record)
+                    processed_in_event += 1
+                    total_participants_processed += 1
+                # Fin boucle participants
+                if progress.stop_reason: # Événement interrompu : écrit jusqu'au point de reprise, suite à la prochaine synchro
+                    event_counts = report.event(event_id)
+                    if event_counts.inserted or event_counts.updated:
+                        publish_event_changes(event_id)
+                    logging.info(f"Synchro arrêtée ({progress.stop_reason}) pendant l'événement {event_id}.")
+                    break
+                # Upsert groupé + suppression des inscriptions absentes de l'API, dans la même transaction
+                report.record_write_counts(event_id, save_event_participants(event_id, records,
+                                                                             event_api_emails(participants_api_data),
+                                                                             list_started_at))
+                answers_cache.store_event_answers(event_id, answers_to_cache)
+                progress.event_done(event_id, count_api_event)
+                event_counts = report.event(event_id)
+                if event_counts.inserted or event_counts.updated or event_counts.deleted:
+                    publish_event_changes(event_id)
+                # Résumé par événement (remplace les journaux par participant, échantillonnés)
+                logging.info(f"{processed_in_event} participants traités pour l'événement {event_id}.",
+                             extra={"event_id": event_id, "stats": report.event(event_id).to_dict()})
+
+            # Gestion des erreurs pour la boucle d'un événement
+            except requests.exceptions.Timeout:
+                logging.error(f"Erreur Timeout requête participant/list Event {event_id}.")
+                logging.warning(f"Skipping event {event_id} due to API timeout.")
+                report.add(event_id, "errors")
+                continue # Passe à l'événement suivant
+            except requests.exceptions.RequestException as req_err:
+                status_code = response.status_code if response is not None else 'N/A'
+                response_text = response.text if response is not None else 'N/A'
+                logging.error(f"Erreur requête participant/list Event {event_id}: {req_err} (Status: {status_code})")
+                logging.debug(f"Détails erreur API participants: Response={response_text[:500]}")
+                logging.warning(f"Skipping event {event_id} due to API request error.")
+                report.add(event_id, "errors")
+                continue
+            except json.JSONDecodeError as e_json:
+                 response_text = response.text if response is not None else 'N/A'
+                 logging.error(f"Erreur décodage JSON participant/list Event {event_id}: {e_json}")
+                 logging.debug(f"Réponse brute non-JSON participants: {response_text[:500]}")
+                 logging.warning(f"Skipping event {event_id} due to JSON error.")
+                 report.add(event_id, "errors")
+                 continue
+            except Exception as general_err:
+                logging.error(f"Erreur inattendue majeure durant traitement Event {event_id}: {general_err}", exc_info=True)
+                logging.warning(f"Skipping event {event_id} due to unexpected error.")
+                report.add(event_id, "errors")
+                continue
+        completed = True
+    finally:
+        # Arrêt inattendu : 'interrupted', la synchro suivante reprend les événements non écrits
+        progress.finish(progress.stop_reason or ("done" if completed else "interrupted"))
+    if progress.stop_reason:
+        progress.mark_report(report, all_event_ids)
     # Fin boucle événements
 
     logging.info(f"--- Fin Traitement Tous Événements ---")
     logging.info(f"Total participants API (événements actifs/futurs) : {total_participants_api}")
     logging.info(f"Total participants traités (tentatives sauvegarde DB) : {total_participants_processed}")
+    field_mapping.log_unmatched_labels(report.unmatched_labels)
+    # Agrégats du tableau de bord : seuls les événements modifiés sont recalculés
+    phase_start = time.perf_counter()
+    event_stats.refresh_event_stats(report.changed_event_ids())
+    report.set_phase_time("event_stats", time.perf_counter() - phase_start)
     logging.info("="*20 + " FIN SYNCHRO PARTICIPANTS " + "="*20)
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - [%(funcName)s] - %(message)s')
+    setup_logging(logging.DEBUG)
     print("*"*10 + " Lancement manuel synchronisation inscriptions Weezevent... " + "*"*10)
     # Décommentez pour lancer la vraie synchro
     # get_registrations()
@@ -572,7 +750,7 @@ if __name__ == "__main__":
         test_event_id_for_pdata = 0 # <== À CHANGER (ID EVENT VALIDE)
         test_participant_id_for_pdata = "REMPLACER_PAR_UN_ID_PARTICIPANT_VALIDE" # <== À CHANGER
         if test_event_id_for_pdata and test_participant_id_for_pdata != "REMPLACER_PAR_UN_ID_PARTICIPANT_VALIDE":
-             url_test_pdata = (f"https://api.weezevent.com/participant/list?"
+             url_test_pdata = (f"{API_BASE_URL}/participant/list?"
                               f"api_key={API_KEY}&access_token={test_token}&id_event[]={test_event_id_for_pdata}"
                               f"&ids_participant[]={test_participant_id_for_pdata}&full=1")
              print(f"Appel API p_data: {url_test_pdata}")
@@ -0,0 +1,475 @@
+# -*- coding: utf-8 -*-
+"""
+Moteur de synchronisation Weezevent asynchrone (asyncio + httpx), alternative à
+weezevent_events.get_events / weezevent_api.get_registrations avec les mêmes sorties
+(tables evenements / inscriptions, SyncReport).
+
+Sélection dans app.py par la variable d'environnement SYNC_ENGINE=async (défaut : sync).
+
+Principe :
+  - un seul client httpx.AsyncClient par synchro, limité à ASYNC_MAX_CONNECTIONS connexions ;
+  - un asyncio.Semaphore borne les appels API simultanés (ASYNC_MAX_CONCURRENCY) : les centaines
+    d'appels /participant/{id}/answers d'un événement tournent dans un seul thread ;
+  - les écritures BDD (bloquantes, mysql-connector) partent dans un ThreadPoolExecutor de
+    ASYNC_DB_THREADS threads, borné par le pool MySQL (db_connection.POOL_SIZE).
+
+Le parsing des réponses API (participants, billets, événements), la correspondance des réponses
+formulaire (field_mapping) et leur cache (answers_cache) sont partagés avec le moteur synchrone.
+Si httpx n'est pas installé, le moteur synchrone est utilisé.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import answers_cache
+import api_recorder
+import data_versions
+import export_snapshots
+import event_stats
+import field_mapping
+import metrics
+import sync_checkpoints
+import ticket_price_cache
+from db_connection import POOL_SIZE
+from sync_report import SyncReport, save_sync_report
+from log_config import log_sampled
+from rate_limiter import LIMITER, MAX_RETRIES
+import weezevent_api
+import weezevent_events
+from weezevent_api import (build_participant_record, event_api_emails, extract_event_ticket_prices, get_active_event_ids,
+                           save_event_participants)
+from weezevent_events import parse_event, save_event_to_db
+
+try:
+    from weezevent_utils import get_access_token, API_BASE_URL
+except ImportError:
+    logging.critical("ERREUR CRITIQUE: Impossible d'importer 'get_access_token' depuis 'weezevent_utils.py'.")
+    def get_access_token():
+        logging.error("Fonction get_access_token non trouvée.")
+        return None
+    API_BASE_URL = "https://api.weezevent.com"
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Appels API simultanés (tous endpoints confondus) et connexions HTTP ouvertes
+MAX_CONCURRENCY = int(os.getenv("ASYNC_MAX_CONCURRENCY", 20))
+MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", MAX_CONCURRENCY))
+# Threads d'écriture BDD : une connexion du pool reste libre pour les requêtes web
+DB_THREADS = int(os.getenv("ASYNC_DB_THREADS", max(1, POOL_SIZE - 1)))
+# Événements traités simultanément, pris dans l'ordre (les plus proches d'abord) : un arrêt
+# (budget, annulation) laisse les plus lointains à la synchro suivante
+EVENT_CONCURRENCY = max(1, int(os.getenv("ASYNC_EVENT_CONCURRENCY", 4)))
+
+
+def is_available():
+    """Indique si le moteur asynchrone peut être utilisé (httpx installé)."""
+    return httpx is not None
+
+
+# ===== Client HTTP =====
+def _make_client():
+    limits = httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS)
+    return httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(20.0))
+
+
+async def _request(client, semaphore, method, url, endpoint, **kwargs):
+    """
+    Équivalent asynchrone de weezevent_utils.weezevent_request (mêmes métriques par endpoint).
+    Le chronomètre démarre une fois le créneau du sémaphore obtenu (attente locale exclue).
+    Même régulation de débit et mêmes nouveaux essais sur 429 (rate_limiter.LIMITER, partagé avec
+    les appels synchrones du processus). Le jeton est pris créneau obtenu : une pause (429) arrête
+    aussitôt tous les appels qui ne sont pas déjà partis.
+    """
+    replaying = api_recorder.replaying()
+    for attempt in range(MAX_RETRIES + 1):
+        async with semaphore:
+            if not replaying:
+                await LIMITER.acquire_async()
+            with metrics.timed("weezevent_api_request", endpoint=endpoint) as timer:
+                if replaying:
+                    response = api_recorder.replay_httpx_response(method, url, endpoint, **kwargs)
+                else:
+                    started = time.perf_counter()
+                    response = await client.request(method, url, **api_recorder.prepare(kwargs))
+                    api_recorder.record(method, url, endpoint, kwargs, response.status_code, response.headers,
+                                        response.text, time.perf_counter() - started)
+                metrics.inc("weezevent_api_responses_total", endpoint=endpoint, status=response.status_code)
+                if response.status_code >= 400 and response.status_code != 404:
+                    timer.mark_error()
+        retry_after = None if replaying else LIMITER.observe(response.status_code, response.headers)
+        if retry_after is None or attempt == MAX_RETRIES:
+            return response
+        LIMITER.count_retry()
+        metrics.inc("weezevent_api_retries_total", endpoint=endpoint)
+        log_sampled("api_throttled", logging.WARNING, "API Weezevent limitée (429) sur %s : nouvel essai dans %.1f s.",
+                    endpoint, retry_after)
+
+
+# ===== Événements =====
+async def _get_events_async():
+    logging.info("Début de la récupération des événements Weezevent (moteur async)...")
+    loop = asyncio.get_running_loop()
+    access_token = await loop.run_in_executor(None, get_access_token)
+    if not access_token:
+        logging.error("Impossible de récupérer les événements sans token d'accès.")
+        return
+
+    api_key = os.getenv("WEEZEVENT_API_KEY")
+    if not api_key:
+        logging.error("WEEZEVENT_API_KEY non trouvé dans les variables d'environnement.")
+        return
+
+    url = f"{API_BASE_URL}/events?api_key={api_key}&access_token={access_token}"
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    try:
+        async with _make_client() as client:
+            response = await _request(client, semaphore, "GET", url, "events", timeout=20)
+            response.raise_for_status()
+            events_data = response.json()
+    except httpx.TimeoutException:
+        logging.error("Erreur Timeout lors de la requête API pour récupérer les événements.")
+        return
+    except httpx.HTTPError as e:
+        logging.error(f"Erreur requête API pour récupérer les événements : {e}")
+        return
+    except json.JSONDecodeError as e_json:
+        logging.error(f"Erreur décodage JSON réponse /events : {e_json}")
+        return
+
+    events_list = events_data.get("events")
+    if events_list is None:
+        logging.warning("La clé 'events' est manquante dans la réponse API.")
+        return
+    logging.info(f"{len(events_list)} événements reçus de l'API.")
+
+    rows = []
+    for event in events_list:
+        event_args = parse_event(event)
+        if event_args:
+            rows.append(event_args)
+        else:
+            logging.warning(f"Événement API sans ID trouvé, ignoré : {event.get('name', 'Nom Indisponible')}")
+
+    with ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="sync-db") as executor:
+        changed = await asyncio.gather(*(loop.run_in_executor(executor, save_event_to_db, *args) for args in rows))
+        if any(changed):
+            await loop.run_in_executor(executor, data_versions.bump, [data_versions.EVENTS_SCOPE])
+    logging.info(f"{len(rows)} événements traités et sauvegardés/mis à jour.")
+
+
+# ===== Participants =====
+async def _fetch_answers_payload(client, semaphore, access_token, participant_id, etag=None):
+    """Équivalent asynchrone de weezevent_api.fetch_answers_payload : (payload, etag, statut)."""
+    url = f"{API_BASE_URL}/participant/{participant_id}/answers?api_key={weezevent_api.API_KEY}&access_token={access_token}"
+    headers = {"If-None-Match": etag} if etag else None
+    try:
+        response = await _request(client, semaphore, "GET", url, "participant/answers", timeout=15, headers=headers)
+        if response.status_code == 304: # Inchangé depuis la mise en cache
+            return None, etag, "not_modified"
+        if response.status_code == 404: # Pas une erreur, juste pas de réponse
+            log_sampled("answers_not_found", logging.WARNING, "Aucune réponse trouvée (404) pour participant %s.", participant_id)
+            return {"answers": []}, None, "not_found"
+        response.raise_for_status()
+        return response.json(), response.headers.get("ETag"), "ok"
+    except httpx.TimeoutException:
+        logging.error(f"Erreur connexion/requête (Timeout) réponses participant {participant_id}")
+    except httpx.HTTPError as e:
+        logging.error(f"Erreur connexion/requête réponses participant {participant_id}: {e}")
+    except json.JSONDecodeError as e_json:
+        logging.error(f"Erreur décodage JSON réponse answers pour participant {participant_id}: {e_json}")
+    except Exception as e:
+        logging.error(f"Erreur inattendue (réponses participant {participant_id}): {e}", exc_info=True)
+    return None, None, "error"
+
+
+async def _fetch_ticket_prices_chunk(client, semaphore, access_token, event_ids):
+    id_param = "&".join([f"id_event[]={eid}" for eid in event_ids])
+    url = f"{API_BASE_URL}/tickets?api_key={weezevent_api.API_KEY}&access_token={access_token}&{id_param}"
+    try:
+        response = await _request(client, semaphore, "GET", url, "tickets", timeout=20)
+        response.raise_for_status()
+        prices_by_event = extract_event_ticket_prices(response.json())
+        for event_id in event_ids: # Événement sans billet : chargé quand même (pas de rappel avant le TTL)
+            prices_by_event.setdefault(int(event_id), {})
+        return prices_by_event
+    except httpx.HTTPError as e:
+        logging.error(f"Erreur requête API /tickets: {e}")
+    except json.JSONDecodeError as e_json:
+        logging.error(f"Erreur décodage JSON réponse /tickets: {e_json}")
+    except Exception as e:
+        logging.error(f"Erreur inattendue récupération prix billets: {e}", exc_info=True)
+    return None
+
+
+async def _get_ticket_prices(client, semaphore, access_token, event_ids):
+    """Équivalent asynchrone de weezevent_api.get_ticket_prices (cache ticket_prices + tranches)."""
+    loop = asyncio.get_running_loop()
+    ticket_prices, fresh_event_ids = await loop.run_in_executor(None, ticket_price_cache.load_prices, event_ids)
+    stale_event_ids = [eid for eid in event_ids if int(eid) not in fresh_event_ids]
+    if stale_event_ids:
+        chunks = ticket_price_cache.chunked(stale_event_ids, weezevent_api.TICKETS_CHUNK_SIZE)
+        results = await asyncio.gather(*(_fetch_ticket_prices_chunk(client, semaphore, access_token, chunk)
+                                         for chunk in chunks))
+        fetched = {}
+        for result in results:
+            if result: fetched.update(result)
+        await loop.run_in_executor(None, ticket_price_cache.store_prices, fetched)
+        for prices in fetched.values():
+            ticket_prices.update(prices)
+    return ticket_prices
+
+
+async def _process_participant(ctx, event_id, participant_num, p_data):
+    """Récupère les réponses d'un participant ; retourne sa ligne (ParticipantRecord) ou None."""
+    participant_id = p_data.get("id_participant")
+    cached = ctx["answers_cached"].get(str(participant_id))
+    validator = answers_cache.participant_validator(p_data)
+    if answers_cache.is_fresh(cached, validator):
+        payload = cached.payload
+        ctx["report"].add(event_id, "answers_cached")
+    else:
+        call_start = time.perf_counter()
+        payload, etag, fetch_status = await _fetch_answers_payload(
+            ctx["client"], ctx["semaphore"], ctx["access_token"], participant_id, etag=cached.etag if cached else None)
+        ctx["report"].add_api_time(event_id, time.perf_counter() - call_start)
+        ctx["report"].add(event_id, "answers_calls")
+        if fetch_status == "not_modified":
+            payload = cached.payload
+        elif fetch_status == "error" and cached:
+            # Échec API transitoire : dernières réponses connues plutôt que des champs vidés en base
+            log_sampled("answers_stale_fallback", logging.WARNING, "Réponses P %s (Event %s) : échec API, cache utilisé.",
+                        participant_id, event_id)
+            payload = cached.payload
+        if fetch_status != "error":
+            ctx["answers_to_cache"][event_id].append((participant_id, payload, validator, etag))
+    fields, unmatched = field_mapping.resolve_answers(payload, event_id, p_data)
+    if unmatched:
+        ctx["report"].add_unmatched_labels(unmatched)
+
+    record = build_participant_record(p_data, fields, event_id, ctx["ticket_prices"])
+    if record is None:
+        log_sampled("participant_no_email", logging.WARNING, "P %s (ID: %s, Event: %s) ignoré: Email manquant.",
+                    participant_num, participant_id, event_id)
+    return record
+
+
+async def _sync_event(ctx, event_id):
+    """Synchronise un événement ; retourne le nombre de participants traités."""
+    report = ctx["report"]
+    report.event(event_id) # L'événement apparaît dans le rapport même sans participant
+    url_participants = (f"{API_BASE_URL}/participant/list?"
+                        f"api_key={weezevent_api.API_KEY}&access_token={ctx['access_token']}&id_event[]={event_id}&full=1")
+    try:
+        call_start = time.perf_counter()
+        list_started_at = datetime.now() # Webhooks reçus après : épargnés par la réconciliation
+        response = await _request(ctx["client"], ctx["semaphore"], "GET", url_participants, "participant/list", timeout=45)
+        response.raise_for_status()
+        data = response.json()
+        report.add_api_time(event_id, time.perf_counter() - call_start)
+    except httpx.TimeoutException:
+        logging.error(f"Erreur Timeout requête participant/list Event {event_id}.")
+        report.add(event_id, "errors")
+        return 0
+    except httpx.HTTPError as req_err:
+        logging.error(f"Erreur requête participant/list Event {event_id}: {req_err}")
+        report.add(event_id, "errors")
+        return 0
+    except json.JSONDecodeError as e_json:
+        logging.error(f"Erreur décodage JSON participant/list Event {event_id}: {e_json}")
+        report.add(event_id, "errors")
+        return 0
+    except Exception as general_err:
+        logging.error(f"Erreur inattendue requête participant/list Event {event_id}: {general_err}", exc_info=True)
+        report.add(event_id, "errors")
+        return 0
+
+    if "participants" not in data:
+        logging.error(f"Clé 'participants' manquante dans réponse API pour event {event_id}.")
+        return 0
+
+    participants_api_data = data.get("participants", [])
+    report.add(event_id, "participants", len(participants_api_data))
+    logging.info(f"API a retourné {len(participants_api_data)} participants pour l'événement {event_id}.")
+    try:
+        return await _sync_event_participants(ctx, event_id, participants_api_data, list_started_at)
+    except Exception as general_err:
+        # Comme le moteur synchrone : l'événement est compté en erreur (non marqué terminé), les autres continuent
+        logging.error(f"Erreur inattendue majeure durant traitement Event {event_id}: {general_err}", exc_info=True)
+        report.add(event_id, "errors")
+        ctx["answers_to_cache"].pop(event_id, None)
+        return 0
+
+
+async def _sync_event_participants(ctx, event_id, participants_api_data, list_started_at):
+    """Réponses, écriture groupée et publication d'un événement ; retourne le nombre de participants traités."""
+    report = ctx["report"]
+    loop = asyncio.get_running_loop()
+    ctx["answers_cached"].update(await loop.run_in_executor(ctx["executor"], answers_cache.load_event_answers, event_id))
+    ctx["answers_to_cache"][event_id] = []
+    progress = ctx["progress"]
+    records = []
+    processed = 0
+    stopped = False
+    skip = progress.offsets.get(event_id, 0) # Déjà écrits par la synchro interrompue
+    if skip:
+        logging.info(f"Reprise de l'événement {event_id} : {skip} premiers participants déjà écrits, ignorés.")
+    # Pages de CHECKPOINT_PAGE participants : point de reprise (page écrite, réponses en cache) et arrêt
+    # possible entre deux pages
+    for page_start in range(skip, len(participants_api_data), sync_checkpoints.CHECKPOINT_PAGE):
+        if page_start > skip:
+            # Upsert seul : la réconciliation attend la liste complète, en fin d'événement
+            write_counts = await loop.run_in_executor(ctx["executor"], save_event_participants, event_id, records)
+            report.record_write_counts(event_id, write_counts)
+            processed += len(records)
+            records = []
+            await loop.run_in_executor(ctx["executor"], answers_cache.store_event_answers, event_id,
+                                       ctx["answers_to_cache"][event_id])
+            ctx["answers_to_cache"][event_id] = []
+            await loop.run_in_executor(ctx["executor"], progress.checkpoint, event_id, page_start, len(participants_api_data))
+            if await loop.run_in_executor(ctx["executor"], progress.should_stop):
+                logging.info(f"Synchro arrêtée ({progress.stop_reason}) pendant l'événement {event_id}.")
+                stopped = True # Événement écrit jusqu'au point de reprise, suite à la prochaine synchro
+                break
+        tasks = []
+        page = participants_api_data[page_start:page_start + sync_checkpoints.CHECKPOINT_PAGE]
+        for index, p_data in enumerate(page, start=page_start):
+            participant_num = index + 1
+            if not isinstance(p_data, dict):
+                log_sampled("participant_invalid", logging.WARNING, "P %s ignoré (Event %s): Donnée non valide.", participant_num, event_id)
+                continue
+            if not p_data.get("id_participant"):
+                log_sampled("participant_no_id", logging.WARNING, "P %s ignoré (Event %s): ID Participant Manquant.", participant_num, event_id)
+                continue
+            tasks.append(_process_participant(ctx, event_id, participant_num, p_data))
+
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                logging.error(f"Erreur inattendue participant Event {event_id}: {result}")
+                report.add(event_id, "errors")
+            elif result is not None:
+                records.append(result)
+    answers_to_cache = ctx["answers_to_cache"].pop(event_id)
+    if not stopped:
+        processed += len(records)
+        # Upsert groupé + suppression des inscriptions absentes de l'API, dans la même transaction
+        write_counts = await loop.run_in_executor(ctx["executor"], save_event_participants, event_id, records,
+                                                  event_api_emails(participants_api_data), list_started_at)
+        report.record_write_counts(event_id, write_counts)
+        await loop.run_in_executor(ctx["executor"], answers_cache.store_event_answers, event_id, answers_to_cache)
+        await loop.run_in_executor(ctx["executor"], progress.event_done, event_id, len(participants_api_data))
+    event_counts = report.event(event_id)
+    if event_counts.inserted or event_counts.updated or event_counts.deleted:
+        await loop.run_in_executor(ctx["executor"], data_versions.bump_events, [event_id]) # Invalide les ETag de l'événement
+        await loop.run_in_executor(ctx["executor"], export_snapshots.write_snapshots, event_id)
+    logging.info(f"{processed} participants traités pour l'événement {event_id}.",
+                 extra={"event_id": event_id, "stats": report.event(event_id).to_dict()})
+    return processed
+
+
+async def _sync_registrations_async(report, budget_seconds=None):
+    logging.info("="*20 + " DÉBUT SYNCHRO PARTICIPANTS (async) " + "="*20)
+    loop = asyncio.get_running_loop()
+
+    event_ids = await loop.run_in_executor(None, get_active_event_ids)
+    if not event_ids:
+        logging.info("Aucun événement actif et futur/sans date trouvé pour la synchronisation. Arrêt.")
+        report.mark("aucun_evenement", "Aucun événement actif et futur/sans date.")
+        return
+
+    access_token = await loop.run_in_executor(None, get_access_token)
+    if not access_token:
+        logging.error("Impossible de continuer sans token d'accès.")
+        report.mark("erreur_token", "Token d'accès Weezevent non obtenu.")
+        return
+
+    if not weezevent_api.API_KEY:
+        logging.error("API_KEY manquant. Impossible de continuer.")
+        report.mark("erreur_config", "WEEZEVENT_API_KEY manquant.")
+        return
+
+    # Progression en BDD : reprise d'une synchro interrompue (événements déjà écrits sautés), budget, annulation
+    progress, busy_message = await loop.run_in_executor(None, sync_checkpoints.start_progress, event_ids, budget_seconds)
+    if progress is None:
+        logging.warning(busy_message)
+        report.mark("deja_en_cours", busy_message)
+        return
+    if progress.resumed_at:
+        report.message = f"Reprise de la synchro du {progress.resumed_at:%d/%m/%Y %H:%M}."
+    all_event_ids = event_ids
+    event_ids = progress.pending(event_ids)
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    async with _make_client() as client:
+        phase_start = time.perf_counter()
+        ticket_prices = await _get_ticket_prices(client, semaphore, access_token, event_ids)
+        report.set_phase_time("ticket_prices", time.perf_counter() - phase_start)
+        if not ticket_prices:
+            logging.warning("Aucun prix de base de billet récupéré. Fallback de prix impossible.")
+
+        with ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="sync-db") as executor:
+            ctx = {"client": client, "semaphore": semaphore, "access_token": access_token,
+                   "ticket_prices": ticket_prices, "executor": executor, "report": report,
+                   "answers_cached": {}, "answers_to_cache": {}, "progress": progress}
+            queue = list(reversed(event_ids)) # pop() : les plus proches d'abord
+            processed = []
+
+            async def event_worker():
+                while queue and not await loop.run_in_executor(executor, progress.should_stop):
+                    processed.append(await _sync_event(ctx, queue.pop()))
+
+            completed = False
+            try:
+                await asyncio.gather(*(event_worker() for _ in range(min(EVENT_CONCURRENCY, len(event_ids)))))
+                completed = True
+            finally:
+                # Arrêt inattendu : 'interrupted', la synchro suivante reprend les événements non écrits
+                await loop.run_in_executor(None, progress.finish,
+                                           progress.stop_reason or ("done" if completed else "interrupted"))
+    if progress.stop_reason:
+        progress.mark_report(report, all_event_ids)
+
+    logging.info(f"Total participants API (événements actifs/futurs) : {report.total('participants')}")
+    logging.info(f"Total participants traités (tentatives sauvegarde DB) : {sum(processed)}")
+    field_mapping.log_unmatched_labels(report.unmatched_labels)
+    phase_start = time.perf_counter()
+    event_stats.refresh_event_stats(report.changed_event_ids()) # Agrégats du tableau de bord (événements modifiés)
+    report.set_phase_time("event_stats", time.perf_counter() - phase_start)
+    logging.info("="*20 + " FIN SYNCHRO PARTICIPANTS (async) " + "="*20)
+
+
+# ===== Points d'entrée (mêmes signatures que le moteur synchrone) =====
+def get_events():
+    """Équivalent de weezevent_events.get_events (moteur synchrone si httpx est absent)."""
+    if not is_available():
+        logging.warning("httpx non installé : utilisation du moteur de synchro synchrone pour get_events.")
+        return weezevent_events.get_events()
+    asyncio.run(_get_events_async())
+
+
+def get_registrations(report=None, budget_seconds=None):
+    """
+    Équivalent de weezevent_api.get_registrations : même rapport, mêmes écritures BDD.
+    Les appels API d'une synchro sont concurrents : api_seconds cumule le temps de chaque appel
+    et peut dépasser la durée totale de la synchro.
+    """
+    if not is_available():
+        logging.warning("httpx non installé : utilisation du moteur de synchro synchrone pour get_registrations.")
+        return weezevent_api.get_registrations(report=report, budget_seconds=budget_seconds)
+
+    own_report = report is None
+    if own_report:
+        report = SyncReport()
+    try:
+        asyncio.run(_sync_registrations_async(report, budget_seconds))
+    finally:
+        if own_report:
+            report.finish()
+            save_sync_report(report)
+    return report
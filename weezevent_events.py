@@ -4,16 +4,21 @@ import os
 from dotenv import load_dotenv
 import logging
 import mysql.connector
+from log_config import setup_logging
+import data_versions
 
 try:
-    # Fonction pour obtenir le token d'accès Weezevent
-    from weezevent_utils import get_access_token
+    # Fonction pour obtenir le token d'accès Weezevent + appel HTTP instrumenté
+    from weezevent_utils import get_access_token, weezevent_get, API_BASE_URL
 except ImportError:
     logging.error("Impossible d'importer get_access_token depuis weezevent_utils.")
     # Fonction factice pour éviter les erreurs, mais le script ne fonctionnera pas
     def get_access_token():
         logging.error("Fonction get_access_token non disponible.")
         return None
+    def weezevent_get(url, endpoint, **kwargs):
+        return requests.get(url, **kwargs)
+    API_BASE_URL = "https://api.weezevent.com"
 
 load_dotenv()
 
@@ -22,6 +27,7 @@ def save_event_to_db(event_id, nom, start_date_str, is_active):
     Enregistre ou met à jour un événement dans la BDD.
     'actif' (booléen) indique si l'événement n'est PAS annulé selon Weezevent.
     'start_date_str' est la date de début brute (chaîne API).
+    Retourne True si la ligne a été insérée ou modifiée.
     """
     conn = None
     cursor = None
@@ -29,7 +35,7 @@ def save_event_to_db(event_id, nom, start_date_str, is_active):
         conn = get_connection() # Obtient une connexion du pool
         if not conn:
             logging.error("Impossible d'obtenir une connexion DB pour save_event_to_db.")
-            return
+            return False
         cursor = conn.cursor()
         actif_db_value = 1 if is_active else 0 # Convertit booléen en entier pour la DB
 
@@ -57,16 +63,44 @@ def save_event_to_db(event_id, nom, start_date_str, is_active):
         cursor.execute(sql, params)
         conn.commit()
         logging.info(f"Événement {event_id} ('{nom}') sauvegardé/MAJ. Date: {event_date_db}, Actif (non-annulé): {is_active}")
+        return cursor.rowcount in (1, 2) # 0 = inchangé (MySQL)
 
     except Exception as e:
         logging.error(f"Erreur DB lors de la sauvegarde de l'événement {event_id}: {e}")
         if conn:
             conn.rollback()
+        return False
     finally:
         if cursor: cursor.close()
         # Remettre la connexion dans le pool
         if conn: conn.close()
 
+CANCELED_STATUS_ID = 4 # Statut Weezevent "annulé"
+
+def parse_event(event):
+    """
+    Convertit un événement de la réponse /events en arguments de save_event_to_db
+    (event_id, nom, start_date_str, is_active). Retourne None si l'événement n'a pas d'ID.
+    Partagé par get_events et le moteur asyncio (weezevent_async).
+    """
+    event_id = event.get("id")
+    name = event.get("name", "Nom Indisponible")
+    start_date_str = event.get("date", {}).get("start") # Date de début (peut être None)
+
+    sales_status = event.get("sales_status", {})
+    status_id = sales_status.get("id_status")
+    status_label = sales_status.get("libelle_status", "Statut Inconnu")
+
+    # Un événement est actif pour la BDD s'il n'est PAS annulé
+    is_active = True
+    if status_id == CANCELED_STATUS_ID:
+        is_active = False # Marqué comme inactif si annulé
+
+    logging.debug(f"Event ID {event_id} ('{name}') - Statut API: '{status_label}' (ID: {status_id}) -> Actif BDD (non-annulé): {is_active}")
+    if not event_id:
+        return None
+    return event_id, name, start_date_str, is_active
+
 def get_events():
     """
     Récupère les événements depuis l'API Weezevent.
@@ -80,20 +114,17 @@ def get_events():
         logging.error("Impossible de récupérer les événements sans token d'accès.")
         return
 
-    
-    CANCELED_STATUS_ID = 4 
-    
     API_KEY = os.getenv("WEEZEVENT_API_KEY")
     if not API_KEY:
         logging.error("WEEZEVENT_API_KEY non trouvé dans les variables d'environnement.")
         return
 
-    url = f"https://api.weezevent.com/events?api_key={API_KEY}&access_token={access_token}"
+    url = f"{API_BASE_URL}/events?api_key={API_KEY}&access_token={access_token}"
     # Ajoutez d'autres paramètres si nécessaire (ex: include_closed=true)
-    logging.info(f"Appel API événements : {url}")
+    logging.info(f"Appel API événements : {API_BASE_URL}/events") # Sans api_key/access_token
 
     try:
-        response = requests.get(url, timeout=20) # Timeout pour la requête
+        response = weezevent_get(url, "events", timeout=20) # Timeout pour la requête
         response.raise_for_status() # Gère les erreurs HTTP 4xx/5xx
 
         events_data = response.json()
@@ -102,30 +133,19 @@ def get_events():
         if events_list:
             logging.info(f"{len(events_list)} événements reçus de l'API.")
             processed_count = 0
+            changed = False
             for event in events_list:
-                event_id = event.get("id")
-                name = event.get("name", "Nom Indisponible")
-                start_date_str = event.get("date", {}).get("start") # Date de début (peut être None)
-
-                sales_status = event.get("sales_status", {})
-                status_id = sales_status.get("id_status")
-                status_label = sales_status.get("libelle_status", "Statut Inconnu")
-
-                # Un événement est actif pour la BDD s'il n'est PAS annulé
-                is_active = True
-                if status_id == CANCELED_STATUS_ID:
-                    is_active = False # Marqué comme inactif si annulé
-
-                logging.debug(f"Event ID {event_id} ('{name}') - Statut API: '{status_label}' (ID: {status_id}) -> Actif BDD (non-annulé): {is_active}")
-
-                if event_id:
+                event_args = parse_event(event)
+                if event_args:
                     # Sauvegarde avec date de début et le flag 'actif' (non-annulé)
-                    save_event_to_db(event_id, name, start_date_str, is_active)
+                    changed = save_event_to_db(*event_args) or changed
                     processed_count += 1
                 else:
-                     logging.warning(f"Événement API sans ID trouvé, ignoré : {name}")
+                     logging.warning(f"Événement API sans ID trouvé, ignoré : {event.get('name', 'Nom Indisponible')}")
 
             logging.info(f"{processed_count} événements traités et sauvegardés/mis à jour.")
+            if changed:
+                data_versions.bump([data_versions.EVENTS_SCOPE]) # Liste des événements modifiée (ETag des pages)
 
         elif events_list is not None: # Clé "events" existe mais vide
              logging.info("Aucun événement retourné par l'API Weezevent.")
@@ -144,7 +164,7 @@ def get_events():
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+    setup_logging(logging.DEBUG)
     print("Lancement manuel de la récupération des événements Weezevent...")
     get_events()
     print("Récupération des événements terminée.")
\ No newline at end of file
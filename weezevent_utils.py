@@ -4,28 +4,81 @@ from dotenv import load_dotenv
 import logging
 import traceback
 import json # Pour décodage JSON et debug
+import time
+import metrics
+import api_recorder # Enregistrement / rejeu des réponses API (WEEZEVENT_RECORD / WEEZEVENT_REPLAY)
+from rate_limiter import LIMITER, MAX_RETRIES # Débit partagé par tous les appels Weezevent (429 / quota)
+from log_config import log_sampled
 
 load_dotenv()
+api_recorder.init_from_env()
 
 # Récupérer les credentials Weezevent une seule fois au démarrage
 API_KEY = os.getenv("WEEZEVENT_API_KEY")
 USERNAME = os.getenv("WEEZEVENT_USERNAME")
 PASSWORD = os.getenv("WEEZEVENT_PASSWORD")
+# URL de base de l'API (surchargeable pour pointer vers un serveur local, ex: benchmarks/fake_weezevent.py)
+API_BASE_URL = os.getenv("WEEZEVENT_API_URL", "https://api.weezevent.com").rstrip("/")
 
+def weezevent_request(method, url, endpoint, **kwargs):
+    """
+    Point de passage unique des appels HTTP vers l'API Weezevent (requests.get/post).
+    Chronomètre l'appel par endpoint et compte les réponses en erreur (hors 404).
+    Débit régulé par rate_limiter.LIMITER ; une réponse 429 est réessayée après Retry-After
+    (MAX_RETRIES fois), la dernière réponse est rendue à l'appelant.
+    Lève les mêmes exceptions que requests ; l'appelant garde sa gestion d'erreurs.
+    En rejeu (api_recorder), la réponse enregistrée est renvoyée sans appel réseau ni attente.
+    """
+    if api_recorder.replaying():
+        return _send(method, url, endpoint, kwargs)
+    for attempt in range(MAX_RETRIES + 1):
+        LIMITER.acquire()
+        response = _send(method, url, endpoint, kwargs)
+        retry_after = LIMITER.observe(response.status_code, response.headers)
+        if retry_after is None or attempt == MAX_RETRIES:
+            return response
+        LIMITER.count_retry()
+        metrics.inc("weezevent_api_retries_total", endpoint=endpoint)
+        log_sampled("api_throttled", logging.WARNING, "API Weezevent limitée (429) sur %s : nouvel essai dans %.1f s.",
+                    endpoint, retry_after)
+
+
+def _send(method, url, endpoint, kwargs):
+    with metrics.timed("weezevent_api_request", endpoint=endpoint) as timer:
+        if api_recorder.replaying():
+            response = api_recorder.replay_response(method, url, endpoint, **kwargs)
+        else:
+            started = time.perf_counter()
+            response = requests.request(method, url, **api_recorder.prepare(kwargs))
+            api_recorder.record(method, url, endpoint, kwargs, response.status_code, response.headers,
+                                response.text, time.perf_counter() - started)
+        metrics.inc("weezevent_api_responses_total", endpoint=endpoint, status=response.status_code)
+        if response.status_code >= 400 and response.status_code != 404:
+            timer.mark_error()
+        return response
+
+
+def weezevent_get(url, endpoint, **kwargs):
+    """Raccourci GET de weezevent_request (ex: weezevent_get(url, "participant/list", timeout=45))."""
+    return weezevent_request("get", url, endpoint, **kwargs)
+
+
+@metrics.timed("weezevent_access_token")
 def get_access_token():
     """Récupère un token d'accès depuis l'API Weezevent."""
-    url = "https://api.weezevent.com/auth/access_token"
+    url = f"{API_BASE_URL}/auth/access_token"
     data = {"username": USERNAME, "password": PASSWORD, "api_key": API_KEY}
 
     # Vérifier si les credentials sont présents
-    if not all([API_KEY, USERNAME, PASSWORD]):
+    if not all([API_KEY, USERNAME, PASSWORD]) and not api_recorder.replaying():
         logging.error("Credentials Weezevent (API_KEY, USERNAME, PASSWORD) manquants dans .env")
+        metrics.record_error("weezevent_access_token")
         return None
 
     logging.debug(f"Tentative de récupération du token depuis {url}")
     response = None
     try:
-        response = requests.post(url, data=data, timeout=10) # Timeout de 10 secondes
+        response = weezevent_request("post", url, "auth/access_token", data=data, timeout=10) # Timeout de 10 secondes
         response.raise_for_status() # Lève une exception pour les codes d'erreur HTTP (4xx/5xx)
 
         response_data = response.json()
@@ -37,23 +90,28 @@ def get_access_token():
         else:
             logging.error("Token d'accès Weezevent non trouvé dans la réponse JSON.")
             logging.debug(f"Réponse JSON brute (token): {response_data}")
+            metrics.record_error("weezevent_access_token")
             return None
     except requests.exceptions.Timeout:
         logging.error("Erreur requête token Weezevent: Timeout.")
+        metrics.record_error("weezevent_access_token")
         return None
     except requests.exceptions.RequestException as e:
         status_code = response.status_code if response is not None else 'N/A'
         response_text = response.text if response is not None else 'N/A'
         logging.error(f"Erreur requête token Weezevent: {e} (Status: {status_code})")
         logging.debug(f"Détails erreur token: Response Text (max 500 chars) = {response_text[:500]}")
+        metrics.record_error("weezevent_access_token")
         return None
     except json.JSONDecodeError as e_json:
         # Gérer le cas où la réponse n'est pas du JSON valide
         response_text = response.text if response is not None else 'N/A'
         logging.error(f"Erreur décodage JSON réponse token: {e_json}")
         logging.debug(f"Réponse brute non-JSON (token): {response_text[:500]}")
+        metrics.record_error("weezevent_access_token")
         return None
     except Exception as e:
          logging.error(f"Erreur non liée à la requête token Weezevent: {e}")
          logging.error(traceback.format_exc()) # Log stack trace pour erreurs inattendues
+         metrics.record_error("weezevent_access_token")
          return None